@@ -0,0 +1,3 @@
+"""
+Benchmarks of the funix-cloud client, run them from the repository root, e.g. `python -m benchmarks.startup`.
+"""
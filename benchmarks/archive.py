@@ -0,0 +1,88 @@
+"""
+Archive benchmark.
+
+Compares the serial `zip_folder` (`zipfile.ZIP_DEFLATED`) with the parallel `write_zip` for
+several worker counts, then the compression policies, on the synthetic corpus: wall time,
+CPU time and archive size.
+
+    python -m benchmarks.archive [--scale 1.0] [--workers 1 2 4 8] [--save-baseline]
+"""
+import argparse
+import os
+import tempfile
+import time
+import zipfile
+
+from benchmarks.common import console, cpu_time, load_baseline, save_baseline, table, versus
+from benchmarks.corpus import make_corpus
+from funix_cloud.util import zip_folder
+from funix_cloud.util.ignore import walk
+from funix_cloud.util.archive import DEFAULT_WORKERS, file_members, write_zip
+from funix_cloud.util.compression import POLICIES
+
+
+def _measure(write, out_path: str) -> dict:
+    wall = time.perf_counter()
+    cpu = cpu_time()
+    with open(out_path, "wb") as f:
+        write(f)
+    result = {
+        "wall_s": time.perf_counter() - wall,
+        "cpu_s": cpu_time() - cpu,
+        "size_mb": os.path.getsize(out_path) / 1024 / 1024,
+    }
+    os.remove(out_path)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0, help="size of the corpus, 1.0 is about 60 MB")
+    parser.add_argument("--workers", type=int, nargs="*", default=sorted({1, 2, 4, DEFAULT_WORKERS}))
+    parser.add_argument("--save-baseline", action="store_true", help="store the results in baseline.json")
+    args = parser.parse_args()
+
+    baseline = load_baseline().get("archive", {})
+    results = {}
+
+    with tempfile.TemporaryDirectory(prefix="funix-cloud-bench-") as root:
+        project = make_corpus(root, args.scale)
+        files = list(walk(project))
+        size = sum(os.path.getsize(path) for path, _ in files) / 1024 / 1024
+        out_path = os.path.join(root, "deploy.zip")
+        console.print(f"Corpus: {len(files)} files, {size:.1f} MB")
+
+        def serial(f):
+            with zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as zip_handler:
+                zip_folder(project, zip_handler)
+
+        runs = [("zip_folder", serial)]
+        for workers in args.workers:
+            runs.append((f"write_zip x{workers}", lambda f, w=workers: write_zip(file_members(files), f, w)))
+        for name, policy in POLICIES.items():
+            runs.append((
+                f"policy {name}",
+                lambda f, p=policy(): write_zip(file_members(files, p), f, DEFAULT_WORKERS),
+            ))
+
+        report = table("Archive", ["run", "wall s", "CPU s", "size MB", "MB/s", "vs baseline"])
+        for name, write in runs:
+            result = _measure(write, out_path)
+            results[name] = result
+            report.add_row(
+                name,
+                f"{result['wall_s']:.2f}",
+                f"{result['cpu_s']:.2f}",
+                f"{result['size_mb']:.1f}",
+                f"{size / result['wall_s']:.0f}",
+                versus(result["wall_s"], baseline.get(name, {}).get("wall_s")),
+            )
+        console.print(report)
+
+    if args.save_baseline:
+        save_baseline("archive", results)
+        console.print("Baseline saved")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import json
+import os
+import resource
+import select
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import tomlkit
+from rich.console import Console
+from rich.table import Table
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+BUDGETS_PATH = os.path.join(BENCHMARKS_DIR, "budgets.toml")
+BASELINE_PATH = os.path.join(BENCHMARKS_DIR, "baseline.json")
+
+console = Console()
+
+
+@dataclass
+class ProcessRun:
+    first_output: Optional[float]
+    wall: float
+    max_rss_mb: float
+    returncode: int
+    output: str
+
+
+def max_rss_mb(rusage) -> float:
+    # kilobytes on Linux, bytes on macOS
+    return rusage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_process(
+        argv: list[str],
+        env: Optional[dict] = None,
+        cwd: Optional[str] = None,
+        timeout: float = 60,
+) -> ProcessRun:
+    """
+    Run `argv` with an empty stdin and no controlling terminal (so prompts fail fast),
+    timing the first byte of output (stdout or stderr) and the exit, and reading its peak RSS.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        argv,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        env=env,
+        cwd=cwd,
+        start_new_session=True,
+    )
+    first_output = None
+    chunks = []
+    fd = process.stdout.fileno()
+    while True:
+        ready, _, _ = select.select([fd], [], [], max(0.0, timeout - (time.perf_counter() - start)))
+        if not ready:
+            process.kill()
+            break
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            break
+        if first_output is None:
+            first_output = time.perf_counter() - start
+        chunks.append(chunk)
+
+    _, status, rusage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    process.stdout.close()
+    return ProcessRun(first_output, wall, max_rss_mb(rusage), process.returncode, b"".join(chunks).decode(errors="replace"))
+
+
+@contextmanager
+def isolated_home(api_server: str, token: Optional[str] = "bench-token") -> Iterator[dict]:
+    """
+    A temporary `HOME` whose funix-cloud config points to `api_server`.
+
+    :return: The environment for subprocesses.
+    """
+    with tempfile.TemporaryDirectory(prefix="funix-cloud-bench-") as home:
+        config_dir = os.path.join(home, ".config", "funix-cloud")
+        os.makedirs(config_dir)
+        with open(os.path.join(config_dir, "config.json"), "w") as f:
+            json.dump({"token": token, "api_server": api_server}, f)
+        env = dict(os.environ, HOME=home, COLUMNS="100", TERM="dumb", PYTHONDONTWRITEBYTECODE="1")
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")]))
+        env.pop("FUNIX_CLOUD_PROFILE", None)
+        yield env
+
+
+def median(values: list[float]) -> float:
+    return statistics.median(values) if values else float("nan")
+
+
+def cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def load_budgets() -> dict:
+    with open(BUDGETS_PATH) as f:
+        return tomlkit.loads(f.read()).unwrap()
+
+
+def load_baseline() -> dict:
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH) as f:
+        return json.load(f)
+
+
+def save_baseline(section: str, results: dict):
+    baseline = load_baseline()
+    baseline[section] = results
+    with open(BASELINE_PATH, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def versus(value: float, base: Optional[float]) -> str:
+    if base is None or not base:
+        return ""
+    return f"{(value - base) / base * 100:+.0f}%"
+
+
+def table(title: str, columns: list[str]) -> Table:
+    result = Table(title=title)
+    for i, column in enumerate(columns):
+        result.add_column(column, justify="left" if i == 0 else "right")
+    return result
+
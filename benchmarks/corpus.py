@@ -0,0 +1,78 @@
+"""
+A synthetic project with the kinds of files deployments carry: source code, text data,
+already compressed assets, incompressible binaries and a large semi-compressible file.
+"""
+import io
+import os
+import random
+import zipfile
+
+import funix_cloud
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(funix_cloud.__file__))
+
+
+def _source_text() -> bytes:
+    chunks = []
+    for folder, _, filenames in os.walk(SOURCE_DIR):
+        for filename in sorted(filenames):
+            if filename.endswith(".py"):
+                with open(os.path.join(folder, filename), "rb") as f:
+                    chunks.append(f.read())
+    return b"\n".join(chunks)
+
+
+def _records(rng: random.Random, size: int) -> bytes:
+    # a database dump: repetitive structure, random values
+    out = io.BytesIO()
+    i = 0
+    while out.tell() < size:
+        out.write(f"{i},{rng.random():.8f},user{rng.randrange(10000)},{rng.choice(['a', 'b', 'c'])}\n".encode())
+        i += 1
+    return out.getvalue()[:size]
+
+
+def make_corpus(root: str, scale: float = 1.0, seed: int = 0) -> str:
+    """
+    Write the corpus to `root/project`, about `60 * scale` MB.
+
+    :return: The project folder.
+    """
+    rng = random.Random(seed)
+    project = os.path.join(root, "project")
+    os.makedirs(os.path.join(project, "app"), exist_ok=True)
+    os.makedirs(os.path.join(project, "data"), exist_ok=True)
+    os.makedirs(os.path.join(project, "assets"), exist_ok=True)
+
+    source = _source_text()
+    files = max(int(200 * scale), 1)
+    for i in range(files):
+        with open(os.path.join(project, "app", f"module_{i}.py"), "wb") as f:
+            start = rng.randrange(max(len(source) - 8192, 1))
+            f.write(source[start:start + 8192])
+
+    with open(os.path.join(project, "main.py"), "wb") as f:
+        f.write(b"from funix import funix\n\n\n@funix()\ndef hello(name: str) -> str:\n    return name\n")
+    with open(os.path.join(project, "requirements.txt"), "wb") as f:
+        f.write(b"funix\nnumpy\n")
+
+    with open(os.path.join(project, "data", "records.csv"), "wb") as f:
+        f.write(_records(rng, int(8 * 1024 * 1024 * scale)))
+    with open(os.path.join(project, "data", "snapshot.db"), "wb") as f:
+        f.write(_records(rng, int(24 * 1024 * 1024 * scale)))
+
+    for i in range(max(int(20 * scale), 1)):
+        with open(os.path.join(project, "assets", f"image_{i}.png"), "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n" + rng.randbytes(256 * 1024))
+
+    with open(os.path.join(project, "assets", "weights.bin"), "wb") as f:
+        f.write(rng.randbytes(int(16 * 1024 * 1024 * scale)))
+
+    wheel = io.BytesIO()
+    with zipfile.ZipFile(wheel, "w", zipfile.ZIP_DEFLATED) as archive:
+        for i in range(20):
+            archive.writestr(f"pkg/module_{i}.py", source[i * 4096:(i + 1) * 4096])
+    with open(os.path.join(project, "assets", "vendored-0.1-py3-none-any.whl"), "wb") as f:
+        f.write(wheel.getvalue())
+
+    return project
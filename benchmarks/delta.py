@@ -0,0 +1,120 @@
+"""
+Delta upload benchmark.
+
+Bytes on the wire to update a large file after an insertion, an overwrite, an append and a
+rewrite of the whole file (where the delta must give up quickly):
+a full upload, a deflated full upload, and a delta against the signature of the old file
+(counted with the signature itself, which the server sends back). Every delta is checked with
+`apply_delta`.
+
+    python -m benchmarks.delta [--size-mb 32] [--save-baseline]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import zlib
+
+from benchmarks.common import console, load_baseline, save_baseline, table, versus
+from funix_cloud.util import sha256_file
+from funix_cloud.util.delta import apply_delta, delta, signature
+
+
+def _edit(path: str, kind: str, rng: random.Random):
+    with open(path, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        if kind == "append":
+            f.write(rng.randbytes(256 * 1024))
+        elif kind == "overwrite":
+            f.seek(size // 2)
+            f.write(rng.randbytes(4096))
+        elif kind == "rewrite":
+            f.seek(0)
+            f.write(rng.randbytes(size))
+        elif kind == "insert":
+            # everything after the insertion point shifts, fixed blocks would all change
+            f.seek(size // 3)
+            tail = f.read()
+            f.seek(size // 3)
+            f.write(b"inserted line\n" * 100 + tail)
+
+
+def _deflated_size(path: str) -> int:
+    compressor = zlib.compressobj()
+    size = 0
+    with open(path, "rb") as f:
+        while block := f.read(1024 * 1024):
+            size += len(compressor.compress(block))
+    return size + len(compressor.flush())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=32, help="size of the file to update")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results in baseline.json")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    baseline = load_baseline().get("delta", {})
+    results = {}
+    failures = []
+
+    with tempfile.TemporaryDirectory(prefix="funix-cloud-bench-") as root:
+        old = os.path.join(root, "old.db")
+        with open(old, "wb") as f:
+            # semi-compressible, like a database file
+            for i in range(args.size_mb * 1024 * 1024 // 64):
+                f.write(f"{i:012d},{rng.random():.12f},{rng.randrange(1 << 30):010d},row\n".encode()[:64].ljust(64))
+
+        base = signature(old)
+        signature_size = len(json.dumps(base))
+
+        report = table("Delta", ["edit", "full MB", "deflated MB", "delta MB", "saved", "delta s", "vs baseline"])
+        for kind in ["insert", "overwrite", "append", "rewrite"]:
+            new = os.path.join(root, f"{kind}.db")
+            shutil.copyfile(old, new)
+            _edit(new, kind, rng)
+
+            start = time.perf_counter()
+            patch = delta(new, base)
+            seconds = time.perf_counter() - start
+            full = os.path.getsize(new)
+            if patch is None:
+                sent = full
+            else:
+                sent = patch.seek(0, os.SEEK_END) + signature_size
+                patch.seek(0)
+                rebuilt = os.path.join(root, "rebuilt.db")
+                with open(old, "rb") as base_file, open(rebuilt, "wb") as out:
+                    apply_delta(base_file, patch, out)
+                patch.close()
+                if sha256_file(rebuilt) != sha256_file(new):
+                    failures.append(f"the `{kind}` delta does not rebuild the file")
+
+            results[kind] = {"sent_bytes": sent, "full_bytes": full, "delta_s": seconds}
+            report.add_row(
+                kind,
+                f"{full / 1024 / 1024:.1f}",
+                f"{_deflated_size(new) / 1024 / 1024:.1f}",
+                f"{sent / 1024 / 1024:.2f}" + ("" if patch is not None else " (full)"),
+                f"{(1 - sent / full) * 100:.1f}%",
+                f"{seconds:.2f}",
+                versus(sent, baseline.get(kind, {}).get("sent_bytes")),
+            )
+        console.print(report)
+
+    if args.save_baseline:
+        save_baseline("delta", results)
+        console.print("Baseline saved")
+
+    if failures:
+        for failure in failures:
+            console.print(f"[red3]{failure}[/]")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Network benchmark, against the local API emulator.
+
+- Connection reuse: sequential and concurrent API calls through one `API` (a pooled keep-alive
+  session) against a plain `requests.post` per call, with the connections each opens.
+- Upload memory: peak RSS growth of `API.upload` (streamed multipart) against
+  `requests.post(files=...)`, which builds the whole body in memory. Fails when the streamed
+  upload grows by more than `--max-upload-growth-mb`.
+- Time to `file_id`: archive to a temporary file then upload, against `upload_stream`, which
+  compresses while it sends. `--bandwidth-mbps` caps the emulator to show the overlap.
+
+    python -m benchmarks.network [--latency 0.02] [--calls 50] [--upload-mb 64] [--bandwidth-mbps 20]
+"""
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import server
+from benchmarks.server import TOKEN
+from benchmarks.common import REPO_DIR, console, load_baseline, max_rss_mb, save_baseline, table, versus
+from benchmarks.corpus import make_corpus
+from funix_cloud.api import API, Routes
+from funix_cloud.util.ignore import walk
+from funix_cloud.util.archive import file_members, iter_zip, write_zip
+
+
+def _connection_reuse(stub: server.EmulatorServer, calls: int, concurrency: int) -> dict:
+    import requests
+
+    def fresh(_):
+        requests.post(stub.url + Routes.me, headers={"Authorization": f"Bearer {TOKEN}"}).json()
+
+    results = {}
+    with API(stub.url, TOKEN) as api:
+        def pooled(_):
+            api.me(TOKEN)
+
+        for name, call, workers in [
+            ("requests.post, sequential", fresh, 1),
+            ("API, sequential", pooled, 1),
+            (f"requests.post, {concurrency} threads", fresh, concurrency),
+            (f"API, {concurrency} threads", pooled, concurrency),
+        ]:
+            connections = stub.connections
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(call, range(calls)))
+            results[name] = {
+                "seconds": time.perf_counter() - start,
+                "connections": stub.connections - connections,
+            }
+    return results
+
+
+def _upload_child(mode: str, path: str, url: str):
+    """
+    Runs in a fresh interpreter so the peak RSS only covers one upload.
+    """
+    import requests
+
+    before = max_rss_mb(resource.getrusage(resource.RUSAGE_SELF))
+    if mode == "stream":
+        with API(url, TOKEN) as api:
+            api.upload(path, TOKEN)
+    else:
+        with open(path, "rb") as f:
+            requests.post(
+                url + Routes.upload,
+                files={"file": ("deploy.zip", f)},
+                headers={"Authorization": f"Bearer {TOKEN}"},
+            ).json()
+    print(max_rss_mb(resource.getrusage(resource.RUSAGE_SELF)) - before)
+
+
+def _upload_memory(stub: server.EmulatorServer, root: str, size_mb: int) -> dict:
+    path = os.path.join(root, "upload.bin")
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(random.randbytes(1024 * 1024))
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")]))
+    results = {}
+    for mode in ["stream", "requests"]:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.network", "--upload-child", mode, path, stub.url],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        results[mode] = float(output.strip().splitlines()[-1])
+    os.remove(path)
+    return results
+
+
+def _time_to_file_id(stub: server.EmulatorServer, root: str, scale: float) -> dict:
+    project = make_corpus(root, scale)
+    files = list(walk(project))
+    results = {}
+    with API(stub.url, TOKEN) as api:
+        start = time.perf_counter()
+        archive = os.path.join(root, "deploy.zip")
+        with open(archive, "wb") as f:
+            write_zip(file_members(files), f)
+        api.upload(archive, TOKEN)
+        results["temporary file"] = time.perf_counter() - start
+        os.remove(archive)
+
+        start = time.perf_counter()
+        api.upload_stream(iter_zip(file_members(files)), TOKEN)
+        results["stream"] = time.perf_counter() - start
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the emulator waits per request")
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--upload-mb", type=int, default=64, help="size of the upload of the memory test")
+    parser.add_argument("--max-upload-growth-mb", type=float, default=32)
+    parser.add_argument("--scale", type=float, default=0.5, help="size of the corpus, 1.0 is about 60 MB")
+    parser.add_argument("--bandwidth-mbps", type=float, help="upload bandwidth of the emulator, in MB/s")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results in baseline.json")
+    parser.add_argument("--upload-child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.upload_child:
+        _upload_child(*args.upload_child)
+        return
+
+    baseline = load_baseline().get("network", {})
+    results = {}
+    failures = []
+
+    stub = server.serve(latency=args.latency)
+    reuse = _connection_reuse(stub, args.calls, args.concurrency)
+    results["reuse"] = reuse
+    report = table(f"{args.calls} calls, {args.latency * 1000:.0f} ms latency", ["client", "s", "connections", "vs baseline"])
+    for name, result in reuse.items():
+        report.add_row(
+            name,
+            f"{result['seconds']:.2f}",
+            str(result["connections"]),
+            versus(result["seconds"], baseline.get("reuse", {}).get(name, {}).get("seconds")),
+        )
+    console.print(report)
+    stub.shutdown()
+    stub.server_close()
+
+    bandwidth = args.bandwidth_mbps * 1024 * 1024 if args.bandwidth_mbps else None
+    stub = server.serve(bandwidth=bandwidth)
+    with tempfile.TemporaryDirectory(prefix="funix-cloud-bench-") as root:
+        memory = _upload_memory(stub, root, args.upload_mb)
+        results["upload_growth_mb"] = memory
+        report = table(f"Peak RSS growth of a {args.upload_mb} MB upload", ["client", "MB", "vs baseline"])
+        for name, growth in memory.items():
+            report.add_row(name, f"{growth:.1f}", versus(growth, baseline.get("upload_growth_mb", {}).get(name)))
+        console.print(report)
+        if memory["stream"] > args.max_upload_growth_mb:
+            failures.append(
+                f"the streamed upload grows by {memory['stream']:.0f} MB, budget {args.max_upload_growth_mb:.0f} MB"
+            )
+
+        file_id = _time_to_file_id(stub, root, args.scale)
+        results["file_id_s"] = file_id
+        limit = f"{args.bandwidth_mbps} MB/s" if args.bandwidth_mbps else "no bandwidth limit"
+        report = table(f"Time to file_id, {limit}", ["upload", "s", "vs baseline"])
+        for name, seconds in file_id.items():
+            report.add_row(name, f"{seconds:.2f}", versus(seconds, baseline.get("file_id_s", {}).get(name)))
+        console.print(report)
+    stub.shutdown()
+    stub.server_close()
+
+    if args.save_baseline:
+        save_baseline("network", results)
+        console.print("Baseline saved")
+
+    if failures:
+        for failure in failures:
+            console.print(f"[red3]{failure}[/]")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+The API emulator of `funix_cloud.emulator` set up for the benchmarks: the `bench` account (its token
+is `TOKEN`) has `instances` running instances, the first one paused, and new deployments run at once.
+"""
+from typing import Optional
+
+from funix_cloud.emulator import EmulatorServer, serve as serve_emulator
+
+TOKEN = "bench-token"
+USERNAME = "bench"
+PASSWORD = "Bench-pass-1"
+EMAIL = "bench@example.com"
+
+
+def reset(emulator: EmulatorServer, instances: int = 12):
+    """
+    Put the emulator back in its initial state, so commands that change it (`delete`, `restore`...)
+    find the same instances on every run.
+    """
+    backend = emulator.backend
+    backend.reset()
+    backend.add_user(USERNAME, PASSWORD, TOKEN, EMAIL)
+    for i in range(instances):
+        instance_id = backend.add_instance(USERNAME, f"bench{i}")
+        if i == 0:
+            backend.pause_instance(instance_id)
+
+
+def serve(latency: float = 0.0, instances: int = 12, bandwidth: Optional[float] = None) -> EmulatorServer:
+    """
+    Start an emulator on a free local port in a background thread.
+    """
+    emulator = serve_emulator(
+        latency=latency,
+        bandwidth=bandwidth,
+        stage_seconds=0,
+        health_seconds=0,
+        max_instances=instances + 10,
+    )
+    reset(emulator, instances)
+    return emulator
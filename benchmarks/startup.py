@@ -0,0 +1,211 @@
+"""
+Startup benchmark of `funix-cloud` and `lmkc`.
+
+Measures the `python -X importtime` breakdown of the package modules, the modules they pull in,
+and for every command of `maps` the time to first output, the time to exit and the peak RSS,
+against the local API emulator. Fails when a budget of `budgets.toml` is exceeded.
+
+Time to first output is also reported less the first output of a bare interpreter measured in the
+same run (`python -c "print()"`), which is what the package adds and what `first_ms` budgets.
+
+    python -m benchmarks.startup [--repeat 5] [--top 10] [--save-baseline]
+"""
+import argparse
+import compileall
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import server
+from benchmarks.common import REPO_DIR, console, isolated_home, load_baseline, load_budgets, median, run_process, \
+    save_baseline, table, versus
+
+FUNIX_CLOUD = "import sys; sys.argv[0] = 'funix-cloud'; from funix_cloud import start; start()"
+LMKC = "import sys; sys.argv[0] = 'lmkc'; from funix_cloud.key import __main__; __main__()"
+INTERPRETER = "print()"
+
+# Arguments of the commands that need some, `{project}` is a small project folder.
+# Prompts get an empty stdin, so interactive commands stop at their first question.
+COMMAND_ARGS = {
+    "login": ["bench"],
+    "change-email": ["bench@example.com"],
+    "forget-password": ["bench", "bench@example.com"],
+    "deploy": ["{project}", "bench", "--timeout", "10"],
+    "delete": ["1"],
+    "query": ["1"],
+    "restore": ["1"],
+}
+
+SKIPPED_COMMANDS = {
+    "web": "serves the web tool until stopped",
+    "watch": "refreshes until stopped",
+}
+
+
+def import_profile(module: str, env: dict) -> tuple[float, list[tuple[float, str]], set[str]]:
+    """
+    :return: The cumulative import time of `module` in ms, the self time in ms of every module
+        it imported, and the names of the modules loaded.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import sys, json, {module}; print(json.dumps(list(sys.modules)))"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative = 0.0
+    breakdown = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        breakdown.append((int(self_us) / 1000, name.strip()))
+        if name.strip() == module and not name[1:].startswith(" "):
+            cumulative = int(cumulative_us) / 1000
+    loaded = set(json.loads(result.stdout.splitlines()[-1]))
+    return cumulative, sorted(breakdown, reverse=True), loaded
+
+
+def make_project(root: str) -> str:
+    project = os.path.join(root, "project")
+    os.makedirs(project)
+    with open(os.path.join(project, "main.py"), "w") as f:
+        f.write("from funix import funix\n\n\n@funix()\ndef hello(name: str) -> str:\n    return f'Hello, {name}!'\n")
+    with open(os.path.join(project, "requirements.txt"), "w") as f:
+        f.write("funix\n")
+    with open(os.path.join(project, "funix-cloud.toml"), "w") as f:
+        f.write('[main]\nname = "bench"\n\n[config]\nenv = false\ntimeout = 10\n')
+    return project
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs of every command, the median is reported")
+    parser.add_argument("--top", type=int, default=10, help="slowest modules to show for each import")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results in baseline.json")
+    parser.add_argument("--only", nargs="*", help="only run these commands")
+    args = parser.parse_args()
+
+    from funix_cloud.cli import maps
+
+    budgets = load_budgets()
+    baseline = load_baseline().get("startup", {})
+    failures = []
+    results = {"imports": {}, "commands": {}}
+    slowest = {}
+
+    # the runs don't write bytecode, stale or missing `.pyc` files would be compiled on every run
+    compileall.compile_dir(os.path.join(REPO_DIR, "funix_cloud"), quiet=1)
+
+    stub = server.serve()
+    with tempfile.TemporaryDirectory(prefix="funix-cloud-bench-") as root:
+        project = make_project(root)
+
+        with isolated_home(stub.url) as env:
+            imports = table("Import time", ["module", "cumulative ms", "vs baseline", "budget ms"])
+            for module, budget_ms in budgets["import_ms"].items():
+                cumulative = median([import_profile(module, env)[0] for _ in range(args.repeat)])
+                _, breakdown, loaded = import_profile(module, env)
+                results["imports"][module] = cumulative
+
+                forbidden = sorted(set(budgets["forbidden_imports"].get(module, [])) & loaded)
+                if forbidden:
+                    failures.append(f"importing `{module}` loads {', '.join(forbidden)}")
+                if cumulative > budget_ms:
+                    failures.append(f"importing `{module}` takes {cumulative:.0f} ms, budget {budget_ms} ms")
+
+                imports.add_row(
+                    module,
+                    f"{cumulative:.1f}",
+                    versus(cumulative, baseline.get("imports", {}).get(module)),
+                    f"{budget_ms}",
+                )
+                slowest[module] = breakdown[:args.top]
+            console.print(imports)
+            for module, breakdown in slowest.items():
+                console.print(f"Slowest imports of `{module}` (self ms): "
+                              + ", ".join(f"{name} {ms:.1f}" for ms, name in breakdown))
+
+        commands = [(name, [FUNIX_CLOUD, name, *COMMAND_ARGS.get(name, [])]) for name in maps]
+        commands.append(("lmkc", [LMKC, "--help"]))
+
+        with isolated_home(stub.url) as env:
+            interpreter = median([
+                run_process([sys.executable, "-c", INTERPRETER], env=env).first_output for _ in range(args.repeat)
+            ]) * 1000
+        results["interpreter_ms"] = interpreter
+        console.print(f"First output of a bare interpreter: {interpreter:.0f} ms")
+
+        report = table(
+            "Commands",
+            ["command", "first ms", "+ ms", "exit ms", "RSS MB", "code", "vs baseline", "budget + / exit ms / MB"],
+        )
+        command_budgets = budgets["commands"]
+        for name, code in commands:
+            if args.only and name not in args.only:
+                continue
+            if name in SKIPPED_COMMANDS:
+                console.print(f"Skipping `{name}`, it {SKIPPED_COMMANDS[name]}")
+                continue
+
+            argv = [sys.executable, "-c", code[0], *(arg.format(project=project) for arg in code[1:])]
+            runs = []
+            for _ in range(args.repeat):
+                # a fresh home for every run, `logout` and friends change the config
+                server.reset(stub)
+                with isolated_home(stub.url) as env:
+                    runs.append(run_process(argv, env=env, cwd=project))
+
+            first = median([run.first_output for run in runs if run.first_output is not None]) * 1000
+            wall = median([run.wall for run in runs]) * 1000
+            rss = max(run.max_rss_mb for run in runs)
+            added = first - interpreter
+            results["commands"][name] = {"first_ms": first, "wall_ms": wall, "rss_mb": rss}
+
+            budget = command_budgets.get("budgets", {}).get(name, {})
+            budget_first = budget.get("first_ms")
+            budget_ms = budget.get("ms", command_budgets["default_ms"])
+            budget_rss = budget.get("rss_mb", command_budgets["default_rss_mb"])
+            if budget_first is not None and not added <= budget_first:
+                failures.append(
+                    f"`{name}` prints its first output {added:.0f} ms after a bare interpreter would, "
+                    f"budget {budget_first} ms"
+                )
+            if wall > budget_ms:
+                failures.append(f"`{name}` takes {wall:.0f} ms, budget {budget_ms} ms")
+            if rss > budget_rss:
+                failures.append(f"`{name}` peaks at {rss:.0f} MB, budget {budget_rss} MB")
+
+            report.add_row(
+                name,
+                f"{first:.0f}",
+                f"{added:+.0f}",
+                f"{wall:.0f}",
+                f"{rss:.0f}",
+                str(runs[-1].returncode),
+                versus(wall, baseline.get("commands", {}).get(name, {}).get("wall_ms")),
+                f"{budget_first if budget_first is not None else '-'} / {budget_ms} / {budget_rss}",
+            )
+        console.print(report)
+        console.print(f"Emulator requests: {dict(stub.requests)}")
+
+    stub.shutdown()
+    stub.server_close()
+
+    if args.save_baseline:
+        save_baseline("startup", results)
+        console.print("Baseline saved")
+
+    if failures:
+        console.print("[red3]Over budget:[/]")
+        for failure in failures:
+            console.print(f"  - {failure}")
+        sys.exit(1)
+    console.print("[spring_green3]Every command is within its budget[/]")
+
+
+if __name__ == "__main__":
+    main()
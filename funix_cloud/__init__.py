@@ -1,27 +1,116 @@
 import sys
-import traceback
 
-import fire
-import requests
-from rich.console import Console
-from rich.prompt import Confirm
 
-from funix_cloud.cli import DeployCLI
+def __getattr__(name):
+    # created on first use, `--output jsonl` never imports Rich
+    if name == "console":
+        from rich.console import Console
 
-console = Console()
+        global console
+        console = Console()
+        return console
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _fire_args(args: list[str]) -> list[str]:
+    # fire takes the word after a flag as its value, even for a boolean, so `--trace deploy ...`
+    # would trace to a file named `deploy`
+    return ["--trace=True" if arg == "--trace" else arg for arg in args]
+
+
+# Commands run without fire when they are given no arguments: importing fire takes longer than they do
+FAST_COMMANDS = ("logout", "cache", "stats")
+
+
+def _usage() -> str:
+    from funix_cloud.cli import DeployCLI, maps
+
+    summary, _, description = DeployCLI.__doc__.strip().partition("\n")
+    lines = [
+        "NAME",
+        f"    funix-cloud - {summary}",
+        "",
+        "SYNOPSIS",
+        "    funix-cloud <flags> COMMAND",
+        "",
+        "DESCRIPTION",
+        f"    {description.strip()}",
+        "",
+        "FLAGS",
+    ]
+    for line in DeployCLI.__init__.__doc__.strip().splitlines()[1:]:
+        name, sep, help_text = line.strip().partition(": ")
+        if sep and " (" in name:
+            lines.append(f"    --{name.split(' (')[0].replace('_', '-')}")
+            lines.append(f"        {help_text}")
+        elif line.strip():
+            # the description goes on
+            lines[-1] += f" {line.strip()}"
+    lines += ["", "COMMANDS", "    COMMAND is one of the following:"]
+    for command in sorted(maps):
+        doc = getattr(DeployCLI, maps[command]).__doc__ or ""
+        lines += ["", f"     {command}", f"       {doc.strip().splitlines()[0] if doc.strip() else ''}"]
+    return "\n".join(lines)
+
+
+def _run_fast(args: list[str]) -> bool:
+    """
+    Run `funix-cloud --help` and the commands of `FAST_COMMANDS` without fire, False if `args`
+    need fire to be parsed.
+    """
+    if args in (["--help"], ["-h"]):
+        print(_usage())
+        return True
+    if len(args) != 1 or args[0] not in FAST_COMMANDS:
+        return False
+
+    from funix_cloud.cli import DeployCLI
+
+    getattr(DeployCLI(), args[0])()
+    return True
+
+
+def _run_fire(args: list[str]):
+    import fire
+
+    from funix_cloud.cli import DeployCLI
+
+    fire.Fire(DeployCLI, command=_fire_args(args))
 
 
 def start():
+    # imported here so that `import funix_cloud.api` doesn't load the CLI
+    from funix_cloud.cli.output import active
+
+    args = sys.argv[1:]
     try:
         try:
-            fire.Fire(DeployCLI)
-        except requests.exceptions.ConnectionError as e:
-            see_full = Confirm.ask("ConnectionError, maybe the server is down? Do you want to see full stacktrace?")
+            if not _run_fast(args):
+                _run_fire(args)
+        except Exception as e:
+            # `requests` is only imported by the commands that talk to the server
+            requests = sys.modules.get("requests")
+            if requests is None or not isinstance(e, requests.exceptions.RequestException):
+                raise
+            # ConnectionError, ReadTimeout, ...
+            name = type(e).__name__
+            if active() is not None:
+                active().emit("error", code=name, value=None, message=str(e), response=None)
+                sys.exit(1)
+
+            from rich.prompt import Confirm
+
+            see_full = Confirm.ask(f"{name}, maybe the server is down? Do you want to see full stacktrace?")
             if see_full:
+                import traceback
+
                 print()
                 print(traceback.format_exc())
             sys.exit(1)
     except (EOFError, KeyboardInterrupt):
+        if active() is not None:
+            active().emit("interrupted")
+            sys.exit(1)
         print()
         print("Exiting..")
         sys.exit(1)
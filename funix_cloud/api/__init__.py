@@ -1,11 +1,16 @@
 import json
 from dataclasses import dataclass
 from enum import Enum
-from typing import Any, Optional, TypedDict
+from typing import TYPE_CHECKING, Any, BinaryIO, Iterable, Optional, TypedDict
 
-import requests
-from rich.console import Console
-from rich.markdown import Markdown
+from funix_cloud.api.multipart import MultipartEncoder, SizedStream
+
+# `requests` and the rich renderers are imported on first use, the CLI imports this module for every command
+if TYPE_CHECKING:
+    import requests
+    from rich.console import Console
+
+    from funix_cloud.api.trace import Tracer
 
 
 class ServerResponse(TypedDict):
@@ -74,7 +79,7 @@ def instance_stage_from_int(code: int):
             return f"Unknown {code}"
 
 
-def __print_json(console: Console, data: dict | None):
+def __print_json(console: "Console", data: dict | None):
     if data is None:
         return
 
@@ -88,18 +93,26 @@ def __print_json(console: Console, data: dict | None):
 
 
 def __print_markdown(console, data: str):
+    from rich.markdown import Markdown
+
     console.print(Markdown(data))
 
 
 def print_from_resp(
-        console: Console,
+        console: "Console",
         response: ServerResponse,
 ):
     code = ErrorCodes(response["code"])
     print_from_err(console, code, response)
 
 
-def print_from_err(console: Console, code: ErrorCodes, data: dict | None = None):
+def print_from_err(console: "Console", code: ErrorCodes, data: dict | None = None):
+    if getattr(console, "structured", False):
+        # `--output jsonl`, the error code is the message
+        if code != ErrorCodes.Success:
+            console.error(code, data)
+        return
+
     match code:
         case ErrorCodes.Success:
             return
@@ -298,99 +311,250 @@ class Routes:
     forget_password: str = "/user/password/forget"
     reset_password: str = "/user/password/reset"
     upload: str = "/file/upload"
+    upload_session: str = "/file/upload/session"
+    upload_part: str = "/file/upload/part"
+    upload_complete: str = "/file/upload/complete"
+    manifest_check: str = "/file/manifest"
+    manifest_blob: str = "/file/manifest/blob"
+    manifest_delta: str = "/file/manifest/delta"
+    manifest_commit: str = "/file/manifest/commit"
     remove_instance: str = "/instance/remove"
     deploy_git: str = "/instance/create/git"
     deploy_zip: str = "/instance/create/upload"
     query_instance: str = "/instance/query"
     query_instance_health: str = "/instance/health"
+    instance_events: str = "/instance/events"
     query_all_instance: str = "/instance/query/all"
     restore_instance: str = "/instance/restore"
 
 
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = (5.0, 60.0)
+
+
 class API:
-    def __init__(self, base_url: str):
+    def __init__(
+            self,
+            base_url: str,
+            token: str | None = None,
+            pool_size: int = DEFAULT_POOL_SIZE,
+            timeout: float | tuple[float, float] | None = DEFAULT_TIMEOUT,
+            keep_alive: bool = True,
+            tracer: Optional["Tracer"] = None,
+    ):
+        import requests
+        from requests.adapters import HTTPAdapter
+
         self.base_url = base_url
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        if tracer is not None:
+            # the timing of every request goes to `tracer`, see `funix_cloud.api.trace`
+            from funix_cloud.api.trace import TracingAdapter
+
+            adapter = TracingAdapter(tracer, pool_connections=pool_size, pool_maxsize=pool_size)
+        else:
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+        self.set_token(token)
+
+    def set_token(self, token: str | None):
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+        else:
+            self.session.headers.pop("Authorization", None)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def post(self, route: str, token: str | None = None, **kwargs) -> "requests.Response":
+        if token:
+            kwargs["headers"] = {"Authorization": f"Bearer {token}", **kwargs.get("headers", {})}
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.post(self.base_url + route, **kwargs)
 
     def login(self, username: str, password: str) -> ServerResponse:
-        r = requests.post(
-            self.base_url + Routes.login,
+        r = self.post(
+            Routes.login,
             json={"username": username, "password": password},
         )
         return r.json()
 
     def register(self, username: str, password: str) -> ServerResponse:
-        r = requests.post(
-            self.base_url + Routes.register,
+        r = self.post(
+            Routes.register,
             json={"username": username, "password": password},
         )
         return r.json()
 
     def bind_email(self, token: str, email: str) -> ServerResponse:
-        r = requests.post(
-            self.base_url + Routes.change_email,
+        r = self.post(
+            Routes.change_email,
+            token,
             json={"email": email},
-            headers={"Authorization": f"Bearer {token}"},
         )
         return r.json()
 
     def me(self, token: str) -> ServerResponse:
-        r = requests.post(
-            self.base_url + Routes.me,
-            headers={"Authorization": f"Bearer {token}"},
-        )
+        r = self.post(Routes.me, token)
         return r.json()
 
     def two_fa_request(self, token: str) -> ServerResponse:
-        r = requests.post(
-            self.base_url + Routes.two_fa_request,
-            headers={"Authorization": f"Bearer {token}"},
-        )
+        r = self.post(Routes.two_fa_request, token)
         return r.json()
 
     def two_fa_bind(self, token: str, ticket: str, code: str) -> ServerResponse:
-        r = requests.post(
-            self.base_url + Routes.two_fa_bind,
+        r = self.post(
+            Routes.two_fa_bind,
+            token,
             json={"ticket": ticket, "code": code},
-            headers={"Authorization": f"Bearer {token}"},
         )
         return r.json()
 
     def change_password(
             self, token: str, old_password: str, new_password: str
     ) -> ServerResponse:
-        r = requests.post(
-            self.base_url + Routes.change_password,
+        r = self.post(
+            Routes.change_password,
+            token,
             json={"old_password": old_password, "new_password": new_password},
-            headers={"Authorization": f"Bearer {token}"},
         )
         return r.json()
 
     def forget_password(self, username: str, email: str):
-        r = requests.post(
-            self.base_url + Routes.forget_password,
+        r = self.post(
+            Routes.forget_password,
             json={"username": username, "email": email},
         )
         return r.json()
 
     def reset_password(self, ticket: str, code: int, password: str):
-        r = requests.post(
-            self.base_url + Routes.reset_password,
+        r = self.post(
+            Routes.reset_password,
             json={"ticket": ticket, "code": code, "password": password},
         )
         return r.json()
 
     def upload(self, path: str, token: str):
-        r = requests.post(
-            self.base_url + Routes.upload,
-            files={"file": ("deploy.zip", open(path, "rb"))},
-            headers={"Authorization": f"Bearer {token}"},
+        with MultipartEncoder("file", "deploy.zip", path) as encoder:
+            r = self.post(
+                Routes.upload,
+                token,
+                data=encoder,
+                headers={"Content-Type": encoder.content_type},
+            )
+        return r.json()
+
+    def upload_stream(self, chunks: Iterable[bytes], token: str) -> ServerResponse:
+        """
+        Upload an archive produced on the fly, it is sent with chunked transfer encoding.
+        """
+        with MultipartEncoder("file", "deploy.zip", chunks) as encoder:
+            r = self.post(
+                Routes.upload,
+                token,
+                data=iter(encoder),
+                headers={"Content-Type": encoder.content_type},
+            )
+        return r.json()
+
+    def upload_session(self, token: str, manifest: dict) -> ServerResponse | None:
+        """
+        Open (or reopen, when `manifest` carries an `upload_id`) a chunked upload session.
+        Returns `None` when the server does not support chunked uploads.
+        """
+        r = self.post(Routes.upload_session, token, json=manifest)
+        if r.status_code in (404, 405, 501):
+            return None
+        try:
+            return r.json()
+        except ValueError:
+            return None
+
+    def upload_part(self, token: str, upload_id: str, index: int, data: bytes, sha256: str) -> ServerResponse:
+        r = self.post(
+            Routes.upload_part,
+            token,
+            params={"upload_id": upload_id, "index": index, "sha256": sha256},
+            data=data,
+            headers={"Content-Type": "application/octet-stream"},
+        )
+        return r.json()
+
+    def upload_complete(self, token: str, upload_id: str) -> ServerResponse:
+        r = self.post(Routes.upload_complete, token, json={"upload_id": upload_id})
+        return r.json()
+
+    def manifest_check(self, token: str, manifest: list[dict]) -> ServerResponse | None:
+        """
+        Send a file manifest, the server answers with the hashes it does not have yet.
+        Returns `None` when the server does not support manifest uploads.
+        """
+        r = self.post(Routes.manifest_check, token, json={"files": manifest})
+        if r.status_code in (404, 405, 501):
+            return None
+        try:
+            return r.json()
+        except ValueError:
+            return None
+
+    def manifest_blob(self, token: str, sha256: str, data: BinaryIO, size: int) -> ServerResponse:
+        r = self.post(
+            Routes.manifest_blob,
+            token,
+            params={"sha256": sha256},
+            data=SizedStream(data, size),
+            headers={"Content-Type": "application/octet-stream"},
+        )
+        return r.json()
+
+    def manifest_delta(
+            self, token: str, base_sha256: str, sha256: str, patch: BinaryIO, size: int
+    ) -> ServerResponse | None:
+        """
+        Create the blob `sha256` from the blob `base_sha256` the server already has and a delta
+        produced by `funix_cloud.util.delta.delta`. Returns `None` when the server does not support deltas.
+        """
+        r = self.post(
+            Routes.manifest_delta,
+            token,
+            params={"base": base_sha256, "sha256": sha256},
+            data=SizedStream(patch, size),
+            headers={"Content-Type": "application/octet-stream"},
         )
+        if r.status_code in (404, 405, 501):
+            return None
+        try:
+            return r.json()
+        except ValueError:
+            return None
+
+    def manifest_commit(self, token: str, manifest: list[dict]) -> ServerResponse:
+        r = self.post(Routes.manifest_commit, token, json={"files": manifest})
+        return r.json()
+
+    def deploy_git(self, token: str, req_json: dict) -> ServerResponse:
+        r = self.post(Routes.deploy_git, token, json=req_json)
+        return r.json()
+
+    def deploy_zip(self, token: str, req_json: dict) -> ServerResponse:
+        r = self.post(Routes.deploy_zip, token, json=req_json)
         return r.json()
 
     def remove_instance(self, instance_id: int, token: str):
-        r = requests.post(
-            self.base_url + Routes.remove_instance,
-            headers={"Authorization": f"Bearer {token}"},
+        r = self.post(
+            Routes.remove_instance,
+            token,
             json={
                 "id": instance_id,
             }
@@ -398,9 +562,9 @@ class API:
         return r.json()
 
     def query_instance(self, instance_id: int, token: str):
-        r = requests.post(
-            self.base_url + Routes.query_instance,
-            headers={"Authorization": f"Bearer {token}"},
+        r = self.post(
+            Routes.query_instance,
+            token,
             json={
                 "id": instance_id,
             }
@@ -408,9 +572,9 @@ class API:
         return r.json()
 
     def restore_instance(self, instance_id: int, token: str):
-        r = requests.post(
-            self.base_url + Routes.restore_instance,
-            headers={"Authorization": f"Bearer {token}"},
+        r = self.post(
+            Routes.restore_instance,
+            token,
             json={
                 "id": instance_id,
             }
@@ -418,9 +582,9 @@ class API:
         return r.json()
 
     def query_instance_health(self, instance_id: int, token: str):
-        r = requests.post(
-            self.base_url + Routes.query_instance_health,
-            headers={"Authorization": f"Bearer {token}"},
+        r = self.post(
+            Routes.query_instance_health,
+            token,
             json={
                 "id": instance_id,
             }
@@ -428,8 +592,5 @@ class API:
         return r.json()
 
     def query_all_instance(self, token: str):
-        r = requests.post(
-            self.base_url + Routes.query_all_instance,
-            headers={"Authorization": f"Bearer {token}"},
-        )
+        r = self.post(Routes.query_all_instance, token)
         return r.json()
@@ -0,0 +1,220 @@
+import asyncio
+import json
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, BinaryIO, Callable, Iterable, TypeVar
+
+import aiohttp
+
+from funix_cloud.api import DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT, Routes, ServerResponse
+
+T = TypeVar("T")
+
+
+async def gather_limited(calls: Iterable[Callable[[], Awaitable[T]]], limit: int = DEFAULT_POOL_SIZE) -> list[T]:
+    """
+    Like `asyncio.gather`, but never runs more than `limit` calls at the same time. Each call is only
+    made once a slot is free, so no coroutine is created ahead of time. Results keep the order of `calls`.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(call: Callable[[], Awaitable[T]]) -> T:
+        async with semaphore:
+            return await call()
+
+    return await asyncio.gather(*(run(call) for call in calls))
+
+
+class AsyncAPI:
+    """
+    Asyncio version of `funix_cloud.api.API`, every method returns the same `ServerResponse`.
+
+    The arguments of every method are those of `API`, a `None` token stands for the one the client
+    was created with. Use it as an async context manager so the connection pool is closed:
+
+        async with AsyncAPI(base_url, token) as api:
+            results = await gather_limited(partial(api.query_instance, i) for i in ids)
+    """
+
+    def __init__(
+            self,
+            base_url: str,
+            token: str | None = None,
+            pool_size: int = DEFAULT_POOL_SIZE,
+            timeout: float | tuple[float, float] | None = DEFAULT_TIMEOUT,
+    ):
+        self.base_url = base_url
+        self.token = token
+        self.pool_size = pool_size
+        if isinstance(timeout, tuple):
+            self.timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        else:
+            self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=self.timeout,
+            )
+        return self._session
+
+    def set_token(self, token: str | None):
+        self.token = token
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def post(self, route: str, token: str | None = None, **kwargs) -> ServerResponse:
+        token = token or self.token
+        if token:
+            kwargs["headers"] = {"Authorization": f"Bearer {token}", **kwargs.get("headers", {})}
+        async with self.session.post(self.base_url + route, **kwargs) as r:
+            return await r.json(content_type=None)
+
+    async def login(self, username: str, password: str) -> ServerResponse:
+        return await self.post(Routes.login, json={"username": username, "password": password})
+
+    async def register(self, username: str, password: str) -> ServerResponse:
+        return await self.post(Routes.register, json={"username": username, "password": password})
+
+    async def bind_email(self, token: str | None, email: str) -> ServerResponse:
+        return await self.post(Routes.change_email, token, json={"email": email})
+
+    async def me(self, token: str | None = None) -> ServerResponse:
+        return await self.post(Routes.me, token)
+
+    async def two_fa_request(self, token: str | None = None) -> ServerResponse:
+        return await self.post(Routes.two_fa_request, token)
+
+    async def two_fa_bind(self, token: str | None, ticket: str, code: str) -> ServerResponse:
+        return await self.post(Routes.two_fa_bind, token, json={"ticket": ticket, "code": code})
+
+    async def change_password(
+            self, token: str | None, old_password: str, new_password: str
+    ) -> ServerResponse:
+        return await self.post(
+            Routes.change_password,
+            token,
+            json={"old_password": old_password, "new_password": new_password},
+        )
+
+    async def forget_password(self, username: str, email: str) -> ServerResponse:
+        return await self.post(Routes.forget_password, json={"username": username, "email": email})
+
+    async def reset_password(self, ticket: str, code: int, password: str) -> ServerResponse:
+        return await self.post(
+            Routes.reset_password,
+            json={"ticket": ticket, "code": code, "password": password},
+        )
+
+    async def upload(self, path: str, token: str | None = None) -> ServerResponse:
+        with open(path, "rb") as f:
+            form = aiohttp.FormData()
+            form.add_field("file", f, filename="deploy.zip")
+            return await self.post(Routes.upload, token, data=form)
+
+    async def upload_session(self, token: str | None, manifest: dict[str, Any]) -> ServerResponse:
+        return await self.post(Routes.upload_session, token, json=manifest)
+
+    async def upload_part(
+            self, token: str | None, upload_id: str, index: int, data: bytes, sha256: str
+    ) -> ServerResponse:
+        return await self.post(
+            Routes.upload_part,
+            token,
+            params={"upload_id": upload_id, "index": index, "sha256": sha256},
+            data=data,
+            headers={"Content-Type": "application/octet-stream"},
+        )
+
+    async def upload_complete(self, token: str | None, upload_id: str) -> ServerResponse:
+        return await self.post(Routes.upload_complete, token, json={"upload_id": upload_id})
+
+    async def manifest_check(self, token: str | None, manifest: list[dict[str, Any]]) -> ServerResponse:
+        return await self.post(Routes.manifest_check, token, json={"files": manifest})
+
+    async def manifest_blob(self, token: str | None, sha256: str, data: BinaryIO, size: int) -> ServerResponse:
+        return await self.post(
+            Routes.manifest_blob,
+            token,
+            params={"sha256": sha256},
+            data=data,
+            headers={"Content-Type": "application/octet-stream", "Content-Length": str(size)},
+        )
+
+    async def manifest_delta(
+            self, token: str | None, base_sha256: str, sha256: str, patch: BinaryIO, size: int
+    ) -> ServerResponse:
+        return await self.post(
+            Routes.manifest_delta,
+            token,
+            params={"base": base_sha256, "sha256": sha256},
+            data=patch,
+            headers={"Content-Type": "application/octet-stream", "Content-Length": str(size)},
+        )
+
+    async def manifest_commit(self, token: str | None, manifest: list[dict[str, Any]]) -> ServerResponse:
+        return await self.post(Routes.manifest_commit, token, json={"files": manifest})
+
+    async def deploy_git(self, token: str | None, req_json: dict[str, Any]) -> ServerResponse:
+        return await self.post(Routes.deploy_git, token, json=req_json)
+
+    async def deploy_zip(self, token: str | None, req_json: dict[str, Any]) -> ServerResponse:
+        return await self.post(Routes.deploy_zip, token, json=req_json)
+
+    async def remove_instance(self, instance_id: int, token: str | None = None) -> ServerResponse:
+        return await self.post(Routes.remove_instance, token, json={"id": instance_id})
+
+    async def query_instance(self, instance_id: int, token: str | None = None) -> ServerResponse:
+        return await self.post(Routes.query_instance, token, json={"id": instance_id})
+
+    async def restore_instance(self, instance_id: int, token: str | None = None) -> ServerResponse:
+        return await self.post(Routes.restore_instance, token, json={"id": instance_id})
+
+    async def query_instance_health(self, instance_id: int, token: str | None = None) -> ServerResponse:
+        return await self.post(Routes.query_instance_health, token, json={"id": instance_id})
+
+    async def instance_events(self, instance_id: int, token: str | None = None) -> AsyncIterator[ServerResponse]:
+        """
+        Server-sent status events of an instance, see `funix_cloud.api.watcher.StreamWatcher`.
+        """
+        token = token or self.token
+        headers = {"Accept": "text/event-stream"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        async with self.session.post(
+                self.base_url + Routes.instance_events, json={"id": instance_id}, headers=headers
+        ) as r:
+            r.raise_for_status()
+            data_lines: list[str] = []
+            async for raw in r.content:
+                line = raw.decode().rstrip("\r\n")
+                if line.startswith("data:"):
+                    data_lines.append(line[5:].lstrip())
+                elif not line and data_lines:
+                    yield json.loads("\n".join(data_lines))
+                    data_lines = []
+
+    async def query_all_instance(self, token: str | None = None) -> ServerResponse:
+        return await self.post(Routes.query_all_instance, token)
+
+    async def query_instances(self, instance_ids: Iterable[int], limit: int | None = None) -> list[ServerResponse]:
+        return await gather_limited(
+            (partial(self.query_instance, i) for i in instance_ids), limit or self.pool_size
+        )
+
+    async def query_instances_health(
+            self, instance_ids: Iterable[int], limit: int | None = None
+    ) -> list[ServerResponse]:
+        return await gather_limited(
+            (partial(self.query_instance_health, i) for i in instance_ids), limit or self.pool_size
+        )
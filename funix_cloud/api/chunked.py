@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, TypedDict
+
+import requests
+
+from funix_cloud.api import API, ServerResponse
+from funix_cloud.config import file_lock, write_json_atomic
+
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_WORKERS = 4
+PART_RETRIES = 5
+# Unfinished sessions are assumed to be dropped by the server like uploaded files, after 30 minutes
+SESSION_TTL = 30 * 60
+
+
+class PartInfo(TypedDict):
+    index: int
+    offset: int
+    size: int
+    sha256: str
+
+
+class ChunkedUploadError(Exception):
+    def __init__(self, response: ServerResponse):
+        super().__init__(response.get("message"))
+        self.response = response
+
+
+def describe_parts(path: str, part_size: int = DEFAULT_PART_SIZE) -> tuple[str, list[PartInfo]]:
+    """
+    Split `path` into parts of `part_size` bytes and hash each of them, in a single read pass.
+
+    :return: The sha256 of the whole file and the list of parts.
+    """
+    whole = hashlib.sha256()
+    parts: list[PartInfo] = []
+    with open(path, "rb") as f:
+        offset = 0
+        while chunk := f.read(part_size):
+            whole.update(chunk)
+            parts.append({
+                "index": len(parts),
+                "offset": offset,
+                "size": len(chunk),
+                "sha256": hashlib.sha256(chunk).hexdigest(),
+            })
+            offset += len(chunk)
+    return whole.hexdigest(), parts
+
+
+class ChunkedUploader:
+    """
+    Upload a file as checksummed parts over several connections.
+
+    Sessions are remembered in `state_path` (keyed by the file hash) for `session_ttl` seconds,
+    so an upload interrupted by a lost connection only sends the parts the server has not
+    acknowledged yet when the same archive is uploaded again. They are forgotten once the upload
+    completes or the server rejects it.
+    """
+
+    def __init__(
+            self,
+            api: API,
+            token: str,
+            state_path: str,
+            part_size: int = DEFAULT_PART_SIZE,
+            workers: int = DEFAULT_WORKERS,
+            on_progress: Optional[Callable[[int, int], None]] = None,
+            session_ttl: float = SESSION_TTL,
+    ):
+        self.api = api
+        self.token = token
+        self.state_path = state_path
+        self.lock_path = state_path + ".lock"
+        self.part_size = part_size
+        self.workers = workers
+        self.on_progress = on_progress
+        self.session_ttl = session_ttl
+
+    def _load_state(self) -> dict:
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # the server has dropped these sessions, they are removed at the next save
+        now = time.time()
+        return {sha256: session for sha256, session in state.items() if now - session["created"] < self.session_ttl}
+
+    @contextmanager
+    def _update_state(self) -> Iterator[dict]:
+        """
+        The resume state, locked for the block and saved after it: the apps of `run` upload from
+        several threads, and a crash must not leave a truncated file.
+        """
+        with file_lock(self.lock_path):
+            state = self._load_state()
+            yield state
+            write_json_atomic(self.state_path, state)
+
+    def _send_part(self, path: str, upload_id: str, part: PartInfo) -> ServerResponse:
+        with open(path, "rb") as f:
+            f.seek(part["offset"])
+            data = f.read(part["size"])
+
+        for attempt in range(PART_RETRIES):
+            try:
+                resp = self.api.upload_part(self.token, upload_id, part["index"], data, part["sha256"])
+                if resp["code"] == 0 or attempt == PART_RETRIES - 1:
+                    return resp
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == PART_RETRIES - 1:
+                    raise
+            time.sleep(min(2 ** attempt, 10) * random.uniform(0.5, 1.0))
+
+    def upload(self, path: str) -> Optional[ServerResponse]:
+        """
+        :return: The `/file/upload/complete` response (same shape as `/file/upload`),
+            or `None` if the server does not support chunked uploads.
+        """
+        sha256, parts = describe_parts(path, self.part_size)
+        state = self._load_state()
+
+        manifest = {
+            "size": sum(part["size"] for part in parts),
+            "sha256": sha256,
+            "part_size": self.part_size,
+            "parts": [{"index": p["index"], "size": p["size"], "sha256": p["sha256"]} for p in parts],
+        }
+        if sha256 in state:
+            manifest["upload_id"] = state[sha256]["upload_id"]
+
+        session = self.api.upload_session(self.token, manifest)
+        if session is None:
+            return None
+        if session["code"] != 0:
+            self._forget(sha256)
+            return session
+
+        upload_id = session["data"]["upload_id"]
+        received = set(session["data"].get("received") or [])
+        with self._update_state() as state:
+            if state.get(sha256, {}).get("upload_id") != upload_id:
+                state[sha256] = {"upload_id": upload_id, "created": time.time()}
+
+        pending = [part for part in parts if part["index"] not in received]
+        done = len(parts) - len(pending)
+        if self.on_progress:
+            self.on_progress(done, len(parts))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._send_part, path, upload_id, part) for part in pending]
+            for future in futures:
+                resp = future.result()
+                if resp["code"] != 0:
+                    self._forget(sha256)
+                    raise ChunkedUploadError(resp)
+                done += 1
+                if self.on_progress:
+                    self.on_progress(done, len(parts))
+
+        result = self.api.upload_complete(self.token, upload_id)
+        # done, or rejected for good
+        self._forget(sha256)
+        return result
+
+    def _forget(self, sha256: str):
+        with self._update_state() as state:
+            state.pop(sha256, None)
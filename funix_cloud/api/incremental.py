@@ -0,0 +1,247 @@
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Iterator, NamedTuple, Optional, TypedDict
+
+from funix_cloud.api import API, ServerResponse
+from funix_cloud.config import file_lock, write_json_atomic
+from funix_cloud.util import is_zip
+from funix_cloud.util.delta import Signature, delta, signature
+from funix_cloud.util.ignore import walk
+
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+DEFAULT_DELTA_THRESHOLD = 8 * 1024 * 1024
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class ManifestEntry(TypedDict):
+    path: str
+    size: int
+    sha256: str
+    mode: int
+
+
+class Blob(NamedTuple):
+    arcname: str
+    size: int
+    open: Callable[[], BinaryIO]
+    path: Optional[str] = None
+
+
+class UploadStats(TypedDict):
+    files: int
+    missing: int
+    full_bytes: int
+    sent_bytes: int
+    delta_files: int
+
+
+def hash_stream(f: BinaryIO) -> str:
+    digest = hashlib.sha256()
+    while block := f.read(HASH_BLOCK_SIZE):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def _hash_blob(blob: Blob) -> str:
+    with blob.open() as f:
+        return hash_stream(f)
+
+
+def _project_blobs(path) -> list[tuple[Blob, int]]:
+    blobs = []
+    for file_path, arcname in walk(path):
+        st = os.stat(file_path)
+        opener = lambda file_path=file_path: open(file_path, "rb")
+        blob = Blob(arcname.replace(os.sep, "/"), st.st_size, opener, file_path)
+        blobs.append((blob, stat.S_IMODE(st.st_mode)))
+    return blobs
+
+
+def _zip_blobs(archive: zipfile.ZipFile) -> list[tuple[Blob, int]]:
+    blobs = []
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        mode = (info.external_attr >> 16) & 0o7777 or 0o644
+        opener = lambda info=info: archive.open(info)
+        blobs.append((Blob(info.filename, info.file_size, opener), mode))
+    return blobs
+
+
+def build_manifest(
+        blobs: list[tuple[Blob, int]], workers: int = DEFAULT_WORKERS
+) -> tuple[list[ManifestEntry], dict[str, Blob]]:
+    """
+    Hash every blob on a thread pool (hashlib and zlib release the GIL).
+
+    :return: The manifest sorted by path, and a map from hash to one source with that content.
+    """
+    blobs = sorted(blobs, key=lambda item: item[0].arcname)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        hashes = list(executor.map(_hash_blob, (blob for blob, _ in blobs)))
+
+    manifest: list[ManifestEntry] = []
+    by_hash: dict[str, Blob] = {}
+    for (blob, mode), sha256 in zip(blobs, hashes):
+        manifest.append({"path": blob.arcname, "size": blob.size, "sha256": sha256, "mode": mode})
+        by_hash.setdefault(sha256, blob)
+    return manifest, by_hash
+
+
+@contextmanager
+def _local_file(blob: Blob) -> Iterator[str]:
+    """
+    A path on disk with the content of `blob`, zip members are extracted to a temporary file.
+    """
+    if blob.path is not None:
+        yield blob.path
+        return
+
+    with tempfile.TemporaryDirectory(prefix="funix-cloud-") as tmp:
+        local_path = os.path.join(tmp, "blob")
+        with blob.open() as src, open(local_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        yield local_path
+
+
+class DeltaState:
+    """
+    Block signatures of the large files of the last successful deploy of a project,
+    stored in `state_dir`, one JSON file per project path.
+    """
+
+    def __init__(self, state_dir: str, project_path: str):
+        key = hashlib.sha1(os.path.abspath(project_path).encode()).hexdigest()
+        self.path = os.path.join(state_dir, f"{key}.json")
+        self.signatures: dict[str, Signature] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self.signatures = json.load(f)
+            except (OSError, ValueError):
+                self.signatures = {}
+
+    def get(self, arcname: str) -> Optional[Signature]:
+        return self.signatures.get(arcname)
+
+    def save(self, signatures: dict[str, Signature]):
+        # apps of `run` deploying the same project save from several threads
+        with file_lock(self.path + ".lock"):
+            write_json_atomic(self.path, signatures)
+        self.signatures = signatures
+
+
+class IncrementalUploader:
+    """
+    Deploy a project folder or zip by content hash: only files whose content the server
+    does not already have are uploaded, then the manifest is committed into a `file_id`.
+
+    When `delta_dir` is given, files larger than `delta_threshold` that changed since the
+    last deploy are sent as a block delta against their previous version.
+    """
+
+    def __init__(
+            self,
+            api: API,
+            token: str,
+            workers: int = DEFAULT_WORKERS,
+            delta_dir: Optional[str] = None,
+            delta_threshold: int = DEFAULT_DELTA_THRESHOLD,
+            on_progress: Optional[Callable[[int, int, int], None]] = None,
+    ):
+        self.api = api
+        self.token = token
+        self.workers = workers
+        self.delta_dir = delta_dir
+        self.delta_threshold = delta_threshold
+        self.on_progress = on_progress
+        self.stats: Optional[UploadStats] = None
+
+    def _send_delta(self, sha256: str, blob: Blob, base: Signature) -> Optional[int]:
+        with _local_file(blob) as local_path:
+            patch = delta(local_path, base)
+        if patch is None:
+            return None
+
+        with patch:
+            size = patch.seek(0, 2)
+            patch.seek(0)
+            resp = self.api.manifest_delta(self.token, base["sha256"], sha256, patch, size)
+        if resp is None or resp["code"] != 0:
+            return None
+        return size
+
+    def _send(self, sha256: str, blob: Blob, state: Optional[DeltaState]) -> tuple[ServerResponse | None, int, bool]:
+        if state is not None and blob.size >= self.delta_threshold:
+            base = state.get(blob.arcname)
+            if base is not None and base["sha256"] != sha256:
+                sent = self._send_delta(sha256, blob, base)
+                if sent is not None:
+                    return None, sent, True
+
+        with blob.open() as f:
+            return self.api.manifest_blob(self.token, sha256, f, blob.size), blob.size, False
+
+    def _save_signatures(self, state: DeltaState, manifest: list[ManifestEntry], by_hash: dict[str, Blob]):
+        signatures: dict[str, Signature] = {}
+        for entry in manifest:
+            if entry["size"] < self.delta_threshold:
+                continue
+            previous = state.get(entry["path"])
+            if previous is not None and previous["sha256"] == entry["sha256"]:
+                signatures[entry["path"]] = previous
+                continue
+            with _local_file(by_hash[entry["sha256"]]) as local_path:
+                signatures[entry["path"]] = signature(local_path)
+        state.save(signatures)
+
+    def upload(self, path) -> Optional[ServerResponse]:
+        """
+        :return: The `/file/manifest/commit` response (same shape as `/file/upload`),
+            or `None` if the server does not support manifest uploads.
+        """
+        if os.path.isfile(path) and is_zip(path):
+            with zipfile.ZipFile(path) as archive:
+                return self._upload(path, _zip_blobs(archive))
+        return self._upload(path, _project_blobs(path))
+
+    def _upload(self, path, blobs: list[tuple[Blob, int]]) -> Optional[ServerResponse]:
+        manifest, by_hash = build_manifest(blobs, self.workers)
+
+        check = self.api.manifest_check(self.token, manifest)
+        if check is None or check["code"] != 0:
+            return check
+
+        missing = [sha256 for sha256 in check["data"]["missing"] if sha256 in by_hash]
+        full_bytes = sum(by_hash[sha256].size for sha256 in missing)
+        if self.on_progress:
+            self.on_progress(len(missing), len(by_hash), full_bytes)
+
+        state = DeltaState(self.delta_dir, path) if self.delta_dir else None
+        self.stats = {
+            "files": len(manifest),
+            "missing": len(missing),
+            "full_bytes": full_bytes,
+            "sent_bytes": 0,
+            "delta_files": 0,
+        }
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, self.api.pool_size)) as executor:
+            results = executor.map(lambda sha256: self._send(sha256, by_hash[sha256], state), missing)
+            for resp, sent, is_delta in results:
+                if resp is not None and resp["code"] != 0:
+                    return resp
+                self.stats["sent_bytes"] += sent
+                self.stats["delta_files"] += int(is_delta)
+
+        result = self.api.manifest_commit(self.token, manifest)
+        if state is not None and result["code"] == 0:
+            self._save_signatures(state, manifest, by_hash)
+        return result
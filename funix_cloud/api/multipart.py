@@ -0,0 +1,125 @@
+import os
+from typing import BinaryIO, Iterable, Iterator
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class MultipartEncoder:
+    """
+    A `multipart/form-data` body with a single file field, produced lazily.
+
+    The file is read in `chunk_size` pieces while the body is sent, so memory usage
+    does not depend on the size of the file. `source` can be a path, a binary file object
+    or an iterable of bytes. For iterables the total length is unknown, pass `iter(encoder)`
+    as the request body so it is sent with chunked transfer encoding.
+    """
+
+    def __init__(
+            self,
+            field: str,
+            filename: str,
+            source: str | os.PathLike | BinaryIO | Iterable[bytes],
+            content_type: str = "application/zip",
+            chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        self.boundary = os.urandom(16).hex()
+        self.chunk_size = chunk_size
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+
+        self._owns_file = isinstance(source, (str, os.PathLike))
+        self._source = open(source, "rb") if self._owns_file else source
+
+        self._head = (
+            f"--{self.boundary}\r\n"
+            f"Content-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode()
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode()
+
+        self.length: int | None = None
+        if hasattr(self._source, "seek") and hasattr(self._source, "tell"):
+            # what is left from the current position, also for in-memory files that have no `fileno()`
+            try:
+                position = self._source.tell()
+                size = self._source.seek(0, os.SEEK_END) - position
+                self._source.seek(position)
+            except OSError:
+                # pipes and sockets, `io.UnsupportedOperation` is an `OSError`
+                pass
+            else:
+                self.length = len(self._head) + size + len(self._tail)
+
+        self._chunks = self._generate()
+        self._buffer = b""
+
+    def _generate(self) -> Iterator[bytes]:
+        try:
+            yield self._head
+            if hasattr(self._source, "read"):
+                while chunk := self._source.read(self.chunk_size):
+                    yield chunk
+            else:
+                for chunk in self._source:
+                    yield chunk
+            yield self._tail
+        finally:
+            self.close()
+
+    def __len__(self) -> int:
+        if self.length is None:
+            raise TypeError("length of a streamed multipart body is unknown")
+        return self.length
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self._buffer:
+            yield self._buffer
+            self._buffer = b""
+        yield from self._chunks
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            data = self._buffer + b"".join(self._chunks)
+            self._buffer = b""
+            return data
+
+        while len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        if self._owns_file and not self._source.closed:
+            self._source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._chunks.close()
+        self.close()
+
+
+class SizedStream:
+    """
+    A file object with a known length, so it is sent with `Content-Length` instead of
+    chunked encoding even when the object can't report its size (e.g. zip members).
+    """
+
+    def __init__(self, fileobj: BinaryIO, length: int, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.fileobj = fileobj
+        self.length = length
+        self.chunk_size = chunk_size
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[bytes]:
+        while chunk := self.fileobj.read(self.chunk_size):
+            yield chunk
+
+    def read(self, size: int = -1) -> bytes:
+        return self.fileobj.read(size)
@@ -0,0 +1,302 @@
+"""
+`--trace`: the timing of every HTTP request of `API`, split in the phases of a browser's network panel.
+
+- `dns`, `connect`, `tls`: only for requests that open a new connection.
+- `send`: writing the request line, headers and body, the upload time of an archive.
+- `wait`: from the end of the request to the response headers, mostly server processing.
+- `receive`: reading the response body. Not measured for streamed responses like `/instance/events`.
+
+The time to first byte (`ttfb`) is the sum of the phases before `receive`.
+Spans export to the Chrome trace event format (open them in `chrome://tracing` or https://ui.perfetto.dev),
+their arguments use the OpenTelemetry HTTP attribute names.
+"""
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+
+PHASES = ("dns", "connect", "tls", "send", "wait", "receive")
+SETUP_PHASES = ("dns", "connect", "tls")
+
+# the span of the request the current thread is sending, the connection classes add their timings to it
+_local = threading.local()
+
+
+@dataclass
+class Span:
+    method: str
+    route: str
+    host: str
+    # Unix time of the start
+    start: float
+    thread: int
+    status: Optional[int] = None
+    error: Optional[str] = None
+    # seconds spent in each of `PHASES`
+    phases: dict[str, float] = field(default_factory=dict)
+    duration: float = 0.0
+    request_bytes: int = 0
+    response_bytes: int = 0
+    new_connection: bool = False
+    streamed: bool = False
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + max(seconds, 0.0)
+
+    def setup(self) -> float:
+        return sum(self.phases.get(phase, 0.0) for phase in SETUP_PHASES)
+
+    @property
+    def ttfb(self) -> float:
+        return sum(self.phases.get(phase, 0.0) for phase in PHASES if phase != "receive")
+
+
+def _current() -> Optional[Span]:
+    return getattr(_local, "span", None)
+
+
+class _TracedConnection:
+    """
+    Adds the time spent in each step of a connection to the span of the current thread.
+    """
+
+    def _new_conn(self):
+        span = _current()
+        if span is None:
+            return super()._new_conn()
+
+        span.new_connection = True
+        start = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(self._dns_host, self.port, 0, socket.SOCK_STREAM)
+        except socket.gaierror:
+            # the connection below fails with the error urllib3 reports
+            addresses = []
+        resolved = time.perf_counter()
+        span.add("dns", resolved - start)
+
+        host = self._dns_host
+        try:
+            if addresses:
+                # connect to the address resolved above instead of resolving again
+                self._dns_host = addresses[0][4][0]
+            try:
+                return super()._new_conn()
+            except NewConnectionError:
+                if len(addresses) < 2:
+                    raise
+                # let urllib3 try the other addresses
+                self._dns_host = host
+                return super()._new_conn()
+        finally:
+            self._dns_host = host
+            span.add("connect", time.perf_counter() - resolved)
+
+    def connect(self):
+        span = _current()
+        if span is None:
+            return super().connect()
+
+        setup = span.setup()
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            if isinstance(self, HTTPSConnection):
+                span.add("tls", time.perf_counter() - start - (span.setup() - setup))
+
+    def request(self, *args, **kwargs):
+        span = _current()
+        if span is None:
+            return super().request(*args, **kwargs)
+
+        # the connection may be opened while the request is sent
+        setup = span.setup()
+        start = time.perf_counter()
+        try:
+            return super().request(*args, **kwargs)
+        finally:
+            span.add("send", time.perf_counter() - start - (span.setup() - setup))
+
+    def send(self, data):
+        span = _current()
+        if span is not None and isinstance(data, (bytes, bytearray, memoryview)):
+            span.request_bytes += len(data)
+        return super().send(data)
+
+    def getresponse(self, *args, **kwargs):
+        span = _current()
+        if span is None:
+            return super().getresponse(*args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return super().getresponse(*args, **kwargs)
+        finally:
+            span.add("wait", time.perf_counter() - start)
+
+
+class _TracedHTTPConnection(_TracedConnection, HTTPConnection):
+    pass
+
+
+class _TracedHTTPSConnection(_TracedConnection, HTTPSConnection):
+    pass
+
+
+class _TracedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TracedHTTPConnection
+
+
+class _TracedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TracedHTTPSConnection
+
+
+class TracingAdapter(HTTPAdapter):
+    """
+    A `requests` adapter recording a `Span` of every request in `tracer`.
+    """
+
+    def __init__(self, tracer: "Tracer", **kwargs):
+        self.tracer = tracer
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TracedHTTPConnectionPool,
+            "https": _TracedHTTPSConnectionPool,
+        }
+
+    def send(self, request, stream=False, **kwargs):
+        url = urlsplit(request.url)
+        span = Span(request.method, url.path, url.hostname or "", time.time(), threading.get_ident())
+        _local.span = span
+        start = time.perf_counter()
+        try:
+            response = super().send(request, stream=stream, **kwargs)
+            span.status = response.status_code
+            if stream:
+                span.streamed = True
+                span.response_bytes = int(response.headers.get("Content-Length") or 0)
+            else:
+                # read here so the time is in the span, `requests` reuses the content
+                read = time.perf_counter()
+                span.response_bytes = len(response.content)
+                span.add("receive", time.perf_counter() - read)
+            return response
+        except Exception as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            _local.span = None
+            self.tracer.add(span)
+
+
+class Tracer:
+    """
+    Collects the spans of the requests of one or more `API` clients.
+    """
+
+    def __init__(self):
+        self.spans: list[Span] = []
+        self.lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self.lock:
+            self.spans.append(span)
+
+    def summary(self) -> list[dict[str, Any]]:
+        """
+        One row per route, in the order they were first called, with the total milliseconds
+        spent in each phase, the median and max duration, and the bytes sent and received.
+        """
+        routes: dict[str, list[Span]] = {}
+        with self.lock:
+            for span in self.spans:
+                routes.setdefault(span.route, []).append(span)
+
+        rows = []
+        for route, spans in routes.items():
+            durations = [span.duration * 1000 for span in spans]
+            rows.append({
+                "route": route,
+                "calls": len(spans),
+                "errors": sum(1 for span in spans if span.error or (span.status or 0) >= 400),
+                "new_connections": sum(1 for span in spans if span.new_connection),
+                **{
+                    f"{phase}_ms": sum(span.phases.get(phase, 0.0) for span in spans) * 1000
+                    for phase in PHASES
+                },
+                "ttfb_ms": sum(span.ttfb for span in spans) * 1000,
+                "total_ms": sum(durations),
+                "p50_ms": statistics.median(durations),
+                "max_ms": max(durations),
+                "request_bytes": sum(span.request_bytes for span in spans),
+                "response_bytes": sum(span.response_bytes for span in spans),
+            })
+        return rows
+
+    def chrome_trace(self) -> dict[str, Any]:
+        """
+        The spans as complete events of the Chrome trace event format, a request and its phases
+        on the row of the thread that sent it.
+        """
+        pid = os.getpid()
+        events = []
+        with self.lock:
+            spans = list(self.spans)
+        for span in spans:
+            start_us = span.start * 1e6
+            events.append({
+                "name": f"{span.method} {span.route}",
+                "cat": "http",
+                "ph": "X",
+                "ts": start_us,
+                "dur": span.duration * 1e6,
+                "pid": pid,
+                "tid": span.thread,
+                "args": {
+                    "http.request.method": span.method,
+                    "url.path": span.route,
+                    "server.address": span.host,
+                    "http.response.status_code": span.status,
+                    "error.type": span.error,
+                    "http.request.size": span.request_bytes,
+                    "http.response.body.size": span.response_bytes,
+                    "new_connection": span.new_connection,
+                    "streamed": span.streamed,
+                    "ttfb_ms": span.ttfb * 1000,
+                },
+            })
+            offset_us = start_us
+            for phase in PHASES:
+                seconds = span.phases.get(phase)
+                if not seconds:
+                    continue
+                events.append({
+                    "name": phase,
+                    "cat": "http.phase",
+                    "ph": "X",
+                    "ts": offset_us,
+                    "dur": seconds * 1e6,
+                    "pid": pid,
+                    "tid": span.thread,
+                })
+                offset_us += seconds * 1e6
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
@@ -0,0 +1,241 @@
+import json
+import random
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Iterator, Literal, Optional
+
+import requests
+
+from funix_cloud.api import API, ErrorCodes, Routes, ServerResponse
+
+# Base polling interval in seconds for each stage, "Prepare" installs the requirements and takes longest
+STAGE_INTERVALS = {
+    100: 1.0,
+    101: 1.0,
+    102: 2.0,
+    103: 1.0,
+    104: 1.0,
+    200: 2.0,
+}
+DEFAULT_INTERVAL = 2.0
+MAX_INTERVAL = 10.0
+INTERVAL_GROWTH = 1.5
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+DEFAULT_DEADLINE = 30 * 60
+
+
+@dataclass
+class StatusEvent:
+    kind: Literal["stage", "health", "error", "failed", "success", "timeout"]
+    stage: Optional[int] = None
+    errcode: Optional[int] = None
+    health: Optional[dict] = None
+    response: Optional[ServerResponse] = None
+
+
+class StreamUnsupported(Exception):
+    pass
+
+
+def backoff(attempt: int) -> float:
+    """
+    Exponential backoff with full jitter.
+    """
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def _error_response(e: Exception) -> ServerResponse:
+    return {"code": ErrorCodes.ServerError.value, "message": str(e), "data": None}
+
+
+class _StatusTracker:
+    """
+    Turn status snapshots into events, only reporting what changed.
+    """
+
+    def __init__(self):
+        self.stage = None
+        self.errcode = None
+        self.health = None
+        self.unchanged = 0
+        self.finished = False
+
+    def update(self, stage: int, errcode: int) -> Iterator[StatusEvent]:
+        if (stage, errcode) != (self.stage, self.errcode):
+            self.stage, self.errcode = stage, errcode
+            self.unchanged = 0
+            yield StatusEvent("stage", stage, errcode)
+        else:
+            self.unchanged += 1
+
+        if errcode != 0 or stage == 400:
+            self.finished = True
+            yield StatusEvent("failed", stage, errcode)
+
+    def update_health(self, health: dict) -> Iterator[StatusEvent]:
+        if health != self.health:
+            self.health = health
+            self.unchanged = 0
+            yield StatusEvent("health", self.stage, self.errcode, health)
+
+        if (health.get("desc") or "").lower() == "ok":
+            self.finished = True
+            yield StatusEvent("success", self.stage, self.errcode, health)
+
+
+class StatusWatcher(ABC):
+    """
+    Follow an instance until it is running (`success`), `failed`, or the deadline passes (`timeout`).
+    """
+
+    def __init__(self, api: API, token: str, deadline: Optional[float] = DEFAULT_DEADLINE):
+        self.api = api
+        self.token = token
+        self.deadline = deadline
+
+    def _expired(self, start: float) -> bool:
+        return self.deadline is not None and time.monotonic() - start > self.deadline
+
+    @abstractmethod
+    def watch(self, instance_id: int, tracker: Optional[_StatusTracker] = None) -> Iterator[StatusEvent]:
+        ...
+
+
+class PollingWatcher(StatusWatcher):
+    """
+    Poll `query_instance` (and `query_instance_health` once the instance is up).
+
+    The interval starts from the stage's entry in `STAGE_INTERVALS` and grows while nothing
+    changes, up to `MAX_INTERVAL`. Errors are retried with exponential backoff and jitter.
+    """
+
+    def interval(self, stage: Optional[int], unchanged: int) -> float:
+        base = STAGE_INTERVALS.get(stage, DEFAULT_INTERVAL)
+        return min(MAX_INTERVAL, base * INTERVAL_GROWTH ** unchanged)
+
+    def watch(self, instance_id: int, tracker: Optional[_StatusTracker] = None) -> Iterator[StatusEvent]:
+        tracker = tracker or _StatusTracker()
+        start = time.monotonic()
+        errors = 0
+
+        while not self._expired(start):
+            try:
+                info: ServerResponse = self.api.query_instance(instance_id, self.token)
+            except requests.exceptions.RequestException as e:
+                info = _error_response(e)
+            if info["code"] != 0:
+                errors += 1
+                yield StatusEvent("error", tracker.stage, tracker.errcode, response=info)
+                time.sleep(backoff(errors))
+                continue
+
+            yield from tracker.update(info["data"]["state"], info["data"]["status"])
+            if tracker.finished:
+                return
+
+            if tracker.stage == 200:
+                try:
+                    resp: ServerResponse = self.api.query_instance_health(instance_id, self.token)
+                except requests.exceptions.RequestException as e:
+                    resp = _error_response(e)
+                if resp["code"] != 0:
+                    errors += 1
+                    yield StatusEvent("error", tracker.stage, tracker.errcode, response=resp)
+                    time.sleep(backoff(errors))
+                    continue
+                yield from tracker.update_health(resp["data"] or {})
+                if tracker.finished:
+                    return
+
+            errors = 0
+            time.sleep(self.interval(tracker.stage, tracker.unchanged))
+
+        tracker.finished = True
+        yield StatusEvent("timeout", tracker.stage, tracker.errcode, tracker.health)
+
+
+class StreamWatcher(StatusWatcher):
+    """
+    Follow the server-sent events of `/instance/events`, each event's data is a `ServerResponse`
+    whose data has the `state` and `status` of the instance, and `health` once it is known.
+
+    Raises `StreamUnsupported` before yielding anything if the server has no event stream.
+    """
+
+    def watch(self, instance_id: int, tracker: Optional[_StatusTracker] = None) -> Iterator[StatusEvent]:
+        tracker = tracker or _StatusTracker()
+        start = time.monotonic()
+        connect_timeout = self.api.timeout[0] if isinstance(self.api.timeout, tuple) else self.api.timeout
+        try:
+            r = self.api.post(
+                Routes.instance_events,
+                self.token,
+                json={"id": instance_id},
+                headers={"Accept": "text/event-stream"},
+                stream=True,
+                # the server is expected to send at least a comment line as keep-alive in this time
+                timeout=(connect_timeout, MAX_INTERVAL * 6),
+            )
+        except requests.exceptions.RequestException as e:
+            raise StreamUnsupported(str(e))
+
+        with r:
+            if r.status_code != 200 or not r.headers.get("Content-Type", "").startswith("text/event-stream"):
+                raise StreamUnsupported(f"HTTP {r.status_code} {r.headers.get('Content-Type')}")
+
+            data_lines: list[str] = []
+            # a byte at a time: events are small, a larger buffer holds them back until it fills
+            for line in r.iter_lines(chunk_size=1, decode_unicode=True):
+                if self._expired(start):
+                    tracker.finished = True
+                    yield StatusEvent("timeout", tracker.stage, tracker.errcode, tracker.health)
+                    return
+                if line:
+                    if line.startswith("data:"):
+                        data_lines.append(line[5:].lstrip())
+                    continue
+                if not data_lines:
+                    continue
+
+                # a blank line ends the event
+                message: ServerResponse = json.loads("\n".join(data_lines))
+                data_lines = []
+                if message["code"] != 0:
+                    yield StatusEvent("error", tracker.stage, tracker.errcode, response=message)
+                    continue
+                data = message["data"]
+                yield from tracker.update(data["state"], data["status"])
+                if not tracker.finished and data.get("health") is not None:
+                    yield from tracker.update_health(data["health"])
+                if tracker.finished:
+                    return
+
+
+def watch_instance(
+        api: API,
+        token: str,
+        instance_id: int,
+        deadline: Optional[float] = DEFAULT_DEADLINE,
+        prefer_stream: bool = True,
+) -> Iterator[StatusEvent]:
+    """
+    Follow an instance with the event stream when the server offers one, by polling otherwise
+    (also when the stream ends early).
+    """
+    tracker = _StatusTracker()
+    start = time.monotonic()
+    if prefer_stream:
+        try:
+            yield from StreamWatcher(api, token, deadline).watch(instance_id, tracker)
+        except StreamUnsupported:
+            pass
+        except requests.exceptions.RequestException:
+            # the stream broke, carry on by polling
+            pass
+        if tracker.finished:
+            return
+
+    remaining = None if deadline is None else max(0.0, deadline - (time.monotonic() - start))
+    yield from PollingWatcher(api, token, remaining).watch(instance_id, tracker)
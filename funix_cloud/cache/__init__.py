@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Optional, TypedDict
+
+from funix_cloud.config import file_lock, write_json_atomic
+
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class CacheEntry(TypedDict):
+    key: str
+    file: str
+    size: int
+    created: float
+    last_used: float
+    source: str
+
+
+def fingerprint(files: list[tuple[str, str]], options: str = "", content_hash: bool = False) -> str:
+    """
+    Cheap identity of a project tree: the arcname, size, mode and mtime of every file
+    (or its content hash with `content_hash`), plus the archive `options`.
+    """
+    digest = hashlib.sha256(options.encode())
+    for file_path, arcname in sorted(files, key=lambda item: item[1]):
+        st = os.stat(file_path)
+        digest.update(f"\0{arcname}\0{st.st_size}\0{st.st_mode}\0".encode())
+        if content_hash:
+            with open(file_path, "rb") as f:
+                while block := f.read(HASH_BLOCK_SIZE):
+                    digest.update(block)
+        else:
+            digest.update(str(st.st_mtime_ns).encode())
+    return digest.hexdigest()
+
+
+class BuildCache:
+    """
+    Deployment zips indexed by project fingerprint, evicted least recently used first
+    once they take more than `max_size` bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int = DEFAULT_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.lock_path = os.path.join(cache_dir, "index.lock")
+
+    def _load(self) -> dict[str, CacheEntry]:
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # entries whose zip was deleted by hand are dropped
+        return {
+            key: entry for key, entry in index.items()
+            if os.path.exists(os.path.join(self.cache_dir, entry["file"]))
+        }
+
+    @contextmanager
+    def _index(self) -> Iterator[dict[str, CacheEntry]]:
+        """
+        The index, locked for the block and saved after it, so parallel builds and other
+        processes sharing the cache don't lose each other's entries.
+        """
+        with file_lock(self.lock_path):
+            index = self._load()
+            yield index
+            write_json_atomic(self.index_path, index)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.zip")
+
+    def get(self, key: str) -> Optional[str]:
+        if key not in self._load():
+            return None
+        with self._index() as index:
+            entry = index.get(key)
+            if entry is None:
+                return None
+            entry["last_used"] = time.time()
+        return os.path.join(self.cache_dir, entry["file"])
+
+    @contextmanager
+    def writer(self, key: str, source: str = "") -> Iterator[BinaryIO]:
+        """
+        Write a new zip for `key`, it is added to the cache only if the block exits without error.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix=".build-", suffix=".zip")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                yield f
+            # under the lock, so `prune` never sees the zip without its entry
+            with self._index() as index:
+                os.replace(tmp, self.path(key))
+                now = time.time()
+                index[key] = {
+                    "key": key,
+                    "file": os.path.basename(self.path(key)),
+                    "size": os.path.getsize(self.path(key)),
+                    "created": now,
+                    "last_used": now,
+                    "source": source,
+                }
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.prune()
+
+    def entries(self) -> list[CacheEntry]:
+        return sorted(self._load().values(), key=lambda entry: entry["last_used"], reverse=True)
+
+    def prune(self, max_size: Optional[int] = None) -> list[CacheEntry]:
+        """
+        Remove least recently used zips until the cache fits in `max_size` bytes, and the zips
+        that have no entry in the index.
+
+        :return: The removed entries.
+        """
+        max_size = self.max_size if max_size is None else max_size
+        if not os.path.isdir(self.cache_dir):
+            return []
+        with self._index() as index:
+            total = sum(entry["size"] for entry in index.values())
+            removed = []
+            for entry in sorted(index.values(), key=lambda entry: entry["last_used"]):
+                if total <= max_size:
+                    break
+                try:
+                    os.remove(os.path.join(self.cache_dir, entry["file"]))
+                except FileNotFoundError:
+                    pass
+                del index[entry["key"]]
+                total -= entry["size"]
+                removed.append(entry)
+
+            # left over by an index update that was lost, zips being built start with a dot
+            indexed = {entry["file"] for entry in index.values()}
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".zip") and not name.startswith(".") and name not in indexed:
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except FileNotFoundError:
+                        pass
+        return removed
+
+    def clear(self) -> list[CacheEntry]:
+        return self.prune(0)
+
+
+# The server removes uploaded files that are not used within 30 minutes (`FileIsCleaned`),
+# keep a margin for the time between the lookup and the instance creation
+UPLOAD_TTL = 25 * 60
+
+
+class UploadCache:
+    """
+    Map from archive content hash to the `file_id` it was uploaded as, so the same
+    archive is not uploaded again while the server still keeps it.
+    """
+
+    def __init__(self, path: str, ttl: float = UPLOAD_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.lock_path = path + ".lock"
+
+    def _load(self) -> dict[str, dict]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                uploads = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        now = time.time()
+        return {sha256: upload for sha256, upload in uploads.items() if now - upload["uploaded_at"] < self.ttl}
+
+    @contextmanager
+    def _uploads(self) -> Iterator[dict[str, dict]]:
+        """
+        The uploads, locked for the block and saved after it, so parallel deploys don't lose
+        each other's entries.
+        """
+        with file_lock(self.lock_path):
+            uploads = self._load()
+            yield uploads
+            write_json_atomic(self.path, uploads)
+
+    def get(self, sha256: str) -> Optional[tuple[str, float]]:
+        """
+        :return: The `file_id` and upload time of the archive, if it is still fresh.
+        """
+        upload = self._load().get(sha256)
+        if upload is None:
+            return None
+        return upload["file_id"], upload["uploaded_at"]
+
+    def put(self, sha256: str, file_id: str):
+        with self._uploads() as uploads:
+            uploads[sha256] = {"file_id": file_id, "uploaded_at": time.time()}
+
+    def forget(self, file_id: str):
+        with self._uploads() as uploads:
+            for sha256 in [sha256 for sha256, upload in uploads.items() if upload["file_id"] == file_id]:
+                del uploads[sha256]
+
+
+PROFILE_TTL = 60 * 60
+
+
+class ProfileCache:
+    """
+    The account profile (`/user/me`) of the current token, so commands that only need the
+    username don't ask the server every time. Only a hash of the token is stored.
+    """
+
+    def __init__(self, path: str, ttl: float = PROFILE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.lock_path = path + ".lock"
+
+    @staticmethod
+    def _token_hash(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[dict]:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cached.get("token") != self._token_hash(token) or time.time() - cached.get("fetched_at", 0) >= self.ttl:
+            return None
+        return cached["profile"]
+
+    def put(self, token: str, profile: dict):
+        with file_lock(self.lock_path):
+            cached = {"token": self._token_hash(token), "fetched_at": time.time(), "profile": profile}
+            write_json_atomic(self.path, cached)
+
+    def clear(self):
+        with file_lock(self.lock_path):
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
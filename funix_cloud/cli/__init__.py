@@ -1,29 +1,32 @@
 import datetime
+import hashlib
 import json
 import os
-import tempfile
+import sys
 import time
-import zipfile
 from getpass import getpass
 from pathlib import Path
-from typing import Optional, TypedDict, Literal
-
-import dateutil
-import funix
-import requests
-from dateutil import parser
-from qrcode import QRCode
-from rich.console import Console
-from rich.markdown import Markdown
-from rich.prompt import Confirm, Prompt
-from tzlocal import get_localzone
-import tomlkit
-from dotenv import dotenv_values
-
-from funix_cloud.api import API, print_from_resp, Routes, ServerResponse, instance_stage_from_int, print_from_err, \
+from typing import TYPE_CHECKING, Callable, Iterable, Optional, TypedDict, Literal
+
+from funix_cloud.api import API, print_from_resp, ServerResponse, instance_stage_from_int, print_from_err, \
     ErrorCodes
-from funix_cloud.config import ConfigDict
-from funix_cloud.util import is_git_url, is_zip, zip_folder, check_username, check_password, check_email
+from funix_cloud.cache import BuildCache, ProfileCache, UploadCache
+from funix_cloud.cli.output import OUTPUT_ENV, OUTPUT_MODES, JsonLines
+from funix_cloud.config import DEFAULT_PROFILE, PROFILE_ENV, ConfigDict, config_dir
+
+# Everything else is imported by the commands that need it, so that `funix-cloud --help` or
+# `funix-cloud logout` don't pay for `funix`, `requests` and the deploy machinery
+if TYPE_CHECKING:
+    from rich.console import Console
+    from rich.table import Table
+
+    from funix_cloud.api.trace import Tracer
+    from funix_cloud.cli.apps import AppSpec, AppState
+    from funix_cloud.history import DeployHistory, DeployRecord
+    from funix_cloud.util.archive import ArchiveMember
+    from funix_cloud.util.compression import CompressionPolicy
+    from funix_cloud.util.ignore import WalkReport
+    from funix_cloud.util.preflight import Problem
 
 maps = {
     "register": "register",
@@ -38,12 +41,18 @@ maps = {
     "delete": "delete",
     "query": "query",
     "list": "list",
+    "watch": "watch",
     "restore": "restore",
     "run": "run",
     "web": "web",
+    "cache": "cache",
+    "stats": "stats",
 }
 
 
+TRACE_ENV = "FUNIX_CLOUD_TRACE"
+
+
 class RateLimiter(TypedDict):
     max_calls: int
     period: int
@@ -66,13 +75,131 @@ class DeployCLI:
     def __dir__(self):
         return list(maps.keys())
 
-    def __init__(self):
-        self.__config = ConfigDict(
-            os.path.expanduser("~/.config/funix-cloud/config.json")
-        )
-        self.__console = Console()
-        self.__api = API(self.__config.get("api_server", "https://cloud-dev.funix.io"))
+    def __init__(
+            self,
+            profile: str | None = None,
+            output: str | None = None,
+            trace: bool = False,
+            trace_file: str | None = None,
+    ):
+        """
+        Args:
+            profile (str | None, optional): The config profile (API server and account) to use, e.g. `--profile ci`.
+                Defaults to the `FUNIX_CLOUD_PROFILE` environment variable, or the default profile.
+            output (str | None, optional): "rich" for humans, or "jsonl" to write one JSON event per line,
+                for scripts. Defaults to the `FUNIX_CLOUD_OUTPUT` environment variable, or "rich".
+            trace (bool, optional): Time every request to the server and print a summary per route at exit.
+                Defaults to the `FUNIX_CLOUD_TRACE` environment variable ("1" or a file), or False.
+            trace_file (str | None, optional): Also write the requests to this Chrome trace file, implies `--trace`.
+        """
+        output = output or os.environ.get(OUTPUT_ENV) or "rich"
+        if output not in OUTPUT_MODES:
+            print(f"Unknown output `{output}`, expected one of {', '.join(OUTPUT_MODES)}", file=sys.stderr)
+            sys.exit(1)
+        # in jsonl mode Rich is never imported, the writer stands in for the console
+        self.__output: Optional[JsonLines] = JsonLines() if output == "jsonl" else None
+        self.__rich_console: Optional["Console"] = None
+        try:
+            self.__config_dir = config_dir(profile)
+        except ValueError as e:
+            self.__console.print(f"[red3]{e}[/], profile names can only contain letters, numbers, `_`, `-` and `.`")
+            sys.exit(1)
+        self.__profile_name = profile
+        self.__config = ConfigDict(os.path.join(self.__config_dir, "config.json"))
+        # archives only depend on the project, the build cache is shared by every profile
+        self.__build_cache = BuildCache(os.path.join(config_dir(DEFAULT_PROFILE), "cache"))
+        self.__upload_cache = UploadCache(os.path.join(self.__config_dir, "file_ids.json"))
+        self.__profile_cache = ProfileCache(os.path.join(self.__config_dir, "profile.json"))
+        self.__reused_file_ids: set[str] = set()
         self.__token = self.__config.get("token", None)
+        self.__api_client: Optional[API] = None
+
+        env_trace = os.environ.get(TRACE_ENV)
+        if isinstance(trace, str):
+            # `--trace=trace.json` of earlier versions
+            trace, trace_file = True, trace_file or trace
+        if env_trace and env_trace != "1":
+            trace_file = trace_file or env_trace
+        self.__tracer: Optional["Tracer"] = None
+        if trace or trace_file or env_trace:
+            import atexit
+
+            from funix_cloud.api import trace as tracing
+
+            self.__tracer = tracing.Tracer()
+            atexit.register(self.__report_trace, trace_file)
+
+    @property
+    def __console(self) -> "Console | JsonLines":
+        # Rich is imported by the first command that renders with it, plain messages go through `__log`
+        if self.__output is not None:
+            return self.__output
+        if self.__rich_console is None:
+            from rich.console import Console
+
+            self.__rich_console = Console()
+        return self.__rich_console
+
+    @property
+    def __api(self) -> API:
+        # created on first use, commands that don't talk to the server never import `requests`
+        if self.__api_client is None:
+            self.__api_client = API(
+                self.__config.get("api_server", "https://cloud-dev.funix.io"),
+                self.__token,
+                tracer=self.__tracer,
+            )
+        return self.__api_client
+
+    def __report_trace(self, path: Optional[str]):
+        """
+        Print the time spent per route and phase, on stderr so that stdout stays the command's output.
+        """
+        rows = self.__tracer.summary()
+        if path:
+            self.__tracer.export(path)
+        if self.__output is not None:
+            self.__output.emit("trace", routes=rows, file=path)
+            return
+        if not rows:
+            print("No request was sent to the server.", file=sys.stderr)
+            return
+
+        from rich import box
+        from rich.console import Console
+        from rich.table import Table
+
+        routes = [row["route"] + (f" ({row['errors']} failed)" if row["errors"] else "") for row in rows]
+        table = Table(
+            title="Requests: ms per phase summed over the calls, KB sent and received",
+            box=box.SIMPLE_HEAD,
+            # the box already puts a space between the columns, they are many
+            padding=0,
+            pad_edge=False,
+        )
+        table.add_column("Route", no_wrap=True)
+        for column in ("Calls", "DNS", "Conn", "TLS", "Send", "Wait", "Recv", "TTFB", "Total", "Out", "In"):
+            table.add_column(column, justify="right")
+        for route, row in zip(routes, rows):
+            table.add_row(
+                route,
+                str(row["calls"]),
+                *(f"{row[f'{phase}_ms']:.0f}" for phase in ("dns", "connect", "tls", "send", "wait", "receive")),
+                f"{row['ttfb_ms']:.0f}",
+                f"{row['total_ms']:.0f}",
+                f"{row['request_bytes'] / 1024:.1f}",
+                f"{row['response_bytes'] / 1024:.1f}",
+            )
+        console = Console(stderr=True)
+        console.print(table)
+        if path:
+            console.print(f"Trace written to {path}, open it in chrome://tracing or https://ui.perfetto.dev")
+
+    @property
+    def __history(self) -> "DeployHistory":
+        from funix_cloud.history import DeployHistory
+
+        return DeployHistory(os.path.join(self.__config_dir, "history.sqlite3"))
 
     def __print_json(self, data: dict):
         self.__console.print_json(
@@ -84,15 +211,459 @@ class DeployCLI:
         )
 
     def __print_markdown(self, data: str):
+        if self.__output is not None:
+            self.__output.emit("message", text=data)
+            return
+
+        from rich.markdown import Markdown
+
         self.__console.print(Markdown(data))
 
-    def __upload(self, path) -> Optional[str]:
-        resp: ServerResponse = self.__api.upload(path, self.__token)
+    def __log(self, message: str):
+        if self.__output is not None:
+            self.__output.emit("message", text=message)
+        else:
+            print(message)
+
+    def __input(self, prompt: str) -> str:
+        if self.__output is not None:
+            # stdout only carries events
+            print(prompt, end="", file=sys.stderr, flush=True)
+            return input()
+        return input(prompt)
+
+    def __upload(
+        self,
+        path,
+        log: Callable[[str], None] = print,
+        record: Optional["DeployRecord"] = None,
+        max_size: Optional[int] = None,
+    ) -> Optional[str]:
+        from funix_cloud.api.chunked import ChunkedUploader, ChunkedUploadError, DEFAULT_PART_SIZE
+        from funix_cloud.history import DeployRecord
+        from funix_cloud.util import sha256_file
+
+        record = record or DeployRecord()
+        size = os.path.getsize(path)
+        record.artifact_bytes = size
+        if max_size is not None and size > max_size:
+            # what the server would answer after the whole upload
+            message = f"The deployment zip is {size / 1024 / 1024:.0f} MB, " \
+                      f"the server accepts at most {max_size / 1024 / 1024:.0f} MB."
+            log(message)
+            print_from_err(self.__console, ErrorCodes.FileTooLarge, {"message": message})
+            return
+        sha256 = sha256_file(path)
+        uploaded = self.__upload_cache.get(sha256)
+        if uploaded is not None:
+            file_id, uploaded_at = uploaded
+            log(f"Same archive was uploaded {int((time.time() - uploaded_at) / 60)} minutes ago, reusing it.")
+            self.__reused_file_ids.add(file_id)
+            record.method = "reused"
+            return file_id
+
+        record.method = record.method or "archive"
+        resp: ServerResponse | None = None
+        with record.phase("upload"):
+            if size > 2 * DEFAULT_PART_SIZE:
+                uploader = ChunkedUploader(
+                    self.__api,
+                    self.__token,
+                    os.path.join(self.__config_dir, "uploads.json"),
+                )
+                try:
+                    resp = uploader.upload(str(path))
+                except ChunkedUploadError as e:
+                    resp = e.response
+            if resp is None:
+                resp = self.__api.upload(path, self.__token)
         if resp["code"] != 0:
             print_from_resp(self.__console, resp)
             return
+        record.uploaded_bytes += size
+        self.__upload_cache.put(sha256, resp["data"]["file_id"])
         return resp["data"]["file_id"]
 
+    def __profile(self, refresh: bool = False) -> ServerResponse:
+        """
+        The `/user/me` response, from the profile cache unless `refresh` or it is stale.
+        """
+        if self.__token and not refresh:
+            profile = self.__profile_cache.get(self.__token)
+            if profile is not None:
+                return {"code": 0, "message": "", "data": profile}
+
+        result: ServerResponse = self.__api.me(self.__token)
+        if result["code"] == 0 and self.__token:
+            self.__profile_cache.put(self.__token, result["data"])
+        return result
+
+    def __print_walk_report(self, report: "WalkReport", log: Optional[Callable[[str], None]] = None):
+        if not report.skipped_dirs and not report.skipped_files:
+            return
+        shown = ", ".join(f"`{d}`" for d in report.skipped_dirs[:5])
+        if len(report.skipped_dirs) > 5:
+            shown += f" and {len(report.skipped_dirs) - 5} more"
+        message = f"Packed {report.files} files, skipped {report.skipped_files} ignored files"
+        if report.skipped_dirs:
+            message += f" and {len(report.skipped_dirs)} folders ({shown})"
+        (log or self.__print_markdown)(message + ". Use `.funixignore` to change what is deployed.")
+
+    def __report_problems(self, problems: list["Problem"], log: Optional[Callable[[str], None]] = None):
+        """
+        Report what the preflight found, to `log` when it is given, to the console otherwise.
+        """
+        if log is not None:
+            log("; ".join(f"{problem.code.name}: {problem.message}" for problem in problems))
+            return
+        for problem in problems:
+            if self.__output is None:
+                self.__print_markdown(problem.message)
+            print_from_err(self.__console, problem.code, {"message": problem.message})
+
+    def __upload_members(
+        self,
+        members: Iterable["ArchiveMember"],
+        stream: bool,
+        workers: int,
+        cache_key: Optional[str] = None,
+        source: str = "",
+        log: Callable[[str], None] = print,
+        record: Optional["DeployRecord"] = None,
+        max_size: Optional[int] = None,
+    ) -> Optional[str]:
+        import tempfile
+
+        from funix_cloud.history import DeployRecord
+        from funix_cloud.util import hash_chunks, tee
+        from funix_cloud.util.archive import iter_zip, write_zip
+
+        record = record or DeployRecord()
+        if stream:
+            log("Compressing and uploading deployment zip...")
+            record.method = "stream"
+            digest = hashlib.sha256()
+            chunks = record.count(hash_chunks(iter_zip(members, workers), digest))
+            with record.phase("stream"):
+                if cache_key is None:
+                    resp: ServerResponse = self.__api.upload_stream(chunks, self.__token)
+                else:
+                    with self.__build_cache.writer(cache_key, source) as cache_file:
+                        resp = self.__api.upload_stream(tee(chunks, cache_file), self.__token)
+            if resp["code"] != 0:
+                print_from_resp(self.__console, resp)
+                return
+            record.uploaded_bytes += record.artifact_bytes or 0
+            self.__upload_cache.put(digest.hexdigest(), resp["data"]["file_id"])
+            return resp["data"]["file_id"]
+
+        record.method = "archive"
+        if cache_key is not None:
+            log("Compressing deployment zip...")
+            with record.phase("compress"), self.__build_cache.writer(cache_key, source) as cache_file:
+                write_zip(members, cache_file, workers)
+            log("Uploading deployment zip...")
+            return self.__upload(self.__build_cache.path(cache_key), log, record, max_size)
+
+        with tempfile.NamedTemporaryFile(prefix="funix-cloud-", suffix=".zip") as tmp:
+            log("Compressing deployment zip...")
+            with record.phase("compress"):
+                write_zip(members, tmp, workers)
+                tmp.flush()
+            log("Uploading deployment zip...")
+            return self.__upload(tmp.name, log, record, max_size)
+
+    def __upload_incremental(
+        self,
+        path,
+        log: Callable[[str], None] = print,
+        record: Optional["DeployRecord"] = None,
+    ) -> tuple[bool, Optional[str]]:
+        """
+        :return: Whether the server supports incremental deploys, and the `file_id`, None if the upload failed.
+            Only an unsupported server is a reason to upload the whole project instead.
+        """
+        from funix_cloud.api.incremental import IncrementalUploader
+        from funix_cloud.history import DeployRecord
+
+        record = record or DeployRecord()
+
+        def on_progress(missing: int, total: int, size: int):
+            log(f"Uploading {missing} of {total} unique files ({size} bytes)...")
+
+        uploader = IncrementalUploader(
+            self.__api,
+            self.__token,
+            delta_dir=os.path.join(self.__config_dir, "delta"),
+            on_progress=on_progress,
+        )
+        with record.phase("incremental"):
+            resp = uploader.upload(path)
+        if resp is None:
+            log("The server does not support incremental deploys, uploading the whole project.")
+            return False, None
+        if resp["code"] != 0:
+            print_from_resp(self.__console, resp)
+            return True, None
+        if uploader.stats:
+            record.method = "incremental"
+            record.file_count = uploader.stats["files"]
+            record.artifact_bytes = uploader.stats["full_bytes"]
+            record.uploaded_bytes += uploader.stats["sent_bytes"]
+        if uploader.stats and uploader.stats["delta_files"]:
+            log(
+                f"Sent {uploader.stats['sent_bytes']} of {uploader.stats['full_bytes']} bytes, "
+                f"{uploader.stats['delta_files']} large files as block deltas."
+            )
+        return True, resp["data"]["file_id"]
+
+    @staticmethod
+    def __check_entry(url_or_path: str, file: str) -> Optional[str]:
+        """
+        :return: Why the entry `file` is missing from the zip or folder `url_or_path`, None if it is there.
+        """
+        import zipfile
+
+        from funix_cloud.util import is_git_url, is_zip
+
+        if is_git_url(url_or_path) or not os.path.exists(url_or_path):
+            return None
+        path = Path(url_or_path)
+        if os.path.isfile(path) and is_zip(path):
+            with zipfile.ZipFile(path) as _zip:
+                if not any(zf.orig_filename == file for zf in _zip.filelist):
+                    return f"The entry file `{file}` is not in zip file `{path}`, " \
+                           f"please specify it with `--file` option"
+        elif os.path.isdir(path):
+            entry_file: Path = Path(os.path.join(path, file))
+            if not entry_file.exists():
+                return f"The entry file `{entry_file.absolute()}` is not exist, " \
+                       f"please specify it with `--file` option"
+        return None
+
+    def __package(
+        self,
+        url_or_path: str,
+        incremental: bool,
+        workers: int | None,
+        stream: bool,
+        policy: "CompressionPolicy",
+        cache: bool,
+        cache_hash: bool,
+        interactive: bool = True,
+        log: Optional[Callable[[str], None]] = None,
+        record: Optional["DeployRecord"] = None,
+        preflight: bool = True,
+    ) -> Optional[dict]:
+        """
+        Upload the code at `url_or_path` unless it is a Git URL.
+
+        With `preflight`, the archive is first checked for what the server would reject, see
+        `funix_cloud.util.preflight`, nothing is compressed or sent if it fails.
+        Progress and errors go to `log` when it is given, to the console otherwise.
+        The time of each step and the size of the archive go to `record`.
+
+        :return: The source of the instance, `repo_link` or `file_id`, None if it failed.
+        """
+        from funix_cloud.cache import fingerprint
+        from funix_cloud.history import DeployRecord
+        from funix_cloud.util import is_git_url, is_zip
+        from funix_cloud.util.archive import ARCHIVE_VERSION, ArchiveMember, DEFAULT_WORKERS, file_members
+        from funix_cloud.util.ignore import WalkReport, walk
+        from funix_cloud.util.preflight import MAX_UPLOAD_SIZE, Preflight, check_members, check_zip
+
+        progress = log or self.__log
+        fail = log or self.__print_markdown
+        record = record or DeployRecord()
+        # incremental uploads send files, not an archive
+        limit = sys.maxsize if incremental else MAX_UPLOAD_SIZE
+        max_size = MAX_UPLOAD_SIZE if preflight else None
+
+        def passed(result: Preflight) -> bool:
+            if not result.ok:
+                self.__report_problems(result.problems, log)
+                record.finish("error", result.problems[0].code.value)
+                return False
+            record.file_count = result.files
+            message = f"Preflight passed: {result.files} files, {result.size / 1024 / 1024:.1f} MB"
+            if result.sampled:
+                message += f", about {result.estimated_size / 1024 / 1024:.1f} MB compressed"
+            progress(message + ".")
+            return True
+
+        if is_git_url(url_or_path):
+            record.source = "git"
+            return {"repo_link": url_or_path}
+
+        if not os.path.exists(url_or_path):
+            fail(f"Unexpected `{url_or_path}`, expected a URL or a local path.")
+            return None
+
+        path: Path = Path(url_or_path)
+
+        is_file = os.path.isfile(url_or_path)
+        is_zipfile = is_zip(path) if is_file else False
+
+        if is_zipfile:
+            record.source = "zip"
+            if preflight:
+                with record.phase("preflight"):
+                    result = check_zip(path, limit)
+                if not passed(result):
+                    return None
+
+            file_id = None
+            if incremental:
+                progress("Hashing zip members...")
+                supported, file_id = self.__upload_incremental(path, progress, record)
+                if supported and file_id is None:
+                    return None
+
+            if file_id is None:
+                progress("Uploading deployment zip...")
+                file_id = self.__upload(path, progress, record, max_size)
+
+        elif is_file and path.suffix == ".py":
+            record.source = "file"
+            requirements_path = path.parent.joinpath("requirements.txt")
+            if not requirements_path.exists():
+                if not interactive:
+                    fail(f"File `{requirements_path}` is not found... It's required for deployment.")
+                    return None
+
+                from rich.prompt import Confirm
+
+                create_requirements = Confirm.ask(
+                    f"File `{requirements_path}` is not found... It's required for deployment.\n"
+                    f"Do you want to create a `requirements.txt` that "
+                    f"only contains the `funix` dependency and continue?")
+
+                if not create_requirements:
+                    return None
+
+                with open(requirements_path, "w") as f:
+                    f.write("funix\n")
+
+            members = [
+                ArchiveMember("main.py", data=path.read_bytes(), policy=policy),
+                ArchiveMember("requirements.txt", data=requirements_path.read_bytes(), policy=policy),
+            ]
+            record.file_count = len(members)
+            if preflight:
+                with record.phase("preflight"):
+                    result = check_members(members, limit)
+                if not passed(result):
+                    return None
+            file_id = self.__upload_members(members, stream, workers or DEFAULT_WORKERS, log=progress,
+                                            record=record, max_size=max_size)
+
+        elif os.path.isdir(path):
+            record.source = "folder"
+            files: Optional[list[tuple[str, str]]] = None
+            if preflight:
+                report = WalkReport()
+                with record.phase("scan"):
+                    files = sorted(walk(path.absolute(), report), key=lambda item: item[1])
+                self.__print_walk_report(report, log)
+                with record.phase("preflight"):
+                    result = check_members(file_members(files, policy), limit)
+                if not passed(result):
+                    return None
+
+            file_id = None
+            if incremental:
+                progress("Hashing project files...")
+                supported, file_id = self.__upload_incremental(path.absolute(), progress, record)
+                if supported and file_id is None:
+                    return None
+
+            if file_id is None:
+                if files is None:
+                    report = WalkReport()
+                    with record.phase("scan"):
+                        files = sorted(walk(path.absolute(), report), key=lambda item: item[1])
+                    self.__print_walk_report(report, log)
+                with record.phase("scan"):
+                    cache_key = None
+                    if cache:
+                        cache_key = fingerprint(files, f"{ARCHIVE_VERSION}|{policy.key()}", cache_hash)
+                record.file_count = len(files)
+
+                if cache_key is not None:
+                    cached = self.__build_cache.get(cache_key)
+                    if cached is not None:
+                        progress("Project is unchanged, uploading the cached deployment zip...")
+                        record.method = "cached"
+                        file_id = self.__upload(cached, progress, record, max_size)
+
+                if file_id is None:
+                    file_id = self.__upload_members(
+                        file_members(files, policy),
+                        stream,
+                        workers or DEFAULT_WORKERS,
+                        cache_key,
+                        str(path.absolute()),
+                        progress,
+                        record,
+                        max_size,
+                    )
+
+        else:
+            fail(f"File `{url_or_path}` is not a zip or a python file.")
+            return None
+
+        if file_id is None:
+            fail("Failed to upload deploy code")
+            return None
+
+        return {"file_id": file_id}
+
+    @staticmethod
+    def __request_json(
+        source: dict,
+        instance_name: str,
+        file: str,
+        no_frontend: bool,
+        transform: bool,
+        app_secret: str | None,
+        rate_limiters: list[RateLimiter] | None,
+        env: dict[str, str] | None,
+    ) -> dict:
+        req_json = dict(source)
+        req_json.update({
+            "name": instance_name,
+            "entry_point": file,
+            "with_no_frontend": no_frontend,
+            "with_transform": transform,
+        })
+
+        if app_secret and isinstance(app_secret, str):
+            req_json["app_secret"] = app_secret
+
+        if rate_limiters and isinstance(rate_limiters, list):
+            req_json["rate_limiters"] = rate_limiters
+
+        if env and isinstance(env, dict):
+            req_json["envs"] = env
+
+        return req_json
+
+    def __create(self, req_json: dict) -> ServerResponse:
+        create = self.__api.deploy_git if "repo_link" in req_json else self.__api.deploy_zip
+        return create(self.__token, req_json)
+
+    def __upload_expired(self, result: ServerResponse, req_json: dict) -> bool:
+        """
+        Whether the instance could not be created because the server removed an archive
+        that was reused from the upload cache, the cache entry is dropped then.
+        """
+        file_id = req_json.get("file_id")
+        if result["code"] != ErrorCodes.FileIsCleaned.value or file_id not in self.__reused_file_ids:
+            return False
+        self.__reused_file_ids.discard(file_id)
+        self.__upload_cache.forget(file_id)
+        return True
+
     def register(
         self,
         username: Optional[str] = None,
@@ -102,6 +673,16 @@ class DeployCLI:
         """
         Register a new account on the Funix Cloud.
         """
+        from funix_cloud.util import check_username, check_password, check_email
+
+        if self.__output is not None and None in (username, password, email):
+            print_from_err(self.__console, ErrorCodes.InvalidArguments, {
+                "message": "`--username`, `--password` and `--email` are required with `--output jsonl`",
+            })
+            return
+
+        from rich.prompt import Prompt
+
         if username is None:
             while True:
                 username = str(Prompt.ask("What is a user name you preferred")).lower()
@@ -143,7 +724,9 @@ class DeployCLI:
             return
 
         self.__token = login_resp["data"]["token"]
+        self.__api.set_token(self.__token)
         self.__config.set("token", login_resp["data"]["token"])
+        self.__profile_cache.clear()
         self.__console.print("Login successful! Your token is saved.")
 
         self.__console.print("Sending verification email...")
@@ -159,6 +742,14 @@ class DeployCLI:
         app_secret: str | None = None,
         rate_limiters: list[RateLimiter] | None = None,
         env: dict[str, str] | None = None,
+        incremental: bool = False,
+        workers: int | None = None,
+        stream: bool = False,
+        compression: str | dict | None = None,
+        cache: bool = True,
+        cache_hash: bool = False,
+        timeout: float | None = None,
+        preflight: bool = True,
     ):
         """
         Deploy local folder to Funix Cloud.
@@ -173,218 +764,183 @@ class DeployCLI:
             rate_limiters (list[RateLimiter], optional): The rate limiters. Defaults to [].
                 Example: "[{'max_calls': 10, 'period': 60, 'source': 'browser'}]"
             env (dict[str, str], optional): The environment variables. Defaults to []. Example: "{'key': 'value'}"
+            incremental (bool, optional): Only upload files whose content the server doesn't have yet,
+                falls back to a full upload if the server doesn't support it. Defaults to False.
+            workers (int | None, optional): Number of threads compressing the deployment zip.
+                Defaults to the number of CPUs.
+            stream (bool, optional): Upload the deployment zip while it is being compressed,
+                without writing it to a temporary file. Defaults to False.
+            compression (str | dict | None, optional): The compression policy of the deployment zip,
+                "default", "store", "fast", "best" or "adaptive", see `config.md` for the table form.
+                Defaults to "default".
+            cache (bool, optional): Reuse the deployment zip built for an unchanged project folder,
+                pass `--nocache` to always rebuild it. Defaults to True.
+            cache_hash (bool, optional): Compare file contents instead of sizes and modification times
+                to decide whether the project changed. Defaults to False.
+            timeout (float, optional): Seconds to wait for the instance to be running before giving up
+                (the deployment itself goes on). Defaults to 1800.
+            preflight (bool, optional): Check the app name and the project for what the server would reject
+                (no `requirements.txt` or no `funix` in it, `.git` folder, over 200 MB...) before compressing
+                and uploading it, pass `--nopreflight` to skip it. Defaults to True.
         """
+        # the arguments, to start again when a reused upload was cleaned
+        deploy_args = locals().copy()
+        del deploy_args["self"]
 
-        req_json = {}
-
-        if is_git_url(url_or_path):
-            url = self.__api.base_url + Routes.deploy_git
-            git = url_or_path
-            req_json["repo_link"] = git
-
-        elif os.path.exists(url_or_path):
-            url = self.__api.base_url + Routes.deploy_zip
-            path: Path = Path(url_or_path)
-
-            is_file = os.path.isfile(url_or_path)
-            is_zipfile = is_zip(path) if is_file else False
-
-            if is_zipfile:
-                found = False
-                with zipfile.ZipFile(path) as _zip:
-                    for zf in _zip.filelist:
-                        if zf.orig_filename == file:
-                            found = True
-                            break
-
-                if not found:
-                    self.__print_markdown(f"The entry file `{file}` is not in zip file `{path}`, "
-                                          f"please specify it with `--file` option")
-                    return
+        from funix_cloud.api.watcher import DEFAULT_DEADLINE, watch_instance
+        from funix_cloud.util.compression import policy_from_config
 
-                print("Uploading deployment zip...")
-                file_id = self.__upload(path)
+        timeout = DEFAULT_DEADLINE if timeout is None else timeout
 
-            elif is_file and path.suffix == ".py":
-                requirements_path = path.parent.joinpath("requirements.txt")
-                if not requirements_path.exists():
-                    create_requirements = Confirm.ask(
-                        f"File `{requirements_path}` is not found... It's required for deployment.\n"
-                        f"Do you want to create a `requirements.txt` that "
-                        f"only contains the `funix` dependency and continue?")
-
-                    if not create_requirements:
-                        return
+        try:
+            policy = policy_from_config(compression)
+        except ValueError as e:
+            self.__print_markdown(str(e))
+            return
 
-                    with open(requirements_path, "w") as f:
-                        f.write("funix\n")
-
-                with tempfile.NamedTemporaryFile(prefix="funix-cloud-", suffix=".zip") as tmp:
-                    print("Compressing deployment zip...")
-                    with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED) as archive:
-                        archive.writestr("main.py", path.read_text())
-                        archive.writestr("requirements.txt", requirements_path.read_text())
-                    print("Uploading deployment zip...")
-                    file_id = self.__upload(tmp.name)
-
-            elif os.path.isdir(path):
-                entry_file: Path = Path(os.path.join(path, file))
-                if not entry_file.exists():
-                    self.__print_markdown(f"The entry file `{entry_file.absolute()}` is not exist, "
-                                          f"please specify it with `--file` option")
-                    return
+        error = self.__check_entry(url_or_path, file)
+        if error is not None:
+            self.__print_markdown(error)
+            return
 
-                with tempfile.NamedTemporaryFile(prefix="funix-cloud-", suffix=".zip") as tmp:
-                    print("Compressing deployment zip...")
-                    with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED) as archive:
-                        zip_folder(path.absolute(), archive)
-                    print("Uploading deployment zip...")
-                    file_id = self.__upload(tmp.name)
+        if preflight:
+            from funix_cloud.util.preflight import check_arguments
 
-            else:
-                self.__print_markdown(f"File `{url_or_path}` is not a zip or a python file.")
+            problems = check_arguments(instance_name, file)
+            if problems:
+                self.__report_problems(problems)
                 return
 
-            if file_id is None:
-                self.__print_markdown("Failed to upload deploy code")
+        record = self.__history.record(instance_name)
+        with record:
+            source = self.__package(url_or_path, incremental, workers, stream, policy, cache, cache_hash,
+                                    interactive=self.__output is None, record=record, preflight=preflight)
+            if source is None:
+                record.finish("error")
                 return
 
-            req_json["file_id"] = file_id
+            req_json = self.__request_json(source, instance_name, file, no_frontend, transform, app_secret,
+                                           rate_limiters, env)
+            with record.phase("create"):
+                result: ServerResponse = self.__create(req_json)
 
-        else:
-            self.__print_markdown(f"Unexpected `{url_or_path}`, expected a URL or a local path.")
-            return
+            if self.__upload_expired(result, req_json):
+                self.__log("The server has already removed the previously uploaded archive, uploading it again...")
+                record.discard()
+                return self.deploy(**deploy_args)
 
-        req_json.update({
-            "name": instance_name,
-            "entry_point": file,
-            "with_no_frontend": no_frontend,
-            "with_transform": transform,
-        })
-
-        if app_secret and isinstance(app_secret, str):
-            req_json["app_secret"] = app_secret
-
-        if rate_limiters and isinstance(rate_limiters, list):
-            req_json["rate_limiters"] = rate_limiters
+            if result["code"] != 0:
+                record.finish("error", result["code"])
+                self.__log("Failed to deploy!")
+                print_from_resp(self.__console, result)
+                return
 
-        if env and isinstance(env, dict):
-            req_json["envs"] = env
+            app_name = result["data"]["application_name"]
+            instance_id = result["data"]["instance_id"]
+            record.instance_id = instance_id
+            self.__print_markdown(
+                "Successfully created deployment task!\n"
+                f"- App name: {app_name}\n"
+                f"- Instance id: {instance_id}\n"
+            )
 
-        r = requests.post(
-            url,
-            json=req_json,
-            headers={"Authorization": f"Bearer {self.__token}"},
-        )
+            if self.__output is not None:
+                from funix_cloud.cli.output import status_event_fields
 
-        result: ServerResponse = r.json()
+                self.__output.emit("created", app_name=app_name, instance_id=instance_id)
+                for event in watch_instance(self.__api, self.__token, instance_id, timeout):
+                    record.on_event(event)
+                    self.__output.emit(event.kind, instance_id=instance_id, **status_event_fields(event))
+                    if event.kind == "success":
+                        self.query(instance_id)
+                return
 
-        if result["code"] != 0:
-            print("Failed to deploy!")
-            print_from_resp(self.__console, result)
+            print("Getting deploying status, press ^C or ^D to exit.")
+            status = self.__console.status("Waiting for deploying...")
+            status._live.transient = False
+            with status:
+                for event in watch_instance(self.__api, self.__token, instance_id, timeout):
+                    record.on_event(event)
+                    match event.kind:
+                        case "error":
+                            print_from_resp(self.__console, event.response)
+                        case "stage":
+                            if event.stage != 200:
+                                status.update(f"Deploying... Current Stage: {instance_stage_from_int(event.stage)}")
+                        case "health":
+                            status.update(self.__health_status(event.health))
+                        case "failed":
+                            status.update("Deployment failed")
+                            status.stop()
+                            print_from_err(self.__console, ErrorCodes(event.errcode))
+                        case "success":
+                            status.update("Deployment completed! You can now enjoy the funix cloud.")
+                            status.stop()
+                            self.query(instance_id)
+                        case "timeout":
+                            status.update("Deployment is taking too long")
+                            status.stop()
+                            self.__print_markdown(
+                                f"Stopped waiting after {int(timeout)} seconds, "
+                                f"check it later with `funix-cloud query {instance_id}`"
+                            )
+
+    @staticmethod
+    def __health_status(health: dict) -> str:
+        from funix_cloud.cli.fleet import health_color
+
+        desc = health.get("desc") or "Unknown"
+        color = health_color(health.get("color") or "Grey")
+        causes: list[str] = health.get("causes") or []
+
+        status_str = f"Waiting for initialization... Health: [{color}]{desc}[/]"
+
+        if len(causes) != 0:
+            status_str += "\nReason:\n"
+            for cause in causes:
+                status_str += f"    {cause}\n"
+        return status_str
+
+    @staticmethod
+    def __format_start_time(start_time: str | None, zone) -> str:
+        if not start_time:
+            return ""
+        import dateutil.parser
+
+        parsed_time: datetime.datetime = dateutil.parser.isoparse(start_time)
+        return parsed_time.astimezone(zone).strftime("%Y-%m-%d %H:%M:%S")
+
+    @staticmethod
+    def __instance_domains(user_name: str, name: str) -> tuple[str, str]:
+        return f"{name}-{user_name}.funix.io", f"funix.io/{user_name}/{name}"
+
+    def __instance_result(self, user_name: str | None, data: dict) -> dict:
+        """
+        An instance as written in `--output jsonl` mode, with its URLs when the owner is known.
+        """
+        result = dict(data)
+        result["stage_name"] = instance_stage_from_int(data["state"])
+        result["error"] = ErrorCodes(data["status"]).name if data["status"] else None
+        if user_name is not None:
+            result["urls"] = [f"https://{domain}" for domain in self.__instance_domains(user_name, data["name"])]
+        return result
+
+    def __print_instance(self, user_name: str, data, zone=None):
+        from tzlocal import get_localzone
+
+        if self.__output is not None:
+            self.__output.emit("result", instance=self.__instance_result(user_name, data))
             return
 
-        app_name = result["data"]["application_name"]
-        instance_id = result["data"]["instance_id"]
-        self.__print_markdown(
-            "Successfully created deployment task!\n"
-            f"- App name: {app_name}\n"
-            f"- Instance id: {instance_id}\n"
-        )
-
-        print("Getting deploying status, press ^C or ^D to exit.")
-        status = self.__console.status("Waiting for deploying...")
-        status._live.transient = False
-        with status:
-            prev_errcode = None
-            prev_stage = None
-            prev_health = ""
-            while True:
-                info: ServerResponse = self.__api.query_instance(instance_id, self.__token)
-                if info["code"] != 0:
-                    print_from_resp(self.__console, info)
-                    time.sleep(0.5)
-                    continue
-
-                data = info["data"]
-
-                cur_stage = data["state"]
-                cur_errcode = data["status"]
-
-                first = prev_stage is None or prev_errcode is None
-                updated = prev_stage != cur_stage or prev_errcode != cur_errcode
-                if not (first or updated):
-                    time.sleep(0.5)
-                    continue
-
-                if cur_errcode != 0 or cur_stage == 400:
-                    status.update("Deployment failed")
-                    status.stop()
-                    print_from_err(self.__console, ErrorCodes(cur_errcode))
-                    break
-
-                if cur_stage == 200 and prev_health.lower() == "ok":
-                    status.update("Deployment completed! You can now enjoy the funix cloud.")
-                    status.stop()
-                    self.query(instance_id)
-                    break
-
-                stage_str = instance_stage_from_int(cur_stage)
-                if cur_stage != 200:
-                    status.update(f"Deploying... Current Stage: {stage_str}")
-                else:
-                    resp: ServerResponse = self.__api.query_instance_health(instance_id, self.__token)
-                    if resp["code"] != 0:
-                        print_from_resp(self.__console, resp)
-                        continue
-
-                    data = resp["data"]
-                    desc = "Unknown"
-                    color = "Grey"
-                    causes: list[str] = []
-                    if data:
-                        desc = data.get("desc") or desc
-                        color = data.get("color") or color
-                        causes = data.get("causes") or causes
-
-                    # https://rich.readthedocs.io/en/stable/appendix/colors.html
-                    match color:
-                        case "Green":
-                            color = "spring_green3"
-                        case "Grey":
-                            color = "grey58"
-                        case "Yellow":
-                            color = "bright_yellow"
-                        case "Red":
-                            color = "red3"
-                        case _:
-                            # unknown fallback
-                            color = "grey58"
-
-                    prev_health = desc
-                    status_str = f"Waiting for initialization... Health: [{color}]{desc}[/]"
-
-                    if len(causes) != 0:
-                        status_str += "\nReason:\n"
-                        for cause in causes:
-                            status_str += f"    {cause}\n"
-
-                    status.update(status_str)
-
-                time.sleep(2)
-
-    def __print_instance(self, user_name: str, data):
-        url1 = f"{data['name']}-{user_name}.funix.io"
-        url2 = f"funix.io/{user_name}/{data['name']}"
+        url1, url2 = self.__instance_domains(user_name, data["name"])
         markdown = f"- Name: {data['name']}\n" \
                    f"- ID: {data['id']}\n" \
                    f"- Domain: [{url1}](https://{url1}) or [{url2}](https://{url2})\n"
 
         start_time = data.get("start_time")
         if start_time:
-            parsed_time: datetime = dateutil.parser.isoparse(start_time)
-            zone = get_localzone()
-            ctime = parsed_time.astimezone(zone).strftime("%Y-%m-%d %H:%M:%S")
+            zone = zone or get_localzone()
+            ctime = self.__format_start_time(start_time, zone)
             markdown += f"- Created Time: {ctime} {zone.key}\n"
 
         markdown += f"- Status: {instance_stage_from_int(data['state'])}\n" \
@@ -394,81 +950,437 @@ class DeployCLI:
         error = data["status"]
         if error and error != 0:
             print_from_err(self.__console, ErrorCodes(error))
-    
+
+    def __fetch_health(self, instance_id: int) -> ServerResponse:
+        # one instance that can't be reached doesn't stop the others, its health shows as an error
+        import requests
+
+        try:
+            return self.__api.query_instance_health(instance_id, self.__token)
+        except requests.exceptions.RequestException as e:
+            return {"code": ErrorCodes.ServerError.value, "message": str(e), "data": None}
+
+    def __instances_table(self, instances: list, healths: dict[int, ServerResponse], zone) -> "Table":
+        from rich.table import Table
+
+        from funix_cloud.cli.fleet import health_text
+
+        table = Table(title=f"{len(instances)} instances")
+        table.add_column("ID", justify="right")
+        table.add_column("Name")
+        table.add_column(f"Created Time ({zone.key})")
+        table.add_column("Status")
+        table.add_column("Error Code", justify="right")
+        table.add_column("Health")
+        for instance in instances:
+            resp = healths.get(instance["id"])
+            health = health_text(resp)
+            if resp is not None and resp["code"] == 0 and (resp["data"] or {}).get("causes"):
+                health += "\n" + "\n".join(resp["data"]["causes"])
+            table.add_row(
+                str(instance["id"]),
+                instance["name"],
+                self.__format_start_time(instance.get("start_time"), zone),
+                instance_stage_from_int(instance["state"]),
+                str(instance["status"]),
+                health,
+            )
+        return table
+
     def web(self):
         """
         Open Funix Cloud console page in browser
         """
+        import funix
+
+        if self.__profile_name:
+            # the web tool reads its config when it is loaded
+            os.environ[PROFILE_ENV] = self.__profile_name
         funix.run(os.path.join(os.path.dirname(__file__), "web.py"))
     
-    def run(self):
+    def run(self, parallel: int | None = None):
         """
         Deploy with configuration file
+
+        Args:
+            parallel (int | None, optional): How many apps of `[[apps]]` are packaged and uploaded at the same time.
+                Defaults to `parallel` of the `[config]` section, or 4.
         """
+        import tomlkit
+
+        from funix_cloud.cli.apps import DEFAULT_PARALLEL, app_event_fields, apps_summary, deploy_options, load_apps
+
         if not os.path.exists("funix-cloud.toml"):
             self.__print_markdown("`funix-cloud.toml` not found in current directory")
             return
         
         with open("funix-cloud.toml") as f:
-            config = tomlkit.loads(f.read())
+            manifest = tomlkit.loads(f.read()).unwrap()
         
-        if "main" not in config:
+        if "main" not in manifest and "apps" not in manifest:
             self.__print_markdown("`main` key not found in `funix-cloud.toml`")
             return
-        
-        application_name = config["main"]["name"]
-        entry_file = config["main"].get("entry_file", "main.py")
-        
-        env_file = None
-        no_frontend = False
-        transform = False
-        app_secret = None
-        env = None
-        
-        if "config" in config:
-            config = config["config"]
-            no_frontend = config.get("no_frontend", False)
-            transform = config.get("transform", False)
-            app_secret = config.get("secret", None)
-            env_file = config.get("env", None)
-        
-        if env_file:
-            if not os.path.exists(env_file):
-                self.__print_markdown(f"Environment file `{env_file}` not found")
-                return
-            
-            env = dotenv_values(env_file)
+
+        try:
+            apps = load_apps(manifest)
+            options = [deploy_options(app.config, app.path) for app in apps]
+        except ValueError as e:
+            self.__print_markdown(str(e))
+            return
+
+        if "apps" not in manifest:
+            self.__print_markdown("Deploying with configuration file...")
+            self.deploy(apps[0].path, apps[0].name, apps[0].entry_file, **options[0])
+            return
+
+        parallel = parallel or manifest.get("config", {}).get("parallel", DEFAULT_PARALLEL)
+        self.__print_markdown(f"Deploying {len(apps)} apps with configuration file...")
+        states = self.__deploy_apps(apps, options, parallel)
+        if self.__output is not None:
+            self.__output.emit("result", apps=[app_event_fields(state) for state in states])
         else:
-            if not isinstance(env_file, bool):
-                if os.path.exists(".env"):
-                    env = dotenv_values(".env")
-        
-        self.__print_markdown("Deploying with configuration file...")
-        self.deploy(
-            ".",
-            application_name,
-            entry_file,
-            no_frontend,
-            transform,
-            app_secret,
-            None,
-            env
+            self.__print_markdown(apps_summary(states))
+        if not all(state.ok for state in states):
+            sys.exit(1)
+
+    def __deploy_apps(self, apps: list["AppSpec"], options: list[dict], parallel: int) -> list["AppState"]:
+        """
+        Deploy `apps` concurrently and show their progress in one live table, or as `app` events
+        in `--output jsonl` mode.
+
+        At most `parallel` archives are built and uploaded at the same time, apps deploying the same
+        folder with the same packaging options share one upload. Every instance is then followed
+        by its own thread until it is running, failed or timed out.
+        """
+        import threading
+        from concurrent.futures import Future, ThreadPoolExecutor
+
+        from funix_cloud.api.watcher import watch_instance
+        from funix_cloud.cli.apps import AppState, app_event_fields, apps_table
+        from funix_cloud.util import is_git_url
+        from funix_cloud.util.archive import DEFAULT_WORKERS
+        from funix_cloud.util.compression import CompressionPolicy, policy_from_config
+        from funix_cloud.util.preflight import check_arguments
+
+        # the worker threads share one client, it is created here instead of by whichever thread needs it first
+        api = self.__api
+        history = self.__history
+        states = [
+            AppState(app, app_options, record=history.record(app.name))
+            for app, app_options in zip(apps, options)
+        ]
+        artifacts: dict[tuple, tuple[str, Future]] = {}
+        artifacts_lock = threading.Lock()
+        package_pool = ThreadPoolExecutor(max_workers=max(parallel, 1))
+        # compression threads are shared out between the apps packaged at the same time
+        default_workers = max(DEFAULT_WORKERS // max(parallel, 1), 1)
+
+        def package(state: AppState, policy: CompressionPolicy) -> Optional[dict]:
+            state.phase = "packaging"
+            return self.__package(
+                state.spec.path,
+                state.options["incremental"],
+                state.options["workers"] or default_workers,
+                state.options["stream"],
+                policy,
+                state.options["cache"],
+                state.options["cache_hash"],
+                interactive=False,
+                log=state.log,
+                record=state.record,
+                preflight=state.options["preflight"],
+            )
+
+        def deploy_app(state: AppState):
+            app, app_options = state.spec, state.options
+            policy = policy_from_config(app_options["compression"])
+
+            error = self.__check_entry(app.path, app.entry_file)
+            if error is not None:
+                state.fail(error)
+                return
+            if app_options["preflight"]:
+                problems = check_arguments(app.name, app.entry_file)
+                if problems:
+                    state.fail("; ".join(f"{problem.code.name}: {problem.message}" for problem in problems))
+                    return
+
+            key = (
+                app.path if is_git_url(app.path) else os.path.abspath(app.path),
+                app_options["incremental"],
+                app_options["stream"],
+                policy.key(),
+                app_options["cache"],
+                app_options["cache_hash"],
+                app_options["preflight"],
+            )
+            with artifacts_lock:
+                if key in artifacts:
+                    owner, artifact = artifacts[key]
+                    state.phase = "packaging"
+                    state.record.method = "shared"
+                    state.log(f"Same archive as {owner}")
+                else:
+                    owner, artifact = app.name, package_pool.submit(package, state, policy)
+                    artifacts[key] = (owner, artifact)
+
+            source = artifact.result()
+            if source is None:
+                if owner != app.name:
+                    state.fail(f"Failed to upload the archive of {owner}")
+                else:
+                    state.phase = "failed"
+                return
+
+            state.phase = "creating"
+            req_json = self.__request_json(source, app.name, app.entry_file, app_options["no_frontend"],
+                                           app_options["transform"], app_options["app_secret"], None,
+                                           app_options["env"])
+            with state.record.phase("create"):
+                result = self.__create(req_json)
+            if result["code"] == ErrorCodes.FileIsCleaned.value:
+                # the apps sharing the archive all get this, the first one uploads it again for all of them
+                with artifacts_lock:
+                    owner, current = artifacts[key]
+                    if current is artifact and self.__upload_expired(result, req_json):
+                        owner, current = app.name, package_pool.submit(package, state, policy)
+                        artifacts[key] = (owner, current)
+                if current is not artifact:
+                    uploader = "uploading it" if owner == app.name else f"{owner} is uploading it"
+                    state.log(f"The server has already removed the previously uploaded archive, {uploader} again...")
+                    source = current.result()
+                    if source is None:
+                        if owner != app.name:
+                            state.fail(f"Failed to upload the archive of {owner}")
+                        else:
+                            state.phase = "failed"
+                        return
+                    state.phase = "creating"
+                    req_json.update(source)
+                    with state.record.phase("create"):
+                        result = self.__create(req_json)
+
+            if result["code"] != 0:
+                state.record.finish("error", result["code"])
+                state.fail(f"Failed to deploy: {ErrorCodes(result['code']).name} {result.get('message') or ''}")
+                return
+
+            state.instance_id = state.record.instance_id = result["data"]["instance_id"]
+            state.phase = "deploying"
+            state.log("")
+            for event in watch_instance(api, self.__token, state.instance_id, app_options["timeout"]):
+                state.record.on_event(event)
+                match event.kind:
+                    case "error":
+                        state.log(event.response.get("message") or ErrorCodes(event.response["code"]).name)
+                    case "stage":
+                        state.stage = instance_stage_from_int(event.stage)
+                    case "health":
+                        state.health = event.health.get("desc") or "Unknown"
+                    case "failed":
+                        state.fail(ErrorCodes(event.errcode).name if event.errcode else "Deployment failed")
+                    case "success":
+                        state.phase = "running"
+                        state.log("")
+                    case "timeout":
+                        state.phase = "timeout"
+                        state.log(f"Not running after {int(app_options['timeout'])} seconds")
+
+        def run_app(state: AppState):
+            try:
+                deploy_app(state)
+            except Exception as e:
+                state.fail(f"{type(e).__name__}: {e}")
+            finally:
+                if not state.done:
+                    state.phase = "failed"
+                # failed before its instance was created
+                state.record.finish("error")
+
+        # daemon threads, so ^C does not wait for instances that are still deploying
+        threads = [threading.Thread(target=run_app, args=(state,), daemon=True) for state in states]
+        try:
+            if self.__output is not None:
+                # the states are sampled like the live table does, changed ones are written
+                written: list[Optional[dict]] = [None] * len(states)
+                for thread in threads:
+                    thread.start()
+                while True:
+                    alive = any(thread.is_alive() for thread in threads)
+                    for i, state in enumerate(states):
+                        fields = app_event_fields(state)
+                        if fields != written[i]:
+                            written[i] = fields
+                            self.__output.emit("app", **fields)
+                    if not alive:
+                        break
+                    time.sleep(0.25)
+            else:
+                from rich.live import Live
+
+                with Live(get_renderable=lambda: apps_table(states), console=self.__console, refresh_per_second=4):
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+        except (KeyboardInterrupt, EOFError):
+            for state in states:
+                if state.phase != "waiting":
+                    state.record.finish("interrupted")
+            raise
+        finally:
+            package_pool.shutdown(wait=False, cancel_futures=True)
+        return states
+
+    def cache(self, action: Literal["list", "prune", "clear"] = "list", max_size: float | None = None):
+        """
+        Inspect or prune the local cache of deployment zips
+
+        Args:
+            action (str): "list" the cached zips, "prune" them down to `max_size`, or "clear" all of them.
+                Defaults to "list".
+            max_size (float | None): Size limit in MB used by "prune". Defaults to 1024.
+        """
+        match action:
+            case "list":
+                entries = self.__build_cache.entries()
+                if self.__output is not None:
+                    self.__output.emit("result", entries=entries)
+                    return
+                if not entries:
+                    self.__log("The cache is empty")
+                    return
+                total = sum(entry["size"] for entry in entries)
+                markdown = f"{len(entries)} cached deployment zips, {total / 1024 / 1024:.1f} MB in total:\n\n"
+                for entry in entries:
+                    last_used = datetime.datetime.fromtimestamp(entry["last_used"]).strftime("%Y-%m-%d %H:%M:%S")
+                    markdown += (
+                        f"- `{entry['key'][:12]}` {entry['size'] / 1024 / 1024:.1f} MB, "
+                        f"last used {last_used}, from `{entry['source']}`\n"
+                    )
+                self.__print_markdown(markdown)
+            case "prune" | "clear":
+                if action == "clear":
+                    removed = self.__build_cache.clear()
+                else:
+                    limit = None if max_size is None else int(max_size * 1024 * 1024)
+                    removed = self.__build_cache.prune(limit)
+                freed = sum(entry["size"] for entry in removed)
+                if self.__output is not None:
+                    self.__output.emit("result", removed=removed, freed=freed)
+                    return
+                self.__log(f"Removed {len(removed)} cached deployment zips, freed {freed / 1024 / 1024:.1f} MB")
+            case _:
+                self.__print_markdown(f"Unknown action `{action}`, expected `list`, `prune` or `clear`.")
+
+    def stats(
+        self,
+        days: float = 30,
+        app: str | None = None,
+        recent: int = 10,
+        by: Literal["day", "week"] = "day",
+    ):
+        """
+        Show how long past deploys took in each phase and stage, and how it changed over time
+
+        Args:
+            days (float, optional): Only the deploys of the last `days` days. Defaults to 30.
+            app (str | None, optional): Only the deploys of this app name. Defaults to all apps.
+            recent (int, optional): The p50 of the last `recent` deploys is compared with the one of the deploys
+                before them, to spot regressions. Defaults to 10.
+            by (str, optional): Group the trend by "day" or "week". Defaults to "day".
+        """
+        import sqlite3
+
+        from funix_cloud.history import phase_stats, trends
+
+        if by not in ("day", "week"):
+            self.__print_markdown(f"Unknown `--by {by}`, expected `day` or `week`.")
+            return
+
+        try:
+            deploys = self.__history.deploys(time.time() - days * 24 * 3600, app)
+        except sqlite3.Error as e:
+            self.__print_markdown(f"Cannot read the deploy history `{self.__history.path}`: {e}")
+            return
+        phases = phase_stats(deploys, recent)
+        periods = trends(deploys, by)
+        if self.__output is not None:
+            self.__output.emit("result", stats={"deploys": len(deploys), "phases": phases, "trends": periods})
+            return
+        if not deploys:
+            self.__log(f"No deploy in the last {days:g} days" + (f" for `{app}`" if app else ""))
+            return
+
+        from rich.table import Table
+
+        def seconds(value: Optional[float]) -> str:
+            return "-" if value is None else f"{value:.2f}"
+
+        def change(value: Optional[float]) -> str:
+            if value is None:
+                return "-"
+            # changes below 20% are noise on a shared build platform
+            color = "red3" if value > 0.2 else "spring_green3" if value < -0.2 else "default"
+            return f"[{color}]{value:+.0%}[/]"
+
+        failed = sum(1 for deploy in deploys if deploy["outcome"] != "success")
+        table = Table(
+            title=f"{len(deploys)} deploys ({failed} not successful), seconds per phase",
+            caption=f"Last: p50 of the last {recent} deploys, Before: p50 of the ones before them",
         )
+        table.add_column("Phase", no_wrap=True)
+        table.add_column("Kind")
+        for column in ("Deploys", "p50", "p95", "Max", "Last", "Before", "Change"):
+            table.add_column(column, justify="right")
+        for row in phases:
+            if row["kind"] == "total":
+                table.add_section()
+            table.add_row(
+                row["phase"],
+                row["kind"],
+                str(row["count"]),
+                seconds(row["p50"]),
+                seconds(row["p95"]),
+                seconds(row["max"]),
+                seconds(row["recent_p50"]),
+                seconds(row["previous_p50"]),
+                change(row["change"]),
+            )
+        self.__console.print(table)
+
+        table = Table(title=f"Deploys per {by}, seconds of the successful ones")
+        table.add_column(by.capitalize())
+        for column in ("Deploys", "Failed", "p50", "p95", "Server p50", "Size p50 (MB)"):
+            table.add_column(column, justify="right")
+        for row in periods:
+            size = row["artifact_bytes_p50"]
+            table.add_row(
+                row["period"],
+                str(row["deploys"]),
+                str(row["failed"]),
+                seconds(row["p50"]),
+                seconds(row["p95"]),
+                seconds(row["server_p50"]),
+                "-" if size is None else f"{size / 1024 / 1024:.1f}",
+            )
+        self.__console.print(table)
 
-    def query(self, instance_id: int, raw: bool = False):
+    def query(self, instance_id: int, raw: bool = False, refresh: bool = False):
         """
         Query an instance from Funix Cloud
 
         Args:
             instance_id(int): Instance id
             raw(bool): Print raw JSON response
+            refresh(bool): Fetch the account profile again instead of using the cached one
         """
         info: ServerResponse = self.__api.query_instance(instance_id, self.__token)
         if info["code"] != 0:
             print_from_resp(self.__console, info)
             return
 
-        me = self.__api.me(self.__token)
+        me = self.__profile(refresh)
         if me["code"] != 0:
             print_from_resp(self.__console, me)
             return
@@ -496,10 +1408,18 @@ class DeployCLI:
 
         self.query(instance_id)
 
-    def list(self):
+    def list(self, health: bool = False, concurrency: int | None = None, refresh: bool = False):
         """
         List all instances of the current account
+
+        Args:
+            health (bool, optional): Also fetch the health of every instance and show a table. Defaults to False.
+            concurrency (int | None, optional): How many health requests are in flight at the same time.
+                Defaults to the size of the connection pool (10).
+            refresh (bool, optional): Fetch the account profile again instead of using the cached one.
+                Defaults to False.
         """
+        from tzlocal import get_localzone
 
         resp = self.__api.query_all_instance(self.__token)
         if resp["code"] != 0:
@@ -509,23 +1429,147 @@ class DeployCLI:
         instances: list = resp["data"]
         instances_len = len(instances)
         if instances_len == 0:
+            if self.__output is not None:
+                self.__output.emit("result", instances=[])
+                return
             print("No instances created")
             return
 
-        me = self.__api.me(self.__token)
+        healths: dict[int, ServerResponse] = {}
+        if health:
+            from concurrent.futures import ThreadPoolExecutor
+
+            concurrency = max(min(concurrency or self.__api.pool_size, instances_len), 1)
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                futures = {
+                    instance["id"]: executor.submit(self.__fetch_health, instance["id"])
+                    for instance in instances
+                }
+            healths = {instance_id: future.result() for instance_id, future in futures.items()}
+            if self.__output is None:
+                self.__console.print(self.__instances_table(instances, healths, get_localzone()))
+                return
+
+        me = self.__profile(refresh)
         if me["code"] != 0:
             print_from_resp(self.__console, me)
             return
 
         me_name = me["data"]["username"]
 
+        if self.__output is not None:
+            results = []
+            for instance in instances:
+                result = self.__instance_result(me_name, instance)
+                if instance["id"] in healths:
+                    result["health"] = healths[instance["id"]]
+                results.append(result)
+            self.__output.emit("result", instances=results)
+            return
+
+        zone = get_localzone()
+
         self.__print_markdown(f"There are total {instances_len} instances:")
         self.__print_markdown("----")
 
         for instance in instances:
-            self.__print_instance(me_name, instance)
+            self.__print_instance(me_name, instance, zone)
             self.__print_markdown("----")
 
+    def watch(self, interval: float = 5, health_interval: float = 30, concurrency: int | None = None):
+        """
+        Watch all instances of the current account in a live table, press ^C to exit
+
+        Args:
+            interval (float, optional): Seconds between two queries of all instances. Defaults to 5.
+            health_interval (float, optional): Seconds between two health checks of the running instances.
+                Defaults to 30.
+            concurrency (int | None, optional): How many health requests are in flight at the same time.
+                Defaults to the size of the connection pool (10).
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from contextlib import nullcontext
+
+        import requests
+
+        from funix_cloud.api.watcher import backoff
+        from funix_cloud.cli.fleet import FleetView
+
+        view = FleetView()
+        errors = 0
+        next_health = 0.0
+        updated_at = ""
+        # in jsonl mode, the instances last written
+        written: dict[int, dict] = {}
+
+        def write_changes(output: JsonLines, instances: list[dict]):
+            nonlocal written
+            current = {instance["id"]: instance for instance in instances}
+            for instance_id, instance in current.items():
+                old = written.get(instance_id)
+                if old is None or (old["state"], old["status"], old["name"]) != \
+                        (instance["state"], instance["status"], instance["name"]):
+                    output.emit("instance", instance=self.__instance_result(None, instance))
+            for instance_id in written.keys() - current.keys():
+                output.emit("removed", instance_id=instance_id)
+            written = current
+
+        if self.__output is None:
+            from rich.live import Live
+
+            live = Live(view.table(), console=self.__console, auto_refresh=False)
+        else:
+            live = nullcontext()
+
+        with ThreadPoolExecutor(max_workers=max(concurrency or self.__api.pool_size, 1)) as executor, live:
+            while True:
+                try:
+                    resp: ServerResponse = self.__api.query_all_instance(self.__token)
+                except requests.exceptions.RequestException as e:
+                    resp = {"code": ErrorCodes.ServerError.value, "message": str(e), "data": None}
+                if resp["code"] != 0:
+                    errors += 1
+                    if self.__output is not None:
+                        print_from_resp(self.__console, resp)
+                    else:
+                        view.caption = f"[red3]{ErrorCodes(resp['code']).name}[/] at " \
+                                       f"{time.strftime('%H:%M:%S')}, retrying..."
+                        live.update(view.table(), refresh=True)
+                    time.sleep(max(interval, backoff(errors)))
+                    continue
+                errors = 0
+
+                if self.__output is not None:
+                    write_changes(self.__output, resp["data"])
+                    if time.monotonic() >= next_health:
+                        running = [instance["id"] for instance in resp["data"] if instance["state"] == 200]
+                        for instance_id, health in zip(running, executor.map(self.__fetch_health, running)):
+                            if health["code"] == 0:
+                                self.__output.emit("health", instance_id=instance_id, health=health["data"])
+                            else:
+                                print_from_resp(self.__console, health)
+                        next_health = time.monotonic() + health_interval
+                    time.sleep(interval)
+                    continue
+
+                changed = view.update(resp["data"])
+                if time.monotonic() >= next_health:
+                    running = [instance["id"] for instance in resp["data"] if instance["state"] == 200]
+                    changed |= view.update_health(dict(zip(running, executor.map(self.__fetch_health, running))))
+                    next_health = time.monotonic() + health_interval
+                changed |= view.expire()
+
+                # the caption only has minutes, so an unchanged fleet is redrawn once a minute at most
+                now = time.strftime("%H:%M")
+                if now != updated_at:
+                    updated_at = now
+                    view.caption = f"Updated at {now}, press ^C to exit"
+                    changed = True
+
+                if changed:
+                    live.update(view.table(), refresh=True)
+                time.sleep(interval)
+
     def delete(self, instance_id: int):
         """
         Delete an instance from Funix Cloud
@@ -540,20 +1584,31 @@ class DeployCLI:
             return
 
         self.__print_markdown(f"Successfully removed instance `{instance_id}`!")
+        if self.__output is not None:
+            self.__output.emit("result", removed=instance_id)
 
-    def login(self, username: str):
+    def login(self, username: str, server: str | None = None):
         """
         Login to the Funix Cloud.
 
         Args:
             username (str): Username to log in with.
+            server (str | None, optional): The API server to log in to, it is saved in the profile along with the token.
+                Defaults to the API server of the profile.
         """
+        if server is not None:
+            self.__api_client = API(server, tracer=self.__tracer)
         password = getpass("Please input password: ")
         result = self.__api.login(username, password)
 
         if result["code"] == 0:
             self.__token = result["data"]["token"]
-            self.__config.set("token", result["data"]["token"])
+            self.__api.set_token(self.__token)
+            with self.__config.batch():
+                self.__config.set("token", result["data"]["token"])
+                if server is not None:
+                    self.__config.set("api_server", server)
+            self.__profile_cache.clear()
             self.__console.print("Login successful! Your token is saved.")
         else:
             print_from_resp(self.__console, result)
@@ -563,8 +1618,11 @@ class DeployCLI:
         Logout from the Funix Cloud.
         """
         self.__token = None
+        if self.__api_client is not None:
+            self.__api_client.set_token(None)
         self.__config.set("token", None)
-        self.__console.print("Logout successful!")
+        self.__profile_cache.clear()
+        self.__log("Logout successful!")
 
     def change_email(self, email: str):
         """
@@ -582,6 +1640,7 @@ class DeployCLI:
             return
 
         result = self.__api.bind_email(self.__token, email)
+        self.__profile_cache.clear()
 
         if result["code"] == 0:
             self.__print_markdown(
@@ -590,18 +1649,24 @@ class DeployCLI:
         else:
             print_from_resp(self.__console, result)
 
-    def me(self):
+    def me(self, refresh: bool = False):
         """
         Get your account profile.
+
+        Args:
+            refresh (bool): Fetch the profile again instead of using the one cached for up to an hour.
         """
         if not self.__token:
             self.__console.print("Please login first.")
             return
 
-        result = self.__api.me(self.__token)
+        result = self.__profile(refresh)
 
         if result["code"] == 0:
             me_data = result["data"]
+            if self.__output is not None:
+                self.__output.emit("result", profile=me_data)
+                return
             list_str = f"- ID: {me_data['id']}\n"
             list_str += f"- Username: {me_data['username']}\n"
             if "email" in me_data:
@@ -637,19 +1702,24 @@ class DeployCLI:
 
         ticket = generate_result["data"]["ticket"]
         otpauth: str = generate_result["data"]["otpauth"]
-        qr = QRCode()
-        qr.add_data(otpauth)
-
         secret = otpauth.split("secret=")[1].split("&")[0]
 
-        qr.print_ascii()
-        self.__print_markdown(
-            f"If you cannot scan QR Code, please input secret code in your 2FA app by yourself: "
-            f"`{secret}`"
-        )
-        code = input("Please input the code from your 2FA app: ")
+        if self.__output is not None:
+            self.__output.emit("data", data={"otpauth": otpauth, "secret": secret})
+        else:
+            from qrcode import QRCode
+
+            qr = QRCode()
+            qr.add_data(otpauth)
+            qr.print_ascii()
+            self.__print_markdown(
+                f"If you cannot scan QR Code, please input secret code in your 2FA app by yourself: "
+                f"`{secret}`"
+            )
+        code = self.__input("Please input the code from your 2FA app: ")
 
         result = self.__api.two_fa_bind(self.__token, ticket, code)
+        self.__profile_cache.clear()
 
         if result["code"] == 0:
             self.__print_markdown(f"2FA bind successful!")
@@ -675,6 +1745,7 @@ class DeployCLI:
             return
 
         result = self.__api.change_password(self.__token, old_password, new_password)
+        self.__profile_cache.clear()
 
         if result["code"] == 0:
             self.__print_markdown(
@@ -701,7 +1772,7 @@ class DeployCLI:
             print_from_resp(self.__console, result)
 
         ticket = result["data"]["ticket"]
-        code = int(input("Please input the code from your email: "))
+        code = int(self.__input("Please input the code from your email: "))
         new_password = getpass("Please input new password: ")
         confirm_password = getpass("Please confirm new password: ")
 
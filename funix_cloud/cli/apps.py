@@ -0,0 +1,174 @@
+import os
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Optional
+
+from dotenv import dotenv_values
+
+from funix_cloud.api.watcher import DEFAULT_DEADLINE
+from funix_cloud.history import DeployRecord
+from funix_cloud.util import is_git_url
+
+if TYPE_CHECKING:
+    from rich.table import Table
+
+DEFAULT_PARALLEL = 4
+
+PHASE_STYLES = {
+    "waiting": "grey58",
+    "packaging": "bright_yellow",
+    "creating": "bright_yellow",
+    "deploying": "bright_yellow",
+    "running": "spring_green3",
+    "failed": "red3",
+    "timeout": "red3",
+}
+
+
+@dataclass
+class AppSpec:
+    name: str
+    path: str = "."
+    entry_file: str = "main.py"
+    config: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class AppState:
+    """
+    Progress of one app of a multi-app deploy, written by its worker thread and read by the live view.
+    """
+    spec: AppSpec
+    options: dict[str, Any]
+    phase: str = "waiting"
+    detail: str = ""
+    instance_id: Optional[int] = None
+    stage: str = ""
+    health: str = ""
+    # timings for the deploy history
+    record: DeployRecord = field(default_factory=DeployRecord)
+
+    @property
+    def done(self) -> bool:
+        return self.phase in ("running", "failed", "timeout")
+
+    @property
+    def ok(self) -> bool:
+        return self.phase == "running"
+
+    def log(self, message: str):
+        self.detail = message
+
+    def fail(self, message: str):
+        self.phase = "failed"
+        self.detail = message
+
+
+def load_apps(manifest: dict) -> list[AppSpec]:
+    """
+    The apps of a `funix-cloud.toml`: the `[main]` app followed by every `[[apps]]` entry.
+    An app's own `config` table overrides the shared `[config]` section.
+    """
+    base = manifest.get("config", {})
+    tables = ([manifest["main"]] if "main" in manifest else []) + list(manifest.get("apps", []))
+
+    apps = []
+    for table in tables:
+        if "name" not in table:
+            raise ValueError("Every app in `funix-cloud.toml` needs a `name`")
+        config = dict(base)
+        config.update(table.get("config", {}))
+        apps.append(AppSpec(table["name"], table.get("path", "."), table.get("entry_file", "main.py"), config))
+
+    names = [app.name for app in apps]
+    duplicated = sorted({name for name in names if names.count(name) > 1})
+    if duplicated:
+        raise ValueError(f"App names must be unique, found {', '.join(f'`{name}`' for name in duplicated)} twice")
+    return apps
+
+
+def app_dir(path: str) -> str:
+    """
+    The folder of an app's `path`: the folder itself, the one of a zip or python file, or the current one for a Git URL.
+    """
+    if os.path.isdir(path):
+        return path
+    if is_git_url(path):
+        return "."
+    return os.path.dirname(path) or "."
+
+
+def deploy_options(config: dict, path: str = ".") -> dict[str, Any]:
+    """
+    Keyword arguments of `DeployCLI.deploy` from a `[config]` section, for the app at `path`.
+    """
+    env_file = config.get("env", None)
+    env = None
+    if env_file:
+        # relative to the app's folder
+        env_file = os.path.join(app_dir(path), env_file)
+        if not os.path.exists(env_file):
+            raise ValueError(f"Environment file `{env_file}` not found")
+        env = dotenv_values(env_file)
+    elif not isinstance(env_file, bool) and os.path.exists(os.path.join(app_dir(path), ".env")):
+        env = dotenv_values(os.path.join(app_dir(path), ".env"))
+
+    return {
+        "no_frontend": config.get("no_frontend", False),
+        "transform": config.get("transform", False),
+        "app_secret": config.get("secret", None),
+        "env": env,
+        "incremental": config.get("incremental", False),
+        "workers": config.get("workers", None),
+        "stream": config.get("stream", False),
+        "compression": config.get("compression", None),
+        "cache": config.get("cache", True),
+        "cache_hash": config.get("cache_hash", False),
+        "timeout": config.get("timeout", DEFAULT_DEADLINE),
+        "preflight": config.get("preflight", True),
+    }
+
+
+def apps_table(states: list[AppState]) -> "Table":
+    from rich.table import Table
+
+    table = Table(title="Deploying apps")
+    table.add_column("App")
+    table.add_column("Instance")
+    table.add_column("Status")
+    table.add_column("Stage")
+    table.add_column("Health")
+    table.add_column("Detail", overflow="fold")
+    for state in states:
+        style = PHASE_STYLES.get(state.phase, "grey58")
+        table.add_row(
+            state.spec.name,
+            str(state.instance_id) if state.instance_id is not None else "",
+            f"[{style}]{state.phase}[/]",
+            state.stage,
+            state.health,
+            state.detail,
+        )
+    return table
+
+
+def app_event_fields(state: AppState) -> dict[str, Any]:
+    """
+    The keys of the `app` event written for `state` in `--output jsonl` mode.
+    """
+    return {
+        "app": state.spec.name,
+        "phase": state.phase,
+        "instance_id": state.instance_id,
+        "stage": state.stage,
+        "health": state.health,
+        "detail": state.detail,
+    }
+
+
+def apps_summary(states: list[AppState]) -> str:
+    deployed = sum(state.ok for state in states)
+    summary = f"Deployed {deployed} of {len(states)} apps."
+    for state in states:
+        if not state.ok:
+            summary += f"\n- {state.spec.name}: {state.phase}, {state.detail or 'no details'}"
+    return summary
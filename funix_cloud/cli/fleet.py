@@ -0,0 +1,148 @@
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+from funix_cloud.api import ErrorCodes, ServerResponse, instance_stage_from_int
+
+if TYPE_CHECKING:
+    from rich.table import Table
+
+# How long a changed row stays highlighted
+HIGHLIGHT_SECONDS = 30
+
+
+def health_color(color: str) -> str:
+    # https://rich.readthedocs.io/en/stable/appendix/colors.html
+    match color:
+        case "Green":
+            return "spring_green3"
+        case "Grey":
+            return "grey58"
+        case "Yellow":
+            return "bright_yellow"
+        case "Red":
+            return "red3"
+        case _:
+            # unknown fallback
+            return "grey58"
+
+
+def health_text(resp: Optional[ServerResponse]) -> str:
+    if resp is None:
+        return ""
+    if resp["code"] != 0:
+        return f"[red3]{ErrorCodes(resp['code']).name}[/]"
+    data = resp["data"] or {}
+    return f"[{health_color(data.get('color') or 'Grey')}]{data.get('desc') or 'Unknown'}[/]"
+
+
+@dataclass
+class FleetRow:
+    instance: dict
+    health: str = ""
+    change: str = ""
+    changed_at: Optional[float] = None
+    cells: tuple[str, ...] = field(default_factory=tuple)
+
+
+class FleetView:
+    """
+    Rows of the `watch` dashboard, diffed snapshot by snapshot.
+
+    The cells of a row are only formatted again when the row changed, and the `update*` methods
+    return whether anything did, so the caller only redraws the table when it has to.
+    """
+
+    def __init__(self, caption: str = ""):
+        self.rows: dict[int, FleetRow] = {}
+        self.caption = caption
+        self.first = True
+
+    def _render(self, row: FleetRow):
+        instance = row.instance
+        highlighted = row.changed_at is not None
+        change = f"[bold]{row.change}[/]" if highlighted else row.change
+        row.cells = (
+            str(instance["id"]),
+            instance["name"],
+            f"[bold]{instance_stage_from_int(instance['state'])}[/]" if highlighted
+            else instance_stage_from_int(instance["state"]),
+            f"[red3]{instance['status']}[/]" if instance["status"] else str(instance["status"]),
+            row.health,
+            change,
+        )
+
+    def _changed(self, row: FleetRow, change: str):
+        row.change = f"{time.strftime('%H:%M:%S')} {change}"
+        row.changed_at = time.monotonic()
+
+    def update(self, instances: list[dict]) -> bool:
+        changed = False
+        seen = set()
+        for instance in instances:
+            seen.add(instance["id"])
+            row = self.rows.get(instance["id"])
+            if row is None:
+                row = self.rows[instance["id"]] = FleetRow(instance)
+                if not self.first:
+                    self._changed(row, "created")
+            elif (row.instance["state"], row.instance["status"], row.instance["name"]) == \
+                    (instance["state"], instance["status"], instance["name"]):
+                continue
+            else:
+                old, row.instance = row.instance, instance
+                if old["status"] != instance["status"]:
+                    self._changed(row, f"error {old['status']} → {instance['status']}")
+                elif old["state"] != instance["state"]:
+                    self._changed(
+                        row,
+                        f"{instance_stage_from_int(old['state'])} → {instance_stage_from_int(instance['state'])}",
+                    )
+            self._render(row)
+            changed = True
+
+        for instance_id in self.rows.keys() - seen:
+            del self.rows[instance_id]
+            changed = True
+
+        self.first = False
+        return changed
+
+    def update_health(self, healths: dict[int, ServerResponse]) -> bool:
+        changed = False
+        for instance_id, resp in healths.items():
+            row = self.rows.get(instance_id)
+            health = health_text(resp)
+            if row is None or row.health == health:
+                continue
+            row.health = health
+            self._render(row)
+            changed = True
+        return changed
+
+    def expire(self) -> bool:
+        """
+        Stop highlighting rows that changed more than `HIGHLIGHT_SECONDS` ago.
+        """
+        changed = False
+        now = time.monotonic()
+        for row in self.rows.values():
+            if row.changed_at is not None and now - row.changed_at > HIGHLIGHT_SECONDS:
+                row.changed_at = None
+                self._render(row)
+                changed = True
+        return changed
+
+    def table(self) -> "Table":
+        from rich.table import Table
+
+        table = Table(title=f"{len(self.rows)} instances", caption=self.caption)
+        table.add_column("ID", justify="right")
+        table.add_column("Name")
+        table.add_column("Status")
+        table.add_column("Error Code", justify="right")
+        table.add_column("Health")
+        table.add_column("Last Change")
+        for instance_id in sorted(self.rows):
+            table.add_row(*self.rows[instance_id].cells)
+        return table
@@ -0,0 +1,128 @@
+"""
+`--output jsonl`: commands write one JSON object per line to stdout instead of rendering with Rich.
+
+Every line has an `event` name and a `time` (Unix seconds), the other keys depend on the event:
+
+- `message`: `text`, progress and explanations meant for humans.
+- `data`: `data`, a JSON document the command printed.
+- `error`: `code` (the `ErrorCodes` name), `value`, `message` and the raw `response` if any.
+- `created`: the `instance_id` and `app_name` of a new deployment.
+- `stage`, `health`, `failed`, `success`, `timeout`: deployment progress of `instance_id`.
+- `status`: the text a spinner would show.
+- `app`: a change of one app of a multi-app `run`.
+- `instance`, `removed`: a new or changed instance, or one that is gone, in `watch`.
+- `result`: what the command produced, under a key named after it, e.g. `instances` for `list`,
+  `instance` for `query`, `profile` for `me`.
+- `interrupted`: the command was stopped with ^C.
+- `trace`: with `--trace`, the last line, `routes` has the timing of the requests per route and
+  `file` the Chrome trace written, if any.
+
+This module must not import Rich, it is loaded before any command runs.
+"""
+import json
+import re
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Optional, TextIO
+
+from funix_cloud.api import ErrorCodes, instance_stage_from_int
+
+if TYPE_CHECKING:
+    from funix_cloud.api.watcher import StatusEvent
+
+OUTPUT_ENV = "FUNIX_CLOUD_OUTPUT"
+OUTPUT_MODES = ("rich", "jsonl")
+
+# Rich markup tags such as `[red3]` or `[/]`
+MARKUP = re.compile(r"\[/?[a-z][a-z0-9_ #.=]*\]|\[/\]")
+
+_active: Optional["JsonLines"] = None
+
+
+def active() -> Optional["JsonLines"]:
+    """
+    The writer of the running command in `--output jsonl` mode, None in the default mode.
+    """
+    return _active
+
+
+class _Status:
+    def __init__(self, output: "JsonLines"):
+        self.output = output
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def update(self, status: str):
+        self.output.emit("status", text=MARKUP.sub("", status))
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class JsonLines:
+    """
+    Writes events to `file`, and stands in for the `rich.console.Console` of the CLI, so code
+    that prints through the console (like `print_from_resp`) keeps working.
+    Lines are written whole and flushed at once, from any thread.
+    """
+    structured = True
+
+    def __init__(self, file: Optional[TextIO] = None):
+        global _active
+
+        self.file = file or sys.stdout
+        self.lock = threading.Lock()
+        _active = self
+
+    def emit(self, event: str, **fields: Any):
+        line = json.dumps({"event": event, "time": round(time.time(), 3), **fields}, ensure_ascii=False, default=str)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def print(self, *objects: Any, **kwargs: Any):
+        self.emit("message", text=MARKUP.sub("", " ".join(str(o) for o in objects)))
+
+    def print_json(self, json_str: Optional[str] = None, *, data: Any = None, **kwargs: Any):
+        self.emit("data", data=json.loads(json_str) if json_str is not None else data)
+
+    def status(self, status: str, **kwargs: Any) -> _Status:
+        spinner = _Status(self)
+        spinner.update(status)
+        return spinner
+
+    def error(self, code: ErrorCodes, response: Optional[dict] = None):
+        self.emit(
+            "error",
+            code=code.name,
+            value=code.value,
+            message=(response or {}).get("message") or "",
+            response=response,
+        )
+
+
+def status_event_fields(event: "StatusEvent") -> dict[str, Any]:
+    """
+    The keys of the event written for a deployment status event.
+    """
+    match event.kind:
+        case "stage":
+            return {"stage": event.stage, "stage_name": instance_stage_from_int(event.stage)}
+        case "health":
+            return {"health": event.health}
+        case "error":
+            code = ErrorCodes(event.response["code"])
+            return {"code": code.name, "value": code.value, "message": event.response.get("message") or ""}
+        case "failed":
+            code = ErrorCodes(event.errcode) if event.errcode else None
+            return {"code": code.name if code else None, "value": event.errcode}
+        case _:
+            return {}
@@ -1,4 +1,3 @@
-import os
 import json
 
 from funix_cloud.api import API
@@ -13,9 +12,10 @@ from ipywidgets import Password
 from funix_cloud.util import check_username, check_email, check_password, check_password_web
 
 
-config = ConfigDict(os.path.expanduser("~/.config/funix-cloud/config.json"))
-api = API(config.get("api_server", "https://cloud-dev.funix.io"))
+# `funix-cloud --profile <name> web` sets FUNIX_CLOUD_PROFILE before loading this module
+config = ConfigDict.for_profile()
 token = config.get("token", None)
+api = API(config.get("api_server", "https://cloud-dev.funix.io"), token)
 
 class FunixCloud:
     @staticmethod
@@ -82,6 +82,7 @@ class FunixCloud:
             return F"""We encountered an error while logging in. Here is the error message:\n\n```json\n{json.dumps(login_result)}\n```"""
         
         token = login_result["data"]["token"]
+        api.set_token(token)
         config.set("token", token)
         
         email_result = api.bind_email(email)
@@ -98,5 +99,6 @@ class FunixCloud:
             return F"""We encountered an error while logging in. Here is the error message:\n\n```json\n{json.dumps(login_result)}\n```"""
         
         token = login_result["data"]["token"]
+        api.set_token(token)
         config.set("token", token)
         return "Successfully logged in."
@@ -1,7 +1,72 @@
 import json
 import os
+import re
+import tempfile
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows, writes are still atomic but not serialized
+    fcntl = None
+
+DEFAULT_API_SERVER = "https://cloud-dev.funix.io"
+DEFAULT_PROFILE = "default"
+PROFILE_ENV = "FUNIX_CLOUD_PROFILE"
+PROFILE_NAME = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]*$")
+
+
+def config_dir(profile: Optional[str] = None) -> str:
+    """
+    The folder of the config and per-account caches of `profile`, by default the one in
+    the `FUNIX_CLOUD_PROFILE` environment variable, or the default profile.
+
+    The default profile lives in `~/.config/funix-cloud`, named ones in
+    `~/.config/funix-cloud/profiles/<name>`.
+    """
+    profile = profile or os.environ.get(PROFILE_ENV) or DEFAULT_PROFILE
+    if not PROFILE_NAME.match(profile):
+        raise ValueError(f"Invalid profile name: {profile}")
+    root = os.path.expanduser("~/.config/funix-cloud")
+    if profile == DEFAULT_PROFILE:
+        return root
+    return os.path.join(root, "profiles", profile)
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """
+    Hold an exclusive advisory lock on `path` (created if needed) for the block.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def write_json_atomic(path: str, data: dict):
+    """
+    Write `data` to a temporary file next to `path` then rename it over `path`, so readers
+    see either the old or the new content and a crash never leaves a truncated file.
+    The file is only readable by its owner.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".config-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
 
 
 @dataclass
@@ -12,11 +77,21 @@ class ConfigDict:
 
     def __init__(self, config_path: str):
         self.config_path = config_path
+        self.lock_path = config_path + ".lock"
+        self._batch_depth = 0
+        self._changed: set[str] = set()
         self.read_config()
 
+    @classmethod
+    def for_profile(cls, profile: Optional[str] = None) -> "ConfigDict":
+        """
+        The config of `profile`, see `config_dir`.
+        """
+        return cls(os.path.join(config_dir(profile), "config.json"))
+
     def default(self):
         self.token = None
-        self.api_server = "https://cloud-dev.funix.io"
+        self.api_server = DEFAULT_API_SERVER
 
     def to_dict(self):
         return {"token": self.token, "api_server": self.api_server}
@@ -25,16 +100,27 @@ class ConfigDict:
         self.token = data["token"]
         self.api_server = data["api_server"]
 
+    def _read_file(self) -> Optional[dict]:
+        try:
+            with open(self.config_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # left over by a version that wrote the file in place
+            return {}
+
     def read_config(self):
-        if not os.path.exists(self.config_path):
-            os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
+        data = self._read_file()
+        if data is None:
             self.default()
-            with open(self.config_path, "w") as f:
-                json.dump(self.to_dict(), f)
-        else:
-            with open(self.config_path, "r") as f:
-                data = json.load(f)
-                self.from_dict(data)
+            with file_lock(self.lock_path):
+                if not os.path.exists(self.config_path):
+                    write_json_atomic(self.config_path, self.to_dict())
+                    return
+            data = self._read_file()
+        self.default()
+        self.from_dict({**self.to_dict(), **data})
 
     def get(self, key: str, default: Any | None) -> Any | None:
         if hasattr(self, key):
@@ -47,5 +133,44 @@ class ConfigDict:
             setattr(self, key, value)
         else:
             raise KeyError(f"Key {key} does not exist in config.")
-        with open(self.config_path, "w") as f:
-            json.dump(self.to_dict(), f)
+        self._changed.add(key)
+        if not self._batch_depth:
+            self.save()
+
+    def update(self, **values: Any):
+        """
+        Set several keys with a single write.
+        """
+        with self.batch():
+            for key, value in values.items():
+                self.set(key, value)
+
+    @contextmanager
+    def batch(self) -> Iterator["ConfigDict"]:
+        """
+        Defer the writes of `set` in the block to one write at its end. Nothing is written
+        if the block raises, the values stay changed in memory.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+        if not self._batch_depth:
+            self.save()
+
+    def save(self):
+        """
+        Write the keys changed since the last save. The file is read again under the lock
+        and only those keys are replaced, so a concurrent process changing other keys
+        doesn't lose its write.
+        """
+        if not self._changed:
+            return
+        with file_lock(self.lock_path):
+            data = self._read_file() or {}
+            current = self.to_dict()
+            data.update({key: current[key] for key in self._changed})
+            write_json_atomic(self.config_path, data)
+            self._changed.clear()
+        self.from_dict({**current, **data})
@@ -0,0 +1,115 @@
+"""
+A local stand-in of the Funix Cloud API server, for trying the CLI offline, tests and benchmarks.
+
+It implements every route of `funix_cloud.api.Routes`: accounts, whole, chunked and incremental
+uploads (a `file_id` expires after `file_ttl` seconds), and instances that go through the stages of
+`instance_stage_from_int` on a timer, fail with the error code the real build would report, and
+can be paused and restored. Latency, a bandwidth cap and injected errors (any `ErrorCodes` value,
+or dropped connections) are configurable, requests, responses and bytes are counted.
+
+    python -m funix_cloud.emulator --port 8000 --stage-seconds 0.5 --faults /instance/query:ServerError:0.1
+    funix-cloud login funix-dev --server http://127.0.0.1:8000 --profile emulator
+
+From Python, `serve()` starts one in a background thread:
+
+    emulator = serve(stage_seconds=0)
+    token = emulator.backend.add_user("funix-dev", "Funix-Dev-1")
+    ...
+    emulator.shutdown()
+    emulator.server_close()
+"""
+import json
+import sys
+import time
+from typing import Optional
+
+from funix_cloud.emulator.server import EmulatorServer, Fault, serve
+from funix_cloud.emulator.state import Backend, EmulatorError
+
+__all__ = ["Backend", "EmulatorError", "EmulatorServer", "Fault", "serve", "run"]
+
+DEFAULT_USERNAME = "funix-dev"
+DEFAULT_PASSWORD = "Funix-Dev-1"
+
+
+def run(
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        latency: float = 0.0,
+        bandwidth_mbps: Optional[float] = None,
+        stage_seconds: float = 1.0,
+        health_seconds: float = 1.0,
+        pause_after: Optional[float] = None,
+        file_ttl: float = 30 * 60,
+        max_instances: int = 10,
+        max_file_size_mb: Optional[float] = None,
+        username: str = DEFAULT_USERNAME,
+        password: str = DEFAULT_PASSWORD,
+        token: Optional[str] = None,
+        instances: int = 0,
+        faults: str | list[str] | None = None,
+        seed: Optional[int] = None,
+        verbose: bool = False,
+):
+    """
+    Run the emulator until ^C, then print its counters.
+
+    Args:
+        host (str, optional): Address to listen on. Defaults to 127.0.0.1.
+        port (int, optional): Port to listen on. Defaults to 8000.
+        latency (float, optional): Seconds every response is delayed. Defaults to 0.
+        bandwidth_mbps (float | None, optional): Read request bodies at most this fast, in MB/s. Defaults to no limit.
+        stage_seconds (float, optional): Seconds a new instance spends in each deployment stage. Defaults to 1.
+        health_seconds (float, optional): Seconds a running instance reports as starting. Defaults to 1.
+        pause_after (float | None, optional): Pause instances after running this many seconds. Defaults to never.
+        file_ttl (float, optional): Seconds an uploaded file can be deployed. Defaults to 30 minutes.
+        max_instances (int, optional): Instances per account. Defaults to 10.
+        max_file_size_mb (float | None, optional): Largest upload, in MB. Defaults to no limit.
+        username (str, optional): Account created at start. Defaults to funix-dev.
+        password (str, optional): Password of that account. Defaults to Funix-Dev-1.
+        token (str | None, optional): Token of that account, usable without logging in. Defaults to a random one.
+        instances (int, optional): Running instances the account has at start. Defaults to 0.
+        faults (str | list[str] | None, optional): Errors to inject, comma separated `route:code[:rate[:times]]`,
+            where code is an ErrorCodes name or `drop`, e.g. `/file/upload:FileTooLarge,*:drop:0.05`.
+        seed (int | None, optional): Seed of the fault draws. Defaults to a random one.
+        verbose (bool, optional): Log every request. Defaults to False.
+    """
+    if isinstance(faults, str):
+        faults = faults.split(",")
+    emulator = serve(
+        host,
+        port,
+        latency=latency,
+        bandwidth=bandwidth_mbps * 1024 * 1024 if bandwidth_mbps else None,
+        faults=[Fault.parse(spec) for spec in faults or ()],
+        seed=seed,
+        verbose=verbose,
+        stage_seconds=stage_seconds,
+        health_seconds=health_seconds,
+        pause_after=pause_after,
+        file_ttl=file_ttl,
+        max_instances=max_instances,
+        max_file_size=int(max_file_size_mb * 1024 * 1024) if max_file_size_mb else None,
+    )
+    token = emulator.backend.add_user(username, password, token)
+    for i in range(instances):
+        emulator.backend.add_instance(username, f"app-{i + 1}")
+
+    print(f"Funix Cloud emulator listening on {emulator.url}", file=sys.stderr)
+    print(f"Account {username} / {password}, token {token}", file=sys.stderr)
+    print(f"Try: funix-cloud login {username} --server {emulator.url} --profile emulator", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emulator.shutdown()
+        emulator.server_close()
+    print(json.dumps(emulator.stats(), indent=2))
+
+
+def __main__():
+    import fire
+
+    fire.Fire(run)
@@ -0,0 +1,3 @@
+from funix_cloud.emulator import __main__
+
+__main__()
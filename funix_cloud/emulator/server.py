@@ -0,0 +1,348 @@
+"""
+HTTP front of the emulator: routing, simulated latency and bandwidth, injected faults and counters.
+"""
+import json
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, BinaryIO, Iterable, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from funix_cloud.api import ErrorCodes, Routes
+from funix_cloud.emulator.state import FAILED, Backend, EmulatorError
+
+ROUTES = {value for name, value in vars(Routes).items() if not name.startswith("_")}
+# routes whose body is a file instead of JSON
+RAW_BODY_ROUTES = {Routes.upload, Routes.upload_part, Routes.manifest_blob, Routes.manifest_delta}
+# bodies larger than this are spooled to disk
+SPOOL_SIZE = 1024 * 1024
+READ_BLOCK = 64 * 1024
+
+
+@dataclass
+class Fault:
+    """
+    Answer requests to `route` (`*` for every route) with the error `code` instead of handling them,
+    with probability `rate` and at most `times` times. A `code` of None closes the connection
+    without any answer, like a crashed server or a dropped connection.
+    """
+    route: str
+    code: Optional[ErrorCodes] = ErrorCodes.ServerError
+    rate: float = 1.0
+    times: Optional[int] = None
+
+    @classmethod
+    def parse(cls, spec: str) -> "Fault":
+        """
+        Read a fault from `route:code[:rate[:times]]`, `code` is an `ErrorCodes` name or `drop`,
+        e.g. `/file/upload:FileTooLarge`, `/instance/query:drop:0.2` or `*:ServerError:1:3`.
+        """
+        route, code, *rest = spec.split(":")
+        if route != "*" and route not in ROUTES:
+            raise ValueError(f"Unknown route {route}")
+        return cls(
+            route,
+            None if code == "drop" else ErrorCodes[code],
+            float(rest[0]) if rest else 1.0,
+            int(rest[1]) if len(rest) > 1 else None,
+        )
+
+    def matches(self, route: str) -> bool:
+        return (self.route == "*" or self.route == route) and self.times != 0
+
+
+class EmulatorServer(ThreadingHTTPServer):
+    """
+    Args:
+        address: (host, port) to listen on, port 0 picks a free one.
+        backend: The state of the emulator.
+        latency: Seconds every response is delayed.
+        bandwidth: Request bodies are read at most this fast, in bytes per second. None for no limit.
+        faults: Errors to inject, the first matching fault of a request applies.
+        seed: Seed of the random draws of the faults, for reproducible runs.
+        event_interval: How often `/instance/events` checks for changes, in seconds.
+        keep_alive_interval: Seconds after which `/instance/events` sends a comment line if nothing changed.
+        verbose: Log every request to stderr.
+        remove_root: Remove the folder of `backend` in `server_close()`.
+    """
+    daemon_threads = True
+
+    def __init__(
+            self,
+            address: tuple[str, int],
+            backend: Backend,
+            latency: float = 0.0,
+            bandwidth: Optional[float] = None,
+            faults: Iterable[Fault] = (),
+            seed: Optional[int] = None,
+            event_interval: float = 0.2,
+            keep_alive_interval: float = 15.0,
+            verbose: bool = False,
+            remove_root: bool = False,
+    ):
+        super().__init__(address, EmulatorHandler)
+        self.backend = backend
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.faults = list(faults)
+        self.random = random.Random(seed)
+        self.event_interval = event_interval
+        self.keep_alive_interval = keep_alive_interval
+        self.verbose = verbose
+        self.remove_root = remove_root
+        self.lock = threading.Lock()
+        self.reset_counters()
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests: Counter[str] = Counter()
+            # (route, ErrorCodes name) of every answer
+            self.responses: Counter[tuple[str, str]] = Counter()
+            self.injected: Counter[str] = Counter()
+            self.received_bytes = 0
+            self.sent_bytes = 0
+            self.connections = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                "requests": dict(self.requests),
+                "responses": {f"{route} {code}": count for (route, code), count in self.responses.items()},
+                "injected": dict(self.injected),
+                "received_bytes": self.received_bytes,
+                "sent_bytes": self.sent_bytes,
+                "connections": self.connections,
+            }
+
+    def pick_fault(self, route: str) -> Optional[Fault]:
+        with self.lock:
+            for fault in self.faults:
+                if fault.matches(route) and self.random.random() < fault.rate:
+                    if fault.times is not None:
+                        fault.times -= 1
+                    self.injected[fault.code.name if fault.code else "drop"] += 1
+                    return fault
+        return None
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        if self.remove_root:
+            shutil.rmtree(self.backend.root, ignore_errors=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class EmulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes, with Nagle each keep-alive response waits for an ACK
+    disable_nagle_algorithm = True
+    server: EmulatorServer
+
+    def log_message(self, format: str, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _read(self, size: int) -> bytes:
+        block = self.rfile.read(size)
+        if self.server.bandwidth:
+            time.sleep(len(block) / self.server.bandwidth)
+        return block
+
+    def _blocks(self) -> Iterable[bytes]:
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            while size := int(self.rfile.readline().split(b";")[0].strip(), 16):
+                while size:
+                    block = self._read(min(size, READ_BLOCK))
+                    if not block:
+                        return
+                    size -= len(block)
+                    yield block
+                self.rfile.readline()
+            # trailers end with a blank line
+            while self.rfile.readline().strip():
+                pass
+        else:
+            left = int(self.headers.get("Content-Length") or 0)
+            while left:
+                block = self._read(min(left, READ_BLOCK))
+                if not block:
+                    break
+                left -= len(block)
+                yield block
+
+    def _receive(self) -> BinaryIO:
+        body = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+        received = 0
+        for block in self._blocks():
+            body.write(block)
+            received += len(block)
+        body.seek(0)
+        with self.server.lock:
+            self.server.received_bytes += received
+        return body
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.sent_bytes += len(body)
+
+    def _answer(self, route: str, code: ErrorCodes, message: str = "", data: Any = None):
+        with self.server.lock:
+            self.server.responses[(route, code.name)] += 1
+        self._send(200, json.dumps({"code": code.value, "message": message, "data": data}).encode())
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        route, params = url.path, dict(parse_qsl(url.query))
+        with self.server.lock:
+            self.server.requests[route] += 1
+        with self._receive() as stream:
+            if self.server.latency:
+                time.sleep(self.server.latency)
+
+            if route != Routes.instance_events and route not in ROUTES:
+                self._send(404, b"Not Found", "text/plain")
+                return
+
+            fault = self.server.pick_fault(route)
+            if fault is not None:
+                if fault.code is None:
+                    self.close_connection = True
+                    return
+                self._answer(route, fault.code, "Injected by the emulator")
+                return
+
+            body = {}
+            if route not in RAW_BODY_ROUTES:
+                raw = stream.read()
+                try:
+                    body = json.loads(raw) if raw.strip() else {}
+                except ValueError:
+                    self._answer(route, ErrorCodes.InvalidArguments, "Invalid JSON body")
+                    return
+                if not isinstance(body, dict):
+                    body = {}
+
+            token = self.headers.get("Authorization", "").removeprefix("Bearer ").strip() or None
+            try:
+                if route == Routes.instance_events:
+                    self._events(route, token, body)
+                    return
+                data = self.server.backend.handle(
+                    route, token, body, params, self.headers.get("Content-Type") or "", stream,
+                )
+            except EmulatorError as e:
+                self._answer(route, e.code, e.message)
+                return
+            except Exception as e:
+                print(f"Emulator error on {route}: {e!r}", file=sys.stderr)
+                self._answer(route, ErrorCodes.ServerError, str(e))
+                return
+        self._answer(route, ErrorCodes.Success, "", data)
+
+    def _events(self, route: str, token: Optional[str], body: dict):
+        """
+        Stream the state of an instance as server-sent events until it is running with an ok
+        health, or failed, or removed.
+        """
+        backend = self.server.backend
+        user = backend.authenticate(token)
+        data = backend.instance_event(user, body)
+
+        with self.server.lock:
+            self.server.responses[(route, ErrorCodes.Success.name)] += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write(chunk: bytes):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.flush()
+            with self.server.lock:
+                self.server.sent_bytes += len(chunk)
+
+        last, last_write = None, 0.0
+        try:
+            while True:
+                if data != last:
+                    message = {"code": 0, "message": "", "data": data}
+                    chunk = f"data: {json.dumps(message)}\n\n".encode()
+                    last = data
+                elif time.monotonic() - last_write >= self.server.keep_alive_interval:
+                    chunk = b": keep-alive\n\n"
+                else:
+                    chunk = b""
+                if chunk:
+                    write(chunk)
+                    last_write = time.monotonic()
+
+                health = data["health"] or {}
+                if data["state"] == FAILED or data["status"] or (health.get("desc") or "").lower() == "ok":
+                    break
+                time.sleep(self.server.event_interval)
+                try:
+                    data = backend.instance_event(user, body)
+                except EmulatorError as e:
+                    # removed while it was watched
+                    message = {"code": e.code.value, "message": e.message, "data": None}
+                    write(f"data: {json.dumps(message)}\n\n".encode())
+                    break
+            # the last chunk
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+def serve(
+        host: str = "127.0.0.1",
+        port: int = 0,
+        root: Optional[str] = None,
+        latency: float = 0.0,
+        bandwidth: Optional[float] = None,
+        faults: Iterable[Fault] = (),
+        seed: Optional[int] = None,
+        verbose: bool = False,
+        **options: Any,
+) -> EmulatorServer:
+    """
+    Start an emulator in a background thread, stop it with `shutdown()` then `server_close()`.
+
+    Args:
+        host: Address to listen on.
+        port: Port to listen on, by default a free one, see `url`.
+        root: Folder for the uploaded files, by default a temporary one removed by `server_close()`.
+        latency, bandwidth, faults, seed, verbose: See `EmulatorServer`.
+        options: Passed to `Backend`, e.g. `stage_seconds=0` for instances that run at once.
+    """
+    server = EmulatorServer(
+        (host, port),
+        Backend(root or tempfile.mkdtemp(prefix="funix-cloud-emulator-"), **options),
+        latency,
+        bandwidth,
+        faults,
+        seed,
+        verbose=verbose,
+        remove_root=root is None,
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,654 @@
+"""
+Accounts, files and instances of the emulator, without any HTTP: every route is a method taking
+the token and the request, returning the `data` of the response or raising `EmulatorError`.
+"""
+import datetime
+import hashlib
+import os
+import re
+import secrets
+import shutil
+import threading
+import time
+import zipfile
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Callable, Optional
+
+from funix_cloud.api import ErrorCodes, Routes
+from funix_cloud.util import check_password, check_username
+from funix_cloud.util.delta import apply_delta
+
+# stages an instance goes through before it is running, `stage_seconds` each
+STAGES = (100, 101, 102, 103, 104)
+RUNNING = 200
+PAUSED = 201
+FAILED = 400
+
+NAME = re.compile(r"^[A-Za-z0-9-]+$")
+MAX_NAME_LENGTH = 128
+# the project name a requirement line starts with, as pip reads it
+REQUIREMENT = re.compile(r"^\s*([A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?)")
+COPY_BUFFER = 1024 * 1024
+
+
+class EmulatorError(Exception):
+    def __init__(self, code: ErrorCodes, message: str = ""):
+        super().__init__(message or code.name)
+        self.code = code
+        self.message = message or code.name
+
+
+@dataclass
+class User:
+    id: int
+    username: str
+    password: str
+    email: Optional[str] = None
+    secret_2fa: Optional[str] = None
+
+
+@dataclass
+class StoredFile:
+    path: str
+    size: int
+    created: float
+
+
+@dataclass
+class UploadSession:
+    upload_id: str
+    user_id: int
+    size: int
+    sha256: str
+    parts: dict[int, dict]
+    folder: str
+    received: set[int] = field(default_factory=set)
+
+
+@dataclass
+class Instance:
+    id: int
+    user_id: int
+    name: str
+    entry_point: str
+    source: dict
+    created: datetime.datetime
+    # clock time the current run started, it is moved on restore
+    started: float
+    failure: Optional[ErrorCodes] = None
+    paused: bool = False
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(COPY_BUFFER):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _copy_to(body: BinaryIO, path: str) -> tuple[int, str]:
+    """
+    Write `body` to `path`, returning its size and sha256.
+    """
+    size = 0
+    digest = hashlib.sha256()
+    with open(path, "wb") as f:
+        while block := body.read(COPY_BUFFER):
+            digest.update(block)
+            f.write(block)
+            size += len(block)
+    return size, digest.hexdigest()
+
+
+def _lists_funix(requirements: str) -> bool:
+    for line in requirements.splitlines():
+        if line.lstrip().startswith(("#", "-")):
+            continue
+        match = REQUIREMENT.match(line)
+        if match and re.sub(r"[-_.]+", "-", match.group(1)).lower() == "funix":
+            return True
+    return False
+
+
+def _check_archive(path: str, entry_point: str) -> Optional[ErrorCodes]:
+    """
+    What the build would fail with for this archive, None if it would deploy.
+    """
+    try:
+        with zipfile.ZipFile(path) as archive:
+            names = set(archive.namelist())
+            if any(name.startswith(".git/") for name in names):
+                return ErrorCodes.GitFolderNotAllowed
+            if any(name.startswith((".ebextensions/", ".platform/")) for name in names):
+                return ErrorCodes.SpecialFoldersNotAllowed
+            if "requirements.txt" not in names:
+                return ErrorCodes.RequirementsTxtNotFound
+            if not _lists_funix(archive.read("requirements.txt").decode(errors="replace")):
+                return ErrorCodes.NoFunixInRequirementsTxt
+            if entry_point not in names:
+                return ErrorCodes.FileNotFound
+    except zipfile.BadZipFile:
+        return ErrorCodes.FileNotFound
+    return None
+
+
+class Backend:
+    """
+    The state of the emulator, kept in memory, file contents under `root`.
+
+    Args:
+        root: Folder for uploaded archives, blobs and upload parts.
+        stage_seconds: Time a new instance spends in each stage of `STAGES`, 0 makes it run at once.
+        health_seconds: Time a running instance reports as starting before its health is ok.
+        pause_after: Pause instances that have been running this long, None never pauses them.
+        file_ttl: Seconds an uploaded `file_id` can be used, the real server cleans files after 30 minutes.
+        max_instances: Instances per account.
+        max_file_size: Largest upload in bytes, None for no limit.
+        clock: Monotonic time source, tests can move time forward with their own.
+    """
+
+    def __init__(
+            self,
+            root: str,
+            stage_seconds: float = 1.0,
+            health_seconds: float = 1.0,
+            pause_after: Optional[float] = None,
+            file_ttl: float = 30 * 60,
+            max_instances: int = 10,
+            max_file_size: Optional[int] = None,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.root = root
+        self.stage_seconds = stage_seconds
+        self.health_seconds = health_seconds
+        self.pause_after = pause_after
+        self.file_ttl = file_ttl
+        self.max_instances = max_instances
+        self.max_file_size = max_file_size
+        self.clock = clock
+        self.lock = threading.RLock()
+        # password reset codes and the like, which the real server sends by email
+        self.outbox: list[dict] = []
+        self.reset()
+
+    def reset(self):
+        """
+        Forget every account, file and instance.
+        """
+        with self.lock:
+            for folder in ("files", "blobs", "parts"):
+                shutil.rmtree(os.path.join(self.root, folder), ignore_errors=True)
+                os.makedirs(os.path.join(self.root, folder))
+            self.users: dict[str, User] = {}
+            self.tokens: dict[str, User] = {}
+            self.files: dict[str, StoredFile] = {}
+            self.blobs: set[str] = set()
+            self.sessions: dict[str, UploadSession] = {}
+            self.tickets: dict[str, dict] = {}
+            self.instances: dict[int, Instance] = {}
+            self.next_user_id = 1
+            self.next_instance_id = 1
+            self.outbox.clear()
+
+    # Accounts
+
+    def add_user(self, username: str, password: str, token: Optional[str] = None, email: Optional[str] = None) -> str:
+        """
+        Create an account without the checks of `/user/register`, returns a token of it.
+        """
+        with self.lock:
+            user = User(self.next_user_id, username, password, email)
+            self.next_user_id += 1
+            self.users[username] = user
+            return self._issue_token(user, token)
+
+    def _issue_token(self, user: User, token: Optional[str] = None) -> str:
+        token = token or secrets.token_urlsafe(24)
+        self.tokens[token] = user
+        return token
+
+    def authenticate(self, token: Optional[str]) -> User:
+        user = self.tokens.get(token or "")
+        if user is None:
+            raise EmulatorError(ErrorCodes.NoAccessPermission, "Invalid or missing token")
+        return user
+
+    def login(self, body: dict) -> dict:
+        with self.lock:
+            user = self.users.get(body.get("username") or "")
+            if user is None or user.password != body.get("password"):
+                raise EmulatorError(ErrorCodes.IncorrectPassword)
+            return {"token": self._issue_token(user)}
+
+    def register(self, body: dict) -> dict:
+        username, password = body.get("username") or "", body.get("password") or ""
+        if not check_username(username):
+            raise EmulatorError(ErrorCodes.InvalidUsername)
+        if not check_password(password):
+            raise EmulatorError(ErrorCodes.InvalidPassword)
+        with self.lock:
+            if username in self.users:
+                raise EmulatorError(ErrorCodes.UsernameAlreadyExists)
+            return {"token": self.add_user(username, password)}
+
+    def bind_email(self, user: User, body: dict) -> None:
+        email = body.get("email") or ""
+        if "@" not in email:
+            raise EmulatorError(ErrorCodes.InvalidArguments, "Invalid email")
+        user.email = email
+        self.outbox.append({"to": email, "subject": "verify", "username": user.username})
+
+    def me(self, user: User) -> dict:
+        return {"id": user.id, "username": user.username, "email": user.email, "has_2fa": user.secret_2fa is not None}
+
+    def two_fa_request(self, user: User) -> dict:
+        if user.secret_2fa is not None:
+            raise EmulatorError(ErrorCodes.AlreadyHas2FA)
+        ticket = secrets.token_hex(16)
+        secret = "".join(secrets.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ234567") for _ in range(32))
+        with self.lock:
+            self.tickets[ticket] = {"user": user.id, "secret": secret}
+        return {
+            "ticket": ticket,
+            "otpauth": f"otpauth://totp/Funix%20Cloud:{user.username}?secret={secret}&issuer=Funix%20Cloud",
+        }
+
+    def two_fa_bind(self, user: User, body: dict) -> None:
+        with self.lock:
+            ticket = self.tickets.get(body.get("ticket") or "")
+            if ticket is None or ticket["user"] != user.id or "secret" not in ticket:
+                raise EmulatorError(ErrorCodes.InvalidBindingTicket)
+            # any 6 digits are accepted, the emulator does not compute TOTP codes
+            if not re.fullmatch(r"\d{6}", str(body.get("code") or "")):
+                raise EmulatorError(ErrorCodes.InvalidBindingCode)
+            user.secret_2fa = self.tickets.pop(body["ticket"])["secret"]
+
+    def change_password(self, user: User, body: dict) -> None:
+        old, new = body.get("old_password"), body.get("new_password") or ""
+        if old != user.password:
+            raise EmulatorError(ErrorCodes.IncorrectPassword)
+        if new == old:
+            raise EmulatorError(ErrorCodes.SamePassword)
+        if not check_password(new):
+            raise EmulatorError(ErrorCodes.InvalidPassword)
+        user.password = new
+
+    def forget_password(self, body: dict) -> dict:
+        with self.lock:
+            user = self.users.get(body.get("username") or "")
+            if user is None or not user.email or user.email != body.get("email"):
+                raise EmulatorError(ErrorCodes.MismatchedEmail)
+            ticket, code = secrets.token_hex(16), f"{secrets.randbelow(10 ** 6):06d}"
+            self.tickets[ticket] = {"user": user.id, "code": code}
+            self.outbox.append({"to": user.email, "subject": "reset", "username": user.username, "code": code})
+            return {"ticket": ticket}
+
+    def reset_password(self, body: dict) -> None:
+        with self.lock:
+            ticket = self.tickets.get(body.get("ticket") or "")
+            if ticket is None or "code" not in ticket:
+                raise EmulatorError(ErrorCodes.InvalidBindingTicket)
+            if f"{int(body.get('code') or 0):06d}" != ticket["code"]:
+                raise EmulatorError(ErrorCodes.InvalidBindingCode)
+            password = body.get("password") or ""
+            if not check_password(password):
+                raise EmulatorError(ErrorCodes.InvalidPassword)
+            user = next(u for u in self.users.values() if u.id == ticket["user"])
+            user.password = password
+            del self.tickets[body["ticket"]]
+
+    # Files
+
+    def _store_file(self, path: str, size: int) -> dict:
+        if self.max_file_size is not None and size > self.max_file_size:
+            os.remove(path)
+            raise EmulatorError(ErrorCodes.FileTooLarge)
+        file_id = secrets.token_hex(16)
+        stored = os.path.join(self.root, "files", file_id + ".zip")
+        os.replace(path, stored)
+        with self.lock:
+            self.files[file_id] = StoredFile(stored, size, self.clock())
+        return {"file_id": file_id}
+
+    def _file(self, file_id: Optional[str]) -> StoredFile:
+        with self.lock:
+            stored = self.files.get(file_id or "")
+            if stored is not None and self.clock() - stored.created > self.file_ttl:
+                del self.files[file_id]
+                os.remove(stored.path)
+                stored = None
+        if stored is None:
+            raise EmulatorError(ErrorCodes.FileIsCleaned)
+        return stored
+
+    def upload(self, content_type: str, body: BinaryIO) -> dict:
+        match = re.search(r"boundary=\"?([^\";]+)\"?", content_type or "")
+        if not content_type.startswith("multipart/form-data") or match is None:
+            raise EmulatorError(ErrorCodes.BodyNoMultiPart)
+        boundary = match.group(1).encode()
+
+        # skip the part headers, the file runs up to the closing boundary
+        head = body.read(64 * 1024)
+        start = head.find(b"\r\n\r\n")
+        if not head.startswith(b"--" + boundary) or start < 0:
+            raise EmulatorError(ErrorCodes.BodyNoMultiPart)
+        tail = b"\r\n--" + boundary + b"--\r\n"
+        path = os.path.join(self.root, "files", "upload-" + secrets.token_hex(8))
+        with open(path, "wb") as f:
+            f.write(head[start + 4:])
+            shutil.copyfileobj(body, f, COPY_BUFFER)
+            size = f.tell() - len(tail)
+            f.truncate(max(size, 0))
+        return self._store_file(path, max(size, 0))
+
+    def upload_session(self, user: User, body: dict) -> dict:
+        with self.lock:
+            session = self.sessions.get(body.get("upload_id") or "")
+            if session is not None and session.user_id == user.id and session.sha256 == body.get("sha256"):
+                return {"upload_id": session.upload_id, "received": sorted(session.received)}
+            try:
+                parts = {int(part["index"]): part for part in body["parts"]}
+                session = UploadSession(
+                    secrets.token_hex(16), user.id, int(body["size"]), body["sha256"], parts, "",
+                )
+            except (KeyError, TypeError, ValueError):
+                raise EmulatorError(ErrorCodes.InvalidArguments, "Invalid upload manifest")
+            if self.max_file_size is not None and session.size > self.max_file_size:
+                raise EmulatorError(ErrorCodes.FileTooLarge)
+            session.folder = os.path.join(self.root, "parts", session.upload_id)
+            os.makedirs(session.folder)
+            self.sessions[session.upload_id] = session
+            return {"upload_id": session.upload_id, "received": []}
+
+    def _session(self, user: User, upload_id: Optional[str]) -> UploadSession:
+        session = self.sessions.get(upload_id or "")
+        if session is None or session.user_id != user.id:
+            raise EmulatorError(ErrorCodes.InvalidArguments, "Unknown upload_id")
+        return session
+
+    def upload_part(self, user: User, params: dict, body: BinaryIO) -> None:
+        session = self._session(user, params.get("upload_id"))
+        index = int(params.get("index", -1))
+        if index not in session.parts:
+            raise EmulatorError(ErrorCodes.InvalidArguments, f"Unknown part {index}")
+        path = os.path.join(session.folder, str(index))
+        size, sha256 = _copy_to(body, path + ".tmp")
+        if sha256 != params.get("sha256") or sha256 != session.parts[index]["sha256"]:
+            os.remove(path + ".tmp")
+            raise EmulatorError(ErrorCodes.InvalidArguments, f"Checksum mismatch of part {index}")
+        os.replace(path + ".tmp", path)
+        with self.lock:
+            session.received.add(index)
+
+    def upload_complete(self, user: User, body: dict) -> dict:
+        session = self._session(user, body.get("upload_id"))
+        missing = sorted(set(session.parts) - session.received)
+        if missing:
+            raise EmulatorError(ErrorCodes.InvalidArguments, f"Missing parts {missing}")
+        path = os.path.join(session.folder, "archive")
+        with open(path, "wb") as out:
+            for index in sorted(session.parts):
+                with open(os.path.join(session.folder, str(index)), "rb") as part:
+                    shutil.copyfileobj(part, out, COPY_BUFFER)
+        if _sha256_file(path) != session.sha256:
+            raise EmulatorError(ErrorCodes.InvalidArguments, "Checksum mismatch of the archive")
+        result = self._store_file(path, session.size)
+        with self.lock:
+            del self.sessions[session.upload_id]
+        shutil.rmtree(session.folder, ignore_errors=True)
+        return result
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self.root, "blobs", sha256)
+
+    def manifest_check(self, body: dict) -> dict:
+        files = body.get("files") or []
+        with self.lock:
+            missing = sorted({entry["sha256"] for entry in files} - self.blobs)
+        return {"missing": missing}
+
+    def _add_blob(self, sha256: Optional[str], write: Callable[[BinaryIO], None]) -> None:
+        if not sha256:
+            raise EmulatorError(ErrorCodes.InvalidArguments, "Missing sha256")
+        tmp = self._blob_path(sha256) + "." + secrets.token_hex(4)
+        with open(tmp, "wb") as f:
+            write(f)
+        if _sha256_file(tmp) != sha256:
+            os.remove(tmp)
+            raise EmulatorError(ErrorCodes.InvalidArguments, f"Checksum mismatch of blob {sha256}")
+        os.replace(tmp, self._blob_path(sha256))
+        with self.lock:
+            self.blobs.add(sha256)
+
+    def manifest_blob(self, params: dict, body: BinaryIO) -> None:
+        self._add_blob(params.get("sha256"), lambda f: shutil.copyfileobj(body, f, COPY_BUFFER))
+
+    def manifest_delta(self, params: dict, body: BinaryIO) -> None:
+        base = params.get("base") or ""
+        if base not in self.blobs:
+            raise EmulatorError(ErrorCodes.InvalidArguments, f"Unknown base blob {base}")
+
+        def write(f: BinaryIO):
+            with open(self._blob_path(base), "rb") as base_file:
+                try:
+                    apply_delta(base_file, body, f)
+                except ValueError as e:
+                    raise EmulatorError(ErrorCodes.InvalidArguments, str(e))
+
+        self._add_blob(params.get("sha256"), write)
+
+    def manifest_commit(self, body: dict) -> dict:
+        files = body.get("files") or []
+        missing = sorted({entry["sha256"] for entry in files} - self.blobs)
+        if missing:
+            raise EmulatorError(ErrorCodes.InvalidArguments, f"Missing blobs {missing}")
+        path = os.path.join(self.root, "files", "commit-" + secrets.token_hex(8))
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+            for entry in files:
+                info = zipfile.ZipInfo(entry["path"])
+                info.external_attr = (entry.get("mode") or 0o644) << 16
+                with open(self._blob_path(entry["sha256"]), "rb") as src, archive.open(info, "w") as dst:
+                    shutil.copyfileobj(src, dst, COPY_BUFFER)
+        return self._store_file(path, os.path.getsize(path))
+
+    # Instances
+
+    def create_instance(self, user: User, body: dict, git: bool) -> dict:
+        name, entry_point = body.get("name") or "", body.get("entry_point") or "main.py"
+        if not NAME.match(name):
+            raise EmulatorError(ErrorCodes.IllegalString, "Invalid instance name")
+        if len(name) > MAX_NAME_LENGTH or len(entry_point) > MAX_NAME_LENGTH:
+            raise EmulatorError(ErrorCodes.ArgumentTooLong)
+
+        failure = None
+        if git:
+            repo_link = body.get("repo_link") or ""
+            if not repo_link.startswith(("https://", "http://", "git@")):
+                raise EmulatorError(ErrorCodes.CannotCloneGitRepo)
+            source = {"repo_link": repo_link}
+        else:
+            stored = self._file(body.get("file_id"))
+            failure = _check_archive(stored.path, entry_point)
+            source = {"file_id": body["file_id"]}
+
+        with self.lock:
+            owned = [i for i in self.instances.values() if i.user_id == user.id]
+            if any(i.name == name for i in owned):
+                raise EmulatorError(ErrorCodes.DuplicationName)
+            if len(owned) >= self.max_instances:
+                raise EmulatorError(ErrorCodes.InstancesTooMany)
+            instance = Instance(
+                self.next_instance_id, user.id, name, entry_point, source,
+                datetime.datetime.now(datetime.timezone.utc), self.clock(), failure,
+            )
+            self.next_instance_id += 1
+            self.instances[instance.id] = instance
+        return {"application_name": name, "instance_id": instance.id}
+
+    def add_instance(self, user: str, name: str, running: bool = True) -> int:
+        """
+        Create an instance of the account `user` without uploading anything, running at once by default.
+        """
+        with self.lock:
+            owner = self.users[user]
+            instance = Instance(
+                self.next_instance_id, owner.id, name, "main.py", {},
+                datetime.datetime.now(datetime.timezone.utc), self.clock(),
+            )
+            if running:
+                instance.started -= len(STAGES) * self.stage_seconds + self.health_seconds
+            self.next_instance_id += 1
+            self.instances[instance.id] = instance
+            return instance.id
+
+    def _instance(self, user: User, body: dict) -> Instance:
+        try:
+            instance = self.instances.get(int(body.get("id")))
+        except (TypeError, ValueError):
+            raise EmulatorError(ErrorCodes.InvalidArguments, "Invalid instance id")
+        if instance is None or instance.user_id != user.id:
+            raise EmulatorError(ErrorCodes.InstanceNotFound)
+        return instance
+
+    def _state(self, instance: Instance) -> tuple[int, int]:
+        """
+        The stage and error code of `instance` right now.
+        """
+        if instance.paused:
+            return PAUSED, 0
+        elapsed = self.clock() - instance.started
+        index = int(elapsed / self.stage_seconds) if self.stage_seconds > 0 else len(STAGES)
+        # the archive is checked in Preprocess
+        if instance.failure is not None and index >= 1:
+            return FAILED, instance.failure.value
+        if index < len(STAGES):
+            return STAGES[index], 0
+        running = elapsed - len(STAGES) * self.stage_seconds
+        if self.pause_after is not None and running >= self.pause_after:
+            instance.paused = True
+            return PAUSED, 0
+        return RUNNING, 0
+
+    def _health(self, instance: Instance) -> dict:
+        running = self.clock() - instance.started - len(STAGES) * max(self.stage_seconds, 0)
+        if running < self.health_seconds:
+            return {"desc": "Starting", "color": "Yellow", "causes": ["The application is starting"]}
+        return {"desc": "Ok", "color": "Green", "causes": []}
+
+    def _describe(self, instance: Instance) -> dict:
+        state, status = self._state(instance)
+        return {
+            "id": instance.id,
+            "name": instance.name,
+            "application_name": instance.name,
+            "entry_point": instance.entry_point,
+            "state": state,
+            "status": status,
+            "start_time": instance.created.isoformat().replace("+00:00", "Z"),
+            **instance.source,
+        }
+
+    def query_instance(self, user: User, body: dict) -> dict:
+        with self.lock:
+            return self._describe(self._instance(user, body))
+
+    def query_all_instance(self, user: User) -> list[dict]:
+        with self.lock:
+            return [self._describe(i) for i in self.instances.values() if i.user_id == user.id]
+
+    def query_instance_health(self, user: User, body: dict) -> dict:
+        with self.lock:
+            instance = self._instance(user, body)
+            if self._state(instance)[0] != RUNNING:
+                raise EmulatorError(ErrorCodes.InstanceNotPrepared)
+            return self._health(instance)
+
+    def instance_event(self, user: User, body: dict) -> dict:
+        """
+        The data of one `/instance/events` event: state, status, and health once running.
+        """
+        with self.lock:
+            instance = self._instance(user, body)
+            data = {"state": None, "status": None, "health": None}
+            data["state"], data["status"] = self._state(instance)
+            if data["state"] == RUNNING:
+                data["health"] = self._health(instance)
+            return data
+
+    def pause_instance(self, instance_id: int):
+        with self.lock:
+            self.instances[instance_id].paused = True
+
+    def restore_instance(self, user: User, body: dict) -> None:
+        with self.lock:
+            instance = self._instance(user, body)
+            if self._state(instance)[0] != PAUSED:
+                raise EmulatorError(ErrorCodes.InstanceNotPaused)
+            # a restored instance is deployed again, its archive was already prepared
+            instance.paused = False
+            instance.started = self.clock() - (len(STAGES) - 1) * self.stage_seconds
+
+    def remove_instance(self, user: User, body: dict) -> None:
+        with self.lock:
+            del self.instances[self._instance(user, body).id]
+
+    def handle(self, route: str, token: Optional[str], body: Any, params: dict, content_type: str,
+               stream: BinaryIO) -> Any:
+        """
+        The `data` of the response of `route`. `body` is the decoded JSON body, `stream` the raw one
+        for the routes that receive files.
+        """
+        match route:
+            case Routes.login:
+                return self.login(body)
+            case Routes.register:
+                return self.register(body)
+            case Routes.forget_password:
+                return self.forget_password(body)
+            case Routes.reset_password:
+                return self.reset_password(body)
+
+        user = self.authenticate(token)
+        match route:
+            case Routes.change_email:
+                return self.bind_email(user, body)
+            case Routes.me:
+                return self.me(user)
+            case Routes.two_fa_request:
+                return self.two_fa_request(user)
+            case Routes.two_fa_bind:
+                return self.two_fa_bind(user, body)
+            case Routes.change_password:
+                return self.change_password(user, body)
+            case Routes.upload:
+                return self.upload(content_type, stream)
+            case Routes.upload_session:
+                return self.upload_session(user, body)
+            case Routes.upload_part:
+                return self.upload_part(user, params, stream)
+            case Routes.upload_complete:
+                return self.upload_complete(user, body)
+            case Routes.manifest_check:
+                return self.manifest_check(body)
+            case Routes.manifest_blob:
+                return self.manifest_blob(params, stream)
+            case Routes.manifest_delta:
+                return self.manifest_delta(params, stream)
+            case Routes.manifest_commit:
+                return self.manifest_commit(body)
+            case Routes.deploy_git:
+                return self.create_instance(user, body, git=True)
+            case Routes.deploy_zip:
+                return self.create_instance(user, body, git=False)
+            case Routes.query_instance:
+                return self.query_instance(user, body)
+            case Routes.query_instance_health:
+                return self.query_instance_health(user, body)
+            case Routes.query_all_instance:
+                return self.query_all_instance(user)
+            case Routes.restore_instance:
+                return self.restore_instance(user, body)
+            case Routes.remove_instance:
+                return self.remove_instance(user, body)
+        raise KeyError(route)
@@ -0,0 +1,324 @@
+"""
+Timing history of deploys, in a SQLite database of the profile's config folder.
+
+Every deploy stores its local phases (scanning the project, compressing, uploading, creating the
+instance) and the server stages it went through, as seen by the client, with the size of what was
+uploaded. `funix-cloud stats` reads them back.
+"""
+import datetime
+import os
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+
+from funix_cloud.api import instance_stage_from_int
+
+if TYPE_CHECKING:
+    from funix_cloud.api.watcher import StatusEvent
+
+SCHEMA_VERSION = 1
+MAX_DEPLOYS = 5000
+# phases in the order of a deploy, `stream` is compress and upload at the same time
+LOCAL_PHASES = ("scan", "preflight", "incremental", "compress", "stream", "upload", "create")
+STAGE_PHASES = tuple(instance_stage_from_int(code) for code in (100, 101, 102, 103, 104, 200))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deploys (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    app_name TEXT NOT NULL,
+    instance_id INTEGER,
+    source TEXT,
+    method TEXT,
+    artifact_bytes INTEGER,
+    file_count INTEGER,
+    uploaded_bytes INTEGER,
+    outcome TEXT NOT NULL,
+    error_code INTEGER,
+    total_seconds REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS phases (
+    deploy_id INTEGER NOT NULL REFERENCES deploys (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (deploy_id, position)
+);
+CREATE INDEX IF NOT EXISTS deploys_started ON deploys (started);
+CREATE INDEX IF NOT EXISTS deploys_app ON deploys (app_name, started);
+CREATE INDEX IF NOT EXISTS phases_name ON phases (name, deploy_id);
+"""
+
+
+@dataclass
+class DeployRecord:
+    """
+    Timings of one deploy as it goes, saved to `history` by `finish`. Without a history nothing is saved,
+    so code paths shared with other commands can time their work unconditionally.
+    """
+    app_name: str = ""
+    history: Optional["DeployHistory"] = None
+    started: float = field(default_factory=time.time)
+    instance_id: Optional[int] = None
+    # folder, file, zip or git
+    source: Optional[str] = None
+    # how the code was sent: archive, stream, incremental, cached (zip of the build cache), reused (uploaded
+    # archive) or shared (with another app of `run`)
+    method: Optional[str] = None
+    artifact_bytes: Optional[int] = None
+    file_count: Optional[int] = None
+    uploaded_bytes: int = 0
+    # (kind, name, seconds), kind is "local" or "stage"
+    phases: list[tuple[str, str, float]] = field(default_factory=list)
+    finished: bool = False
+    _stage: Optional[str] = None
+    _stage_start: float = 0.0
+
+    def __enter__(self) -> "DeployRecord":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None and issubclass(exc_type, (KeyboardInterrupt, EOFError)):
+            self.finish("interrupted")
+        elif exc_type is not None:
+            self.finish("error")
+
+    def add(self, kind: str, name: str, seconds: float):
+        for i, (phase_kind, phase_name, total) in enumerate(self.phases):
+            if (phase_kind, phase_name) == (kind, name):
+                self.phases[i] = (kind, name, total + seconds)
+                return
+        self.phases.append((kind, name, seconds))
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Time the block as the local phase `name`, repeated phases add up.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add("local", name, time.perf_counter() - start)
+
+    def count(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Pass `chunks` through, adding their size to the artifact size.
+        """
+        self.artifact_bytes = self.artifact_bytes or 0
+        for chunk in chunks:
+            self.artifact_bytes += len(chunk)
+            yield chunk
+
+    def _end_stage(self, now: float):
+        if self._stage is not None:
+            self.add("stage", self._stage, now - self._stage_start)
+            self._stage = None
+
+    def on_event(self, event: "StatusEvent"):
+        """
+        Follow the status events of the instance, the time of a stage runs from its event to the next
+        one, `Success` lasts until the health is ok. The record is saved once the deploy is over.
+        """
+        now = time.time()
+        match event.kind:
+            case "stage":
+                self._end_stage(now)
+                # paused and failed instances are not going anywhere
+                if event.stage not in (201, 400):
+                    self._stage, self._stage_start = instance_stage_from_int(event.stage), now
+            case "success":
+                self._end_stage(now)
+                self.finish("success")
+            case "failed":
+                self._end_stage(now)
+                self.finish("failed", event.errcode)
+            case "timeout":
+                self._end_stage(now)
+                self.finish("timeout")
+
+    def discard(self):
+        """
+        Never save the record, e.g. for a deploy that starts again with a new one.
+        """
+        self.finished = True
+
+    def finish(self, outcome: str, error_code: Optional[int] = None):
+        """
+        Save the record, once. `outcome` is success, failed, timeout, error (before the instance was
+        created) or interrupted.
+        """
+        if self.finished:
+            return
+        self.finished = True
+        self._end_stage(time.time())
+        if self.history is not None:
+            self.history.save(self, outcome, error_code, time.time() - self.started)
+
+
+class DeployHistory:
+    """
+    The deploys of one profile, newest `MAX_DEPLOYS` kept. Writes never raise: a locked or broken
+    database loses a record, not a deploy.
+    """
+
+    def __init__(self, path: str, max_deploys: int = MAX_DEPLOYS):
+        self.path = path
+        self.max_deploys = max_deploys
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA foreign_keys = ON")
+        if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # several CLI processes can write at the same time
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(SCHEMA)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        return conn
+
+    def record(self, app_name: str) -> DeployRecord:
+        return DeployRecord(app_name, self)
+
+    def save(self, record: DeployRecord, outcome: str, error_code: Optional[int], total_seconds: float):
+        try:
+            with closing(self._connect()) as conn, conn:
+                cursor = conn.execute(
+                    "INSERT INTO deploys (started, app_name, instance_id, source, method, artifact_bytes, "
+                    "file_count, uploaded_bytes, outcome, error_code, total_seconds) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (record.started, record.app_name, record.instance_id, record.source, record.method,
+                     record.artifact_bytes, record.file_count, record.uploaded_bytes, outcome, error_code,
+                     total_seconds),
+                )
+                conn.executemany(
+                    "INSERT INTO phases (deploy_id, position, kind, name, seconds) VALUES (?, ?, ?, ?, ?)",
+                    [(cursor.lastrowid, i, kind, name, seconds) for i, (kind, name, seconds) in enumerate(record.phases)],
+                )
+                conn.execute(
+                    "DELETE FROM deploys WHERE id <= (SELECT id FROM deploys ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (self.max_deploys,),
+                )
+        except sqlite3.Error:
+            pass
+
+    def deploys(self, since: float = 0.0, app_name: Optional[str] = None) -> list[dict]:
+        """
+        The deploys started after `since`, oldest first, each with its `phases` as a name to seconds dict.
+        """
+        if not os.path.exists(self.path):
+            return []
+        with closing(self._connect()) as conn:
+            conn.row_factory = sqlite3.Row
+            query = "SELECT * FROM deploys WHERE started >= ?"
+            args: list = [since]
+            if app_name:
+                query += " AND app_name = ?"
+                args.append(app_name)
+            deploys = {row["id"]: dict(row, phases={}) for row in conn.execute(query + " ORDER BY started", args)}
+            if deploys:
+                rows = conn.execute(
+                    "SELECT deploy_id, name, seconds FROM phases WHERE deploy_id IN "
+                    "(SELECT id FROM deploys WHERE started >= ?) ORDER BY deploy_id, position",
+                    (since,),
+                )
+                for deploy_id, name, seconds in rows:
+                    if deploy_id in deploys:
+                        deploys[deploy_id]["phases"][name] = seconds
+        return list(deploys.values())
+
+
+def percentile(values: list[float], p: float) -> Optional[float]:
+    """
+    The `p` percentile (0 to 100) of `values`, interpolated between the closest ranks, None without values.
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    rank = (len(values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def phase_order(names: Iterable[str]) -> list[str]:
+    """
+    Phase names in the order of a deploy, unknown ones last.
+    """
+    known = LOCAL_PHASES + STAGE_PHASES
+    return sorted(set(names), key=lambda name: (known.index(name) if name in known else len(known), name))
+
+
+def phase_stats(deploys: list[dict], recent: int = 10) -> list[dict]:
+    """
+    One row per phase, in the order of a deploy, then the `total` of the successful deploys: the number of
+    deploys it was seen in, the p50, p95 and max seconds, and the p50 of the last `recent` of them next to
+    the p50 of the ones before, with the relative `change`, to spot regressions.
+    """
+    series: dict[str, list[float]] = {}
+    for deploy in deploys:
+        for name, seconds in deploy["phases"].items():
+            series.setdefault(name, []).append(seconds)
+    rows = []
+    names = phase_order(series)
+    series["total"] = [deploy["total_seconds"] for deploy in deploys if deploy["outcome"] == "success"]
+    for name in names + ["total"]:
+        values = series[name]
+        if not values:
+            continue
+        latest, previous = values[-recent:], values[:-recent]
+        row = {
+            "phase": name,
+            "kind": "total" if name == "total" else "local" if name in LOCAL_PHASES else "stage",
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "max": max(values),
+            "recent_p50": percentile(latest, 50),
+            "previous_p50": percentile(previous, 50),
+            "change": None,
+        }
+        if row["previous_p50"]:
+            row["change"] = row["recent_p50"] / row["previous_p50"] - 1
+        rows.append(row)
+    return rows
+
+
+def trends(deploys: list[dict], by: str = "day") -> list[dict]:
+    """
+    One row per local day (`2024-06-10`) or ISO week (`2024-W24`) with deploys, oldest first: the number
+    of deploys and failed ones, p50 and p95 of the total seconds of the successful ones, the p50 of the
+    server stages (from `Start` to `Success`) and of the artifact size.
+    """
+    buckets: dict[str, list[dict]] = {}
+    for deploy in deploys:
+        started = datetime.datetime.fromtimestamp(deploy["started"])
+        if by == "week":
+            year, week, _ = started.isocalendar()
+            period = f"{year}-W{week:02d}"
+        else:
+            period = started.date().isoformat()
+        buckets.setdefault(period, []).append(deploy)
+
+    rows = []
+    for period, bucket in buckets.items():
+        succeeded = [deploy for deploy in bucket if deploy["outcome"] == "success"]
+        totals = [deploy["total_seconds"] for deploy in succeeded]
+        server = [
+            sum(seconds for name, seconds in deploy["phases"].items() if name in STAGE_PHASES)
+            for deploy in succeeded
+        ]
+        sizes = [deploy["artifact_bytes"] for deploy in bucket if deploy["artifact_bytes"] is not None]
+        rows.append({
+            "period": period,
+            "deploys": len(bucket),
+            "failed": len(bucket) - len(succeeded),
+            "p50": percentile(totals, 50),
+            "p95": percentile(totals, 95),
+            "server_p50": percentile(server, 50),
+            "artifact_bytes_p50": percentile(sizes, 50),
+        })
+    return rows
@@ -1,5 +1,8 @@
-import os
+import hashlib
 import zipfile
+from typing import BinaryIO, Iterable, Iterator
+
+from funix_cloud.util.ignore import walk
 
 
 def is_git_url(s: str | None) -> bool:
@@ -19,17 +22,35 @@ def is_git_url(s: str | None) -> bool:
     return False
 
 
+def sha256_file(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(1024 * 1024):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_chunks(chunks: Iterable[bytes], digest) -> Iterator[bytes]:
+    """
+    Pass `chunks` through while feeding them to the hashlib object `digest`.
+    """
+    for chunk in chunks:
+        digest.update(chunk)
+        yield chunk
+
+
+def tee(chunks: Iterable[bytes], fileobj: BinaryIO) -> Iterator[bytes]:
+    """
+    Pass `chunks` through while also writing them to `fileobj`.
+    """
+    for chunk in chunks:
+        fileobj.write(chunk)
+        yield chunk
+
+
 def zip_folder(path, zip_handler: zipfile.ZipFile):
-    for folder_name, sub_folders, filenames in os.walk(path):
-        for filename in filenames:
-            if filename in ["deploy.zip", ".DS_Store", ".gitignore"]:
-                continue
-            if filename.endswith(".pyc"):
-                continue
-            if folder_name in ["__pycache__", ".git", ".ebextensions"]:
-                continue
-            file_path = os.path.join(folder_name, filename)
-            zip_handler.write(file_path, arcname=os.path.relpath(file_path, path))
+    for file_path, arcname in walk(path):
+        zip_handler.write(file_path, arcname=arcname)
 
 
 def is_zip(path) -> bool:
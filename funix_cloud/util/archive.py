@@ -0,0 +1,237 @@
+import os
+import struct
+import tempfile
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from funix_cloud.util.compression import DEFLATED, CompressionPolicy
+
+READ_BLOCK_SIZE = 1024 * 1024
+SPOOL_SIZE = 8 * 1024 * 1024
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_FILECOUNT_LIMIT = 0xFFFF
+
+# Part of build cache keys, bump it when the same files produce a different archive
+ARCHIVE_VERSION = 2
+
+# Archives are reproducible: every member gets this timestamp and a normalized mode,
+# so the same files always give the same bytes (and the same upload hash)
+FIXED_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+DEFAULT_LEVEL = zlib.Z_DEFAULT_COMPRESSION
+
+
+@dataclass
+class ArchiveMember:
+    arcname: str
+    path: Optional[str] = None
+    data: Optional[bytes] = None
+    level: int = DEFAULT_LEVEL
+    method: int = DEFLATED
+    policy: Optional[CompressionPolicy] = None
+
+
+@dataclass
+class CompressedMember:
+    member: ArchiveMember
+    crc: int
+    file_size: int
+    compress_size: int
+    method: int
+    mode: int
+    date_time: tuple[int, int, int, int, int, int]
+    body: BinaryIO
+
+
+def _dos_date_time(date_time: tuple[int, int, int, int, int, int]) -> tuple[int, int]:
+    year, month, day, hour, minute, second = date_time
+    if year < 1980:
+        year, month, day, hour, minute, second = 1980, 1, 1, 0, 0, 0
+    dos_date = (year - 1980) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | second // 2
+    return dos_date, dos_time
+
+
+def compress_member(member: ArchiveMember) -> CompressedMember:
+    """
+    Compress one member into a spooled temporary file, runs on a worker thread.
+    """
+    method, level = member.method, member.level
+    if member.policy is not None:
+        size = os.path.getsize(member.path) if member.path is not None else len(member.data or b"")
+        method, level = member.policy.choose(member.path, size)
+
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15) if method == DEFLATED else None
+    crc = 0
+    file_size = 0
+
+    def feed(block: bytes):
+        nonlocal crc, file_size
+        crc = zlib.crc32(block, crc)
+        file_size += len(block)
+        body.write(compressor.compress(block) if compressor else block)
+
+    mode = 0o644
+    if member.path is not None:
+        if os.stat(member.path).st_mode & 0o111:
+            mode = 0o755
+        with open(member.path, "rb") as f:
+            while block := f.read(READ_BLOCK_SIZE):
+                feed(block)
+    else:
+        feed(member.data or b"")
+
+    if compressor:
+        body.write(compressor.flush())
+    compress_size = body.tell()
+    body.seek(0)
+    return CompressedMember(member, crc, file_size, compress_size, method, mode, FIXED_DATE_TIME, body)
+
+
+class _CentralRecord:
+    def __init__(self, compressed: CompressedMember, offset: int):
+        self.name = compressed.member.arcname.replace(os.sep, "/").encode("utf-8")
+        self.crc = compressed.crc
+        self.file_size = compressed.file_size
+        self.compress_size = compressed.compress_size
+        self.method = compressed.method
+        self.mode = compressed.mode
+        self.dos_date, self.dos_time = _dos_date_time(compressed.date_time)
+        self.offset = offset
+
+    @property
+    def flags(self) -> int:
+        # bit 11: the file name is encoded in UTF-8
+        return 0x800 if not self.name.isascii() else 0
+
+    def local_header(self) -> bytes:
+        zip64 = self.file_size >= ZIP64_LIMIT or self.compress_size >= ZIP64_LIMIT
+        extra = b""
+        file_size, compress_size = self.file_size, self.compress_size
+        if zip64:
+            extra = struct.pack("<HHQQ", 1, 16, self.file_size, self.compress_size)
+            file_size = compress_size = ZIP64_LIMIT
+        return struct.pack(
+            "<IHHHHHIIIHH",
+            0x04034B50,
+            45 if zip64 else 20,
+            self.flags,
+            self.method,
+            self.dos_time,
+            self.dos_date,
+            self.crc,
+            compress_size,
+            file_size,
+            len(self.name),
+            len(extra),
+        ) + self.name + extra
+
+    def central_header(self) -> bytes:
+        fields = []
+        file_size, compress_size, offset = self.file_size, self.compress_size, self.offset
+        if file_size >= ZIP64_LIMIT:
+            fields.append(file_size)
+            file_size = ZIP64_LIMIT
+        if compress_size >= ZIP64_LIMIT:
+            fields.append(compress_size)
+            compress_size = ZIP64_LIMIT
+        if offset >= ZIP64_LIMIT:
+            fields.append(offset)
+            offset = ZIP64_LIMIT
+        extra = struct.pack(f"<HH{len(fields)}Q", 1, 8 * len(fields), *fields) if fields else b""
+        version = 45 if fields else 20
+        return struct.pack(
+            "<IHHHHHHIIIHHHHHII",
+            0x02014B50,
+            3 << 8 | version,  # made by unix
+            version,
+            self.flags,
+            self.method,
+            self.dos_time,
+            self.dos_date,
+            self.crc,
+            compress_size,
+            file_size,
+            len(self.name),
+            len(extra),
+            0,
+            0,
+            0,
+            (0o100000 | self.mode) << 16,
+            offset,
+        ) + self.name + extra
+
+
+def _end_records(count: int, cd_offset: int, cd_size: int) -> bytes:
+    records = b""
+    if count >= ZIP_FILECOUNT_LIMIT or cd_offset >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+        zip64_end_offset = cd_offset + cd_size
+        records += struct.pack(
+            "<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, cd_size, cd_offset
+        )
+        records += struct.pack("<IIQI", 0x07064B50, 0, zip64_end_offset, 1)
+        count = min(count, ZIP_FILECOUNT_LIMIT)
+        cd_offset = min(cd_offset, ZIP64_LIMIT)
+        cd_size = min(cd_size, ZIP64_LIMIT)
+    records += struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, count, count, cd_size, cd_offset, 0)
+    return records
+
+
+def iter_zip(members: Iterable[ArchiveMember], workers: int = DEFAULT_WORKERS) -> Iterator[bytes]:
+    """
+    Produce a ZIP (ZIP64 when needed) archive of `members` as a stream of byte chunks.
+    The output only depends on the order, names, content and executable bit of `members`.
+
+    Members are compressed on a pool of `workers` threads (zlib releases the GIL), while
+    the archive is assembled in the order of `members`. At most `2 * workers` compressed
+    members wait in memory or spool files at any time, so the consumer of the stream
+    (e.g. an HTTP upload) overlaps with compression.
+    """
+    records: list[_CentralRecord] = []
+    offset = 0
+
+    def emit(compressed: CompressedMember) -> Iterator[bytes]:
+        nonlocal offset
+        record = _CentralRecord(compressed, offset)
+        records.append(record)
+        header = record.local_header()
+        offset += len(header) + compressed.compress_size
+        yield header
+        with compressed.body:
+            while chunk := compressed.body.read(READ_BLOCK_SIZE):
+                yield chunk
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        window: deque[Future[CompressedMember]] = deque()
+        for member in members:
+            window.append(executor.submit(compress_member, member))
+            if len(window) >= 2 * max(workers, 1):
+                yield from emit(window.popleft().result())
+        while window:
+            yield from emit(window.popleft().result())
+
+    cd_offset = offset
+    cd_size = 0
+    for record in records:
+        header = record.central_header()
+        cd_size += len(header)
+        yield header
+    yield _end_records(len(records), cd_offset, cd_size)
+
+
+def write_zip(members: Iterable[ArchiveMember], fileobj: BinaryIO, workers: int = DEFAULT_WORKERS):
+    for chunk in iter_zip(members, workers):
+        fileobj.write(chunk)
+
+
+def file_members(
+        files: Iterable[tuple[str, str]], policy: Optional[CompressionPolicy] = None
+) -> Iterator[ArchiveMember]:
+    for file_path, arcname in files:
+        yield ArchiveMember(arcname, path=file_path, policy=policy)
+
@@ -0,0 +1,119 @@
+import os
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+STORED = 0
+DEFLATED = 8
+
+# Formats that are already compressed, deflating them again costs CPU for no size gain
+INCOMPRESSIBLE_SUFFIXES = {
+    ".7z", ".avif", ".br", ".bz2", ".gif", ".gz", ".heic", ".jar", ".jpeg", ".jpg", ".lz4",
+    ".m4a", ".mkv", ".mov", ".mp3", ".mp4", ".npz", ".ogg", ".onnx", ".parquet", ".pdf",
+    ".png", ".rar", ".safetensors", ".tgz", ".webm", ".webp", ".whl", ".woff", ".woff2",
+    ".xz", ".zip", ".zst",
+}
+
+SAMPLE_SIZE = 64 * 1024
+
+
+@dataclass
+class CompressionPolicy:
+    """
+    Decide how each archive member is compressed.
+
+    - Files with a suffix in `store_suffixes` are stored.
+    - Otherwise the level comes from `levels`, a list of `(max_size, level)` sorted by size,
+      the first tier whose `max_size` is at least the file size wins, `None` means no limit.
+    - With `sample`, files of at least `sample_min_size` bytes are stored when their first
+      `SAMPLE_SIZE` bytes deflate to more than `sample_ratio` of their size.
+    """
+    name: str
+    levels: list[tuple[Optional[int], int]]
+    store_suffixes: set[str] = field(default_factory=set)
+    sample: bool = False
+    sample_min_size: int = 1024 * 1024
+    sample_ratio: float = 0.9
+
+    def key(self) -> str:
+        """
+        A stable description of the policy, for cache keys.
+        """
+        return (
+            f"{self.name}|{self.levels}|{sorted(self.store_suffixes)}|"
+            f"{self.sample}|{self.sample_min_size}|{self.sample_ratio}"
+        )
+
+    def choose(self, path: Optional[str], size: int) -> tuple[int, int]:
+        """
+        :return: `(method, level)` for the file at `path` of `size` bytes.
+        """
+        if path is not None and os.path.splitext(path)[1].lower() in self.store_suffixes:
+            return STORED, 0
+
+        level = next(
+            (level for max_size, level in self.levels if max_size is None or size <= max_size),
+            zlib.Z_DEFAULT_COMPRESSION,
+        )
+        if level == 0:
+            return STORED, 0
+
+        if self.sample and path is not None and size >= self.sample_min_size:
+            with open(path, "rb") as f:
+                head = f.read(SAMPLE_SIZE)
+            if head and len(zlib.compress(head, 1)) > len(head) * self.sample_ratio:
+                return STORED, 0
+
+        return DEFLATED, level
+
+
+POLICIES = {
+    # what `zipfile.ZIP_DEFLATED` does
+    "default": lambda: CompressionPolicy("default", [(None, zlib.Z_DEFAULT_COMPRESSION)]),
+    "store": lambda: CompressionPolicy("store", [(None, 0)]),
+    "fast": lambda: CompressionPolicy("fast", [(None, 1)], set(INCOMPRESSIBLE_SUFFIXES)),
+    "best": lambda: CompressionPolicy("best", [(None, 9)], set(INCOMPRESSIBLE_SUFFIXES)),
+    "adaptive": lambda: CompressionPolicy(
+        "adaptive",
+        [(1024 * 1024, 6), (32 * 1024 * 1024, 4), (None, 1)],
+        set(INCOMPRESSIBLE_SUFFIXES),
+        sample=True,
+    ),
+}
+
+
+def policy_from_config(value: Any) -> CompressionPolicy:
+    """
+    Build a policy from the `compression` field of the `[config]` section, either a policy name:
+
+        compression = "adaptive"
+
+    or a table based on one:
+
+        [config.compression]
+        policy = "adaptive"
+        level = 6               # a single level for every size
+        sample = false
+        store = [".bin", ".db"] # extra suffixes to store
+    """
+    if value is None:
+        return POLICIES["default"]()
+    if isinstance(value, str):
+        if value not in POLICIES:
+            raise ValueError(f"Unknown compression policy `{value}`, expected one of {', '.join(POLICIES)}")
+        return POLICIES[value]()
+    if not isinstance(value, dict):
+        raise ValueError("`compression` must be a policy name or a table")
+
+    policy = policy_from_config(value.get("policy", "adaptive"))
+    if "level" in value:
+        level = int(value["level"])
+        if not -1 <= level <= 9:
+            raise ValueError("`compression.level` must be between 0 and 9, or -1 for the zlib default")
+        policy.levels = [(None, level)]
+    if "sample" in value:
+        policy.sample = bool(value["sample"])
+    for suffix in value.get("store", []):
+        suffix = str(suffix).lower()
+        policy.store_suffixes.add(suffix if suffix.startswith(".") else f".{suffix}")
+    return policy
@@ -0,0 +1,165 @@
+import hashlib
+import mmap
+import struct
+import tempfile
+import zlib
+from typing import BinaryIO, Optional, TypedDict
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+# Blocks rolled over byte by byte without a match before the file is taken as rewritten
+DEFAULT_MAX_MISS_BLOCKS = 4
+ADLER_MOD = 65521
+
+MAGIC = b"FXD1"
+OP_COPY = b"C"
+OP_LITERAL = b"L"
+
+
+class Signature(TypedDict):
+    sha256: str
+    block_size: int
+    blocks: list[tuple[int, str]]
+
+
+def _strong(data) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def signature(path: str, block_size: int = DEFAULT_BLOCK_SIZE) -> Signature:
+    """
+    Weak (adler32) and strong (blake2b) checksums of every `block_size` block of `path`.
+    """
+    blocks = []
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+            blocks.append((zlib.adler32(block), _strong(block)))
+    return {"sha256": digest.hexdigest(), "block_size": block_size, "blocks": blocks}
+
+
+class _DeltaWriter:
+    def __init__(self, out: BinaryIO, block_size: int):
+        self.out = out
+        self.copy_start = -1
+        self.copy_count = 0
+        self.literal_bytes = 0
+        out.write(MAGIC + struct.pack(">I", block_size))
+
+    def copy(self, index: int):
+        if self.copy_count and self.copy_start + self.copy_count == index:
+            self.copy_count += 1
+            return
+        self.flush()
+        self.copy_start, self.copy_count = index, 1
+
+    def literal(self, data):
+        if not data:
+            return
+        self.flush()
+        self.out.write(OP_LITERAL + struct.pack(">I", len(data)))
+        self.out.write(data)
+        self.literal_bytes += len(data)
+
+    def flush(self):
+        if self.copy_count:
+            self.out.write(OP_COPY + struct.pack(">II", self.copy_start, self.copy_count))
+            self.copy_count = 0
+
+
+def delta(
+        path: str,
+        base: Signature,
+        max_literal_ratio: float = 0.5,
+        max_miss_blocks: int = DEFAULT_MAX_MISS_BLOCKS,
+) -> Optional[tempfile.SpooledTemporaryFile]:
+    """
+    Encode `path` as copies of blocks of the file described by `base` plus literal bytes,
+    the way rsync does: a rolling adler32 finds candidate blocks at any offset and the
+    strong checksum confirms them.
+
+    Rolling costs a Python step per byte, so the search gives up after `max_miss_blocks` blocks
+    without a match: a rewritten file is sent whole before most of it has been rolled over.
+
+    :return: The encoded delta, rewound to its start, or `None` if more than
+        `max_literal_ratio` of the file would have to be sent as literals anyway, or a run of
+        literals is longer than `max_miss_blocks` blocks.
+    """
+    block_size = base["block_size"]
+    table: dict[int, dict[str, int]] = {}
+    for index, (weak, strong) in enumerate(base["blocks"]):
+        table.setdefault(weak, {}).setdefault(strong, index)
+
+    out = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    writer = _DeltaWriter(out, block_size)
+
+    with open(path, "rb") as f:
+        size = f.seek(0, 2)
+        if size == 0:
+            writer.flush()
+            out.seek(0)
+            return out
+        max_literal = int(size * max_literal_ratio)
+        max_miss = max_miss_blocks * block_size
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            literal_start = 0
+            i = 0
+            weak = None
+            while i < size:
+                end = min(i + block_size, size)
+                n = end - i
+                if weak is None:
+                    weak = zlib.adler32(data[i:end])
+
+                candidates = table.get(weak)
+                if candidates is not None:
+                    index = candidates.get(_strong(data[i:end]))
+                    if index is not None:
+                        writer.literal(data[literal_start:i])
+                        writer.copy(index)
+                        i = end
+                        literal_start = i
+                        weak = None
+                        continue
+
+                if i - literal_start > max_miss or i - literal_start + writer.literal_bytes > max_literal:
+                    out.close()
+                    return None
+
+                if end == size:
+                    # the window can't grow anymore, the rest of the file is literal
+                    break
+
+                # roll the window by one byte
+                out_byte = data[i]
+                in_byte = data[end]
+                a = ((weak & 0xFFFF) - out_byte + in_byte) % ADLER_MOD
+                b = ((weak >> 16) + a - 1 - n * out_byte) % ADLER_MOD
+                weak = (b << 16) | a
+                i += 1
+
+            writer.literal(data[literal_start:size])
+
+    writer.flush()
+    out.seek(0)
+    return out
+
+
+def apply_delta(base: BinaryIO, patch: BinaryIO, out: BinaryIO):
+    """
+    Rebuild the new file from the `base` file and a delta produced by `delta`.
+    """
+    if patch.read(4) != MAGIC:
+        raise ValueError("Not a funix-cloud delta")
+    (block_size,) = struct.unpack(">I", patch.read(4))
+    while op := patch.read(1):
+        if op == OP_COPY:
+            start, count = struct.unpack(">II", patch.read(8))
+            base.seek(start * block_size)
+            out.write(base.read(count * block_size))
+        elif op == OP_LITERAL:
+            (length,) = struct.unpack(">I", patch.read(4))
+            out.write(patch.read(length))
+        else:
+            raise ValueError(f"Unknown delta op {op!r}")
@@ -0,0 +1,187 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+IGNORE_FILES = [".gitignore", ".funixignore"]
+
+# Never deployed: VCS metadata, virtual environments, caches, and the folders the server rejects
+# (`GitFolderNotAllowed`, `SpecialFoldersNotAllowed`)
+DEFAULT_IGNORED_DIRS = {
+    ".git",
+    ".hg",
+    ".svn",
+    ".ebextensions",
+    ".platform",
+    "__pycache__",
+    ".venv",
+    "venv",
+    "node_modules",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".ruff_cache",
+    ".tox",
+    ".nox",
+    ".idea",
+}
+DEFAULT_IGNORED_FILES = {"deploy.zip", ".DS_Store", ".gitignore", ".funixignore"}
+DEFAULT_IGNORED_SUFFIXES = (".pyc", ".pyo")
+
+
+@dataclass
+class IgnoreRule:
+    regex: re.Pattern
+    negate: bool
+    dir_only: bool
+    source: str
+
+
+@dataclass
+class WalkReport:
+    files: int = 0
+    skipped_files: int = 0
+    skipped_dirs: list[str] = field(default_factory=list)
+
+
+def _translate(pattern: str) -> str:
+    """
+    Translate a gitignore glob (without the `!` and trailing `/` markers) to a regex.
+    """
+    i, n = 0, len(pattern)
+    res = ""
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**/", i):
+                res += "(?:.*/)?"
+                i += 3
+                continue
+            if pattern.startswith("**", i):
+                res += ".*"
+                i += 2
+                continue
+            res += "[^/]*"
+        elif c == "?":
+            res += "[^/]"
+        elif c == "[":
+            j = i + 1
+            if j < n and pattern[j] == "!":
+                j += 1
+            if j < n and pattern[j] == "]":
+                j += 1
+            end = pattern.find("]", j)
+            if end == -1:
+                res += re.escape(c)
+            else:
+                content = pattern[i + 1:end]
+                if content.startswith("!"):
+                    content = "^" + content[1:]
+                res += "[" + content.replace("\\", "\\\\") + "]"
+                i = end
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            res += re.escape(pattern[i])
+        else:
+            res += re.escape(c)
+        i += 1
+    return res
+
+
+def compile_pattern(line: str, base: str = "", source: str = "") -> Optional[IgnoreRule]:
+    """
+    Compile one line of a `.gitignore` / `.funixignore` file located in the directory `base`
+    (relative to the project root, `""` for the root). Returns `None` for blanks and comments.
+    """
+    line = line.rstrip("\n")
+    if not line.endswith("\\ "):
+        line = line.rstrip()
+    if not line or line.startswith("#"):
+        return None
+
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+    if line.startswith("\\"):
+        line = line[1:] if line[1:2] in ("#", "!") else line
+
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+
+    anchored = "/" in line
+    line = line.lstrip("/")
+
+    prefix = re.escape(base + "/") if base else ""
+    if anchored:
+        regex = f"^{prefix}{_translate(line)}$"
+    else:
+        regex = f"^{prefix}(?:.*/)?{_translate(line)}$"
+    return IgnoreRule(re.compile(regex), negate, dir_only, source)
+
+
+def load_rules(directory: str, base: str = "") -> list[IgnoreRule]:
+    rules = []
+    for name in IGNORE_FILES:
+        ignore_path = os.path.join(directory, name)
+        if not os.path.isfile(ignore_path):
+            continue
+        with open(ignore_path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                rule = compile_pattern(line, base, ignore_path)
+                if rule is not None:
+                    rules.append(rule)
+    return rules
+
+
+def is_ignored(rules: list[IgnoreRule], relpath: str, is_dir: bool) -> bool:
+    # the last matching rule wins, like git
+    for rule in reversed(rules):
+        if rule.dir_only and not is_dir:
+            continue
+        if rule.regex.match(relpath):
+            return not rule.negate
+    return False
+
+
+def walk(path, report: Optional[WalkReport] = None, use_ignore_files: bool = True) -> Iterator[tuple[str, str]]:
+    """
+    Yield `(file_path, arcname)` for every file under `path` that is not ignored.
+
+    Ignored directories are pruned from `os.walk` so their content is never listed.
+    Rules come from the defaults above and from every `.gitignore` and `.funixignore`
+    in the tree (a file's rules apply to its own directory and below, `.funixignore` wins).
+    """
+    report = report if report is not None else WalkReport()
+    path = os.fspath(path)
+    rules_by_dir: dict[str, list[IgnoreRule]] = {}
+
+    for folder_name, sub_folders, filenames in os.walk(path):
+        rel_folder = os.path.relpath(folder_name, path).replace(os.sep, "/")
+        if rel_folder == ".":
+            rel_folder = ""
+
+        parent_rules = rules_by_dir.get(rel_folder.rpartition("/")[0] if rel_folder else None, [])
+        rules = parent_rules + load_rules(folder_name, rel_folder) if use_ignore_files else parent_rules
+        rules_by_dir[rel_folder] = rules
+
+        kept = []
+        for sub_folder in sorted(sub_folders):
+            rel = f"{rel_folder}/{sub_folder}" if rel_folder else sub_folder
+            if sub_folder in DEFAULT_IGNORED_DIRS or is_ignored(rules, rel, True):
+                report.skipped_dirs.append(rel)
+            else:
+                kept.append(sub_folder)
+        sub_folders[:] = kept
+
+        for filename in sorted(filenames):
+            rel = f"{rel_folder}/{filename}" if rel_folder else filename
+            if (
+                    filename in DEFAULT_IGNORED_FILES
+                    or filename.endswith(DEFAULT_IGNORED_SUFFIXES)
+                    or is_ignored(rules, rel, False)
+            ):
+                report.skipped_files += 1
+                continue
+            report.files += 1
+            yield os.path.join(folder_name, filename), rel
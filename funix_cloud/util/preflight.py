@@ -0,0 +1,216 @@
+"""
+Preflight: the checks the server runs on a deployment, done locally before anything is compressed or sent.
+
+The server rejects an instance whose name has illegal characters (`IllegalString`) or whose name or entry point
+is too long (`ArgumentTooLong`), an upload over 200 MB (`FileTooLarge`), and fails the build of an archive with
+a `.git` folder (`GitFolderNotAllowed`), `.ebextensions` or `.platform` folders (`SpecialFoldersNotAllowed`),
+or without a `requirements.txt` (`RequirementsTxtNotFound`) that lists `funix` (`NoFunixInRequirementsTxt`).
+
+`check_members` goes once over the members of an archive to build, `check_zip` over the central directory of an
+existing zip. When the files could make an archive over the limit, the compressed size of each one is estimated from
+its first `SAMPLE_SIZE` bytes, so a project that is too large is rejected after reading a few KB of each file
+instead of after compressing and uploading it.
+"""
+import os
+import re
+import zipfile
+import zlib
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional
+
+from funix_cloud.api import ErrorCodes
+from funix_cloud.util.archive import ArchiveMember
+from funix_cloud.util.compression import DEFLATED, SAMPLE_SIZE
+
+MAX_UPLOAD_SIZE = 200 * 1024 * 1024
+MAX_ARGUMENT_LENGTH = 128
+# the characters `IllegalString` asks to remove from an instance name
+ILLEGAL_CHARACTERS = frozenset("_()[]<>:\"'/\\|?*")
+REJECTED_FOLDERS = {
+    ".git": ErrorCodes.GitFolderNotAllowed,
+    ".ebextensions": ErrorCodes.SpecialFoldersNotAllowed,
+    ".platform": ErrorCodes.SpecialFoldersNotAllowed,
+}
+# a requirement's project name ends at the first space, extra, version specifier, marker or URL
+REQUIREMENT_NAME_END = re.compile(r"[\s\[<>=!~;@]")
+# local and central header of a member without its name, and the end of central directory record
+MEMBER_OVERHEAD = 30 + 46
+END_OVERHEAD = 22
+
+
+@dataclass
+class Problem:
+    code: ErrorCodes
+    message: str
+
+
+@dataclass
+class Preflight:
+    """
+    What one pass over the members of an archive found. `complete` is False when the pass stopped early
+    because the archive is already known to be too large, `size` and `estimated_size` then only count
+    the members seen. Without `sampled`, `estimated_size` is an upper bound of the archive size.
+    """
+    limit: int = MAX_UPLOAD_SIZE
+    problems: list[Problem] = field(default_factory=list)
+    files: int = 0
+    size: int = 0
+    estimated_size: int = END_OVERHEAD
+    sampled: bool = False
+    complete: bool = True
+    requirements: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+    def check_name(self, arcname: str):
+        folder = arcname.split("/")[0]
+        code = REJECTED_FOLDERS.get(folder) if "/" in arcname else None
+        if code is not None and all(problem.code != code for problem in self.problems):
+            self.problems.append(Problem(code, f"The archive contains the `{folder}` folder."))
+
+    def add(self, arcname: str, size: int, estimated_size: int) -> bool:
+        """
+        Count a member, False once the archive is too large.
+        """
+        self.check_name(arcname)
+        self.files += 1
+        self.size += size
+        self.estimated_size += MEMBER_OVERHEAD + 2 * len(arcname.encode()) + estimated_size
+        return self.estimated_size <= self.limit
+
+    def finish(self, exact: bool = False) -> "Preflight":
+        """
+        Add the problems found once every member was seen. `exact` when `estimated_size` is the real size.
+        """
+        if self.estimated_size > self.limit:
+            limit_mb = self.limit / 1024 / 1024
+            if exact:
+                size = f"is {self.estimated_size / 1024 / 1024:.0f} MB"
+            elif self.complete:
+                size = f"would be about {self.estimated_size / 1024 / 1024:.0f} MB"
+            else:
+                size = f"would be more than {limit_mb:.0f} MB"
+            self.problems.append(Problem(
+                ErrorCodes.FileTooLarge,
+                f"The deployment zip {size}, the server accepts at most {limit_mb:.0f} MB.",
+            ))
+        if not self.complete:
+            return self
+        if self.requirements is None:
+            self.problems.append(Problem(ErrorCodes.RequirementsTxtNotFound, "The archive has no `requirements.txt`."))
+        elif not has_funix(self.requirements):
+            self.problems.append(Problem(ErrorCodes.NoFunixInRequirementsTxt, "`requirements.txt` doesn't list `funix`."))
+        return self
+
+
+def requirement_names(requirements: str) -> Iterator[str]:
+    """
+    The project names listed in a `requirements.txt`, lowercased with `_` and `.` as `-`. Comments and
+    options such as `-r other.txt` or `-e .` are skipped.
+    """
+    for line in requirements.splitlines():
+        line = line.strip()
+        if not line or line.startswith(("#", "-")):
+            continue
+        name = REQUIREMENT_NAME_END.split(line, 1)[0]
+        yield re.sub(r"[-_.]+", "-", name).lower()
+
+
+def has_funix(requirements: str) -> bool:
+    return "funix" in requirement_names(requirements)
+
+
+def check_arguments(name: str, entry_point: str) -> list[Problem]:
+    problems = []
+    illegal = sorted(set(name) & ILLEGAL_CHARACTERS)
+    if illegal:
+        problems.append(Problem(
+            ErrorCodes.IllegalString,
+            f"The app name `{name}` contains {' '.join(f'`{ch}`' for ch in illegal)}.",
+        ))
+    for argument, value in (("app name", name), ("entry file", entry_point)):
+        if len(value) > MAX_ARGUMENT_LENGTH:
+            problems.append(Problem(
+                ErrorCodes.ArgumentTooLong,
+                f"The {argument} is {len(value)} characters long, at most {MAX_ARGUMENT_LENGTH} are allowed.",
+            ))
+    return problems
+
+
+def _member_size(member: ArchiveMember) -> int:
+    return os.path.getsize(member.path) if member.path is not None else len(member.data or b"")
+
+
+def _deflate_bound(size: int) -> int:
+    # zlib's `deflateBound`: incompressible data grows by the headers of the stored blocks
+    return size + (size >> 12) + (size >> 14) + (size >> 25) + 13
+
+
+def estimate_member(member: ArchiveMember, size: int) -> int:
+    """
+    Estimate the compressed size of `member` of `size` bytes by deflating its first `SAMPLE_SIZE` bytes
+    with the method and level it will be compressed with.
+    """
+    method, level = member.method, member.level
+    if member.policy is not None:
+        method, level = member.policy.choose(member.path, size)
+    if method != DEFLATED or size == 0:
+        return size
+
+    if member.data is not None:
+        head = member.data[:SAMPLE_SIZE]
+    else:
+        with open(member.path, "rb") as f:
+            head = f.read(SAMPLE_SIZE)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    sample = len(compressor.compress(head)) + len(compressor.flush())
+    if len(head) >= size:
+        return sample
+    return int(size * sample / len(head))
+
+
+def check_members(members: Iterable[ArchiveMember], limit: int = MAX_UPLOAD_SIZE) -> Preflight:
+    """
+    Check the archive `members` would make, stopping as soon as it is too large.
+
+    Only the sizes of the files are read, unless they are too large to fit in `limit` even
+    uncompressed, their compressed sizes are estimated then.
+    """
+    members = list(members)
+    sizes = [_member_size(member) for member in members]
+    bound = END_OVERHEAD + sum(
+        MEMBER_OVERHEAD + 2 * len(member.arcname.encode()) + _deflate_bound(size)
+        for member, size in zip(members, sizes)
+    )
+    result = Preflight(limit, sampled=bound > limit)
+    for member, size in zip(members, sizes):
+        if member.arcname == "requirements.txt":
+            if member.data is not None:
+                result.requirements = member.data.decode(errors="replace")
+            else:
+                with open(member.path, "rb") as f:
+                    result.requirements = f.read().decode(errors="replace")
+        estimated_size = estimate_member(member, size) if result.sampled else _deflate_bound(size)
+        if not result.add(member.arcname, size, estimated_size):
+            result.complete = False
+            break
+    return result.finish()
+
+
+def check_zip(path, limit: int = MAX_UPLOAD_SIZE) -> Preflight:
+    """
+    Check the zip at `path` from its central directory, it is uploaded as it is.
+    """
+    result = Preflight(limit, sampled=True)
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                result.check_name(info.filename)
+                continue
+            if info.filename == "requirements.txt":
+                result.requirements = archive.read(info).decode(errors="replace")
+            result.add(info.filename, info.file_size, info.compress_size)
+    result.estimated_size = os.path.getsize(path)
+    return result.finish(exact=True)
@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from funix_cloud.emulator import serve
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FUNIX_CLOUD = "import sys; sys.argv[0] = 'funix-cloud'; from funix_cloud import start; start()"
+TOKEN = "test-token"
+
+
+@pytest.fixture
+def emulator():
+    server = serve(stage_seconds=0, health_seconds=0)
+    server.backend.add_user("funix-dev", "Funix-Dev-1", token=TOKEN)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cli(tmp_path, emulator):
+    """
+    Run `funix-cloud` in a temporary home logged in to the emulator, from `tmp_path`.
+    """
+    config_dir = tmp_path / "home" / ".config" / "funix-cloud"
+    config_dir.mkdir(parents=True)
+    (config_dir / "config.json").write_text(json.dumps({"token": TOKEN, "api_server": emulator.url}))
+    env = dict(os.environ, HOME=str(tmp_path / "home"), PYTHONPATH=REPO_DIR)
+    for name in ("FUNIX_CLOUD_PROFILE", "FUNIX_CLOUD_OUTPUT", "FUNIX_CLOUD_TRACE"):
+        env.pop(name, None)
+
+    def run(*args: str, code: str = FUNIX_CLOUD) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            [sys.executable, "-c", code, *args],
+            cwd=tmp_path,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+
+    return run
@@ -0,0 +1,37 @@
+import io
+import tracemalloc
+
+from funix_cloud.api import API
+from funix_cloud.api.multipart import MultipartEncoder
+from tests.conftest import TOKEN
+
+UPLOAD_SIZE = 64 * 1024 * 1024
+
+
+def test_length_of_file_objects():
+    source = io.BytesIO(b"0123456789")
+    source.seek(4)
+    encoder = MultipartEncoder("file", "deploy.zip", source)
+    body = encoder.read()
+    assert len(encoder) == len(body)
+    assert b"456789\r\n--" in body and b"0123" not in body
+
+
+def test_upload_streams_large_file(emulator, tmp_path):
+    path = tmp_path / "deploy.zip"
+    with open(path, "wb") as f:
+        for _ in range(UPLOAD_SIZE // (1024 * 1024)):
+            f.write(b"\0" * 1024 * 1024)
+
+    api = API(emulator.url, TOKEN)
+    tracemalloc.start()
+    try:
+        resp = api.upload(str(path), TOKEN)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert resp["code"] == 0, resp
+    assert emulator.stats()["received_bytes"] > UPLOAD_SIZE
+    # the client and the emulator both stream, neither holds the file
+    assert peak < 8 * 1024 * 1024
@@ -0,0 +1,21 @@
+import threading
+
+from funix_cloud.cache import UploadCache
+
+
+def test_parallel_uploads_keep_every_entry(tmp_path):
+    cache = UploadCache(str(tmp_path / "file_ids.json"))
+
+    def put(worker: int):
+        for i in range(20):
+            cache.put(f"{worker}-{i}", f"file-{worker}-{i}")
+
+    threads = [threading.Thread(target=put, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(cache.get(f"{worker}-{i}") for worker in range(8) for i in range(20))
+    cache.forget("file-0-0")
+    assert cache.get("0-0") is None and cache.get("0-1") is not None
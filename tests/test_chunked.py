@@ -0,0 +1,62 @@
+import json
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from funix_cloud.api import API, Routes
+from funix_cloud.api import chunked
+from funix_cloud.api.chunked import ChunkedUploader
+from funix_cloud.emulator.server import Fault
+from tests.conftest import TOKEN
+
+PART_SIZE = 64 * 1024
+
+
+@pytest.fixture
+def uploader(emulator, tmp_path, monkeypatch):
+    # retries of dropped parts don't wait
+    monkeypatch.setattr(chunked, "time", SimpleNamespace(time=time.time, sleep=lambda seconds: None))
+    return ChunkedUploader(API(emulator.url, TOKEN), TOKEN, str(tmp_path / "uploads.json"), PART_SIZE, workers=1)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = tmp_path / "deploy.zip"
+    path.write_bytes(os.urandom(4 * PART_SIZE))
+    return str(path)
+
+
+def test_resume_after_dropped_connections(emulator, uploader, archive, tmp_path):
+    emulator.faults = [Fault(Routes.upload_part, None, times=2), Fault(Routes.upload_complete, None, times=1)]
+    with pytest.raises(requests.exceptions.ConnectionError):
+        uploader.upload(archive)
+    # the dropped parts were retried, the session is kept for the next attempt
+    assert emulator.stats()["requests"][Routes.upload_part] == 6
+    assert len(json.loads((tmp_path / "uploads.json").read_text())) == 1
+
+    resp = uploader.upload(archive)
+    assert resp["code"] == 0, resp
+    # every part was acknowledged before the drop, none is sent again
+    assert emulator.stats()["requests"][Routes.upload_part] == 6
+    assert json.loads((tmp_path / "uploads.json").read_text()) == {}
+
+
+def test_expired_session_starts_over(emulator, uploader, archive, tmp_path):
+    emulator.faults = [Fault(Routes.upload_complete, None, times=1)]
+    with pytest.raises(requests.exceptions.ConnectionError):
+        uploader.upload(archive)
+
+    uploader.session_ttl = 0
+    resp = uploader.upload(archive)
+    assert resp["code"] == 0, resp
+    assert emulator.stats()["requests"][Routes.upload_part] == 8
+
+
+def test_rejected_upload_is_forgotten(emulator, uploader, archive, tmp_path):
+    emulator.faults = [Fault(Routes.upload_complete)]
+    resp = uploader.upload(archive)
+    assert resp["code"] != 0
+    assert json.loads((tmp_path / "uploads.json").read_text()) == {}
@@ -0,0 +1,117 @@
+import json
+import sys
+
+import pytest
+import requests
+
+from funix_cloud.api import ErrorCodes, Routes
+from funix_cloud.emulator.server import Fault
+from tests.conftest import FUNIX_CLOUD
+
+
+def events(output: str) -> list[dict]:
+    return [json.loads(line) for line in output.splitlines() if line.startswith("{")]
+
+
+def write_project(folder):
+    (folder / "main.py").write_text("from funix import funix\n\n\n@funix()\ndef hello(name: str) -> str:\n"
+                                    "    return name\n")
+    (folder / "requirements.txt").write_text("funix\n")
+
+
+def test_trace_before_command(cli, emulator, tmp_path):
+    instance_id = emulator.backend.add_instance("funix-dev", "app")
+    result = cli("--trace", "query", str(instance_id), "--output", "jsonl")
+    assert result.returncode == 0, result.stdout + result.stderr
+    # the command isn't taken as the trace file name
+    assert not (tmp_path / "query").exists()
+    trace = events(result.stdout)[-1]
+    assert trace["event"] == "trace" and trace["file"] is None
+    assert "/instance/query" in [row["route"] for row in trace["routes"]]
+
+
+def test_trace_file(cli, emulator, tmp_path):
+    instance_id = emulator.backend.add_instance("funix-dev", "app")
+    result = cli("--trace-file", "trace.json", "query", str(instance_id), "--output", "jsonl")
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert events(result.stdout)[-1]["file"] == "trace.json"
+    assert json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+
+
+@pytest.mark.parametrize("args", [["logout"], ["cache"], ["stats"], ["--help"]])
+def test_fast_commands_skip_fire_and_rich(cli, args):
+    code = FUNIX_CLOUD + "; print(sorted(name for name in ('fire', 'rich') if name in sys.modules))"
+    result = cli(*args, code=code)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert result.stdout.splitlines()[-1] == "[]"
+
+
+def test_logout(cli, tmp_path):
+    result = cli("logout")
+    assert result.stdout.splitlines()[0] == "Logout successful!"
+    config = json.loads((tmp_path / "home" / ".config" / "funix-cloud" / "config.json").read_text())
+    assert config["token"] is None
+
+
+def test_list_health_survives_dropped_connections(cli, emulator):
+    for name in ("app-1", "app-2"):
+        emulator.backend.add_instance("funix-dev", name)
+    emulator.faults = [Fault(Routes.query_instance_health, None, times=1)]
+    result = cli("list", "--health", "--output", "jsonl")
+    assert result.returncode == 0, result.stdout + result.stderr
+    instances = events(result.stdout)[-1]["instances"]
+    assert sorted(instance["health"]["code"] for instance in instances) == [0, ErrorCodes.ServerError.value]
+
+
+def test_shared_archive_uploaded_again_once(cli, emulator, tmp_path):
+    # outside of the manifest's folder, so changing the manifest doesn't change the archive
+    project = tmp_path / "project"
+    project.mkdir()
+    write_project(project)
+
+    def run(*names: str) -> list[dict]:
+        apps = "".join(f'[[apps]]\nname = "{name}"\npath = "project"\n\n' for name in names)
+        (tmp_path / "funix-cloud.toml").write_text(apps + "[config]\nenv = false\n")
+        result = cli("run", "--output", "jsonl")
+        assert result.returncode == 0, result.stdout + result.stderr
+        return events(result.stdout)[-1]["apps"]
+
+    run("warm-up")
+    assert emulator.stats()["requests"][Routes.upload] == 1
+    # the archive remembered in the upload cache is gone from the server
+    clock = emulator.backend.clock
+    emulator.backend.clock = lambda: clock() + 3600
+
+    apps = run("app-1", "app-2", "app-3")
+    assert [app["phase"] for app in apps] == ["running"] * 3, apps
+    assert emulator.stats()["requests"][Routes.upload] == 2
+
+
+
+def test_timeout_is_reported(monkeypatch, capsys):
+    import funix_cloud
+    from funix_cloud.cli import output
+
+    def timeout(args):
+        output.JsonLines()
+        raise requests.exceptions.ReadTimeout("Read timed out. (read timeout=60)")
+
+    monkeypatch.setattr(output, "_active", None)
+    monkeypatch.setattr(funix_cloud, "_run_fire", timeout)
+    monkeypatch.setattr(sys, "argv", ["funix-cloud", "query", "1", "--output", "jsonl"])
+    with pytest.raises(SystemExit) as exit_info:
+        funix_cloud.start()
+    assert exit_info.value.code == 1
+    error = events(capsys.readouterr().out)[-1]
+    assert (error["event"], error["code"]) == ("error", "ReadTimeout")
+
+
+def test_incremental_error_is_not_retried_as_full_upload(cli, emulator, tmp_path):
+    write_project(tmp_path)
+    emulator.faults = [Fault(Routes.manifest_blob, ErrorCodes.ServerError)]
+    result = cli("deploy", ".", "app", "--incremental", "--output", "jsonl")
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert any(event["event"] == "error" and event["code"] == "ServerError" for event in events(result.stdout))
+    requests = emulator.stats()["requests"]
+    assert requests[Routes.manifest_blob] and Routes.upload not in requests
+    assert Routes.deploy_zip not in requests
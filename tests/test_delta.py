@@ -0,0 +1,33 @@
+import io
+import random
+
+from funix_cloud.util.delta import apply_delta, delta, signature
+
+BLOCK_SIZE = 1024
+
+
+def test_insert_rebuilds(tmp_path):
+    rng = random.Random(0)
+    old, new = tmp_path / "old", tmp_path / "new"
+    data = rng.randbytes(64 * BLOCK_SIZE)
+    old.write_bytes(data)
+    new.write_bytes(data[:1000] + b"inserted" + data[1000:])
+
+    patch = delta(str(new), signature(str(old), BLOCK_SIZE))
+    assert patch is not None
+    out = io.BytesIO()
+    with open(old, "rb") as base:
+        apply_delta(base, patch, out)
+    assert out.getvalue() == new.read_bytes()
+
+
+def test_rewrite_gives_up_early(tmp_path):
+    rng = random.Random(0)
+    old, new = tmp_path / "old", tmp_path / "new"
+    old.write_bytes(rng.randbytes(64 * BLOCK_SIZE))
+    new.write_bytes(rng.randbytes(64 * BLOCK_SIZE))
+    base = signature(str(old), BLOCK_SIZE)
+
+    # even when up to the whole file could be sent as literals, the search stops after a few blocks
+    assert delta(str(new), base, max_literal_ratio=1.0) is None
+    assert delta(str(new), base, max_literal_ratio=1.0, max_miss_blocks=64) is not None
@@ -0,0 +1,48 @@
+import io
+import zipfile
+
+import pytest
+
+from funix_cloud.api import ErrorCodes
+from funix_cloud.emulator import Backend
+from funix_cloud.util.preflight import check_zip
+
+BOUNDARY = "funix-cloud-test"
+
+
+def make_zip(path, requirements: str):
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("main.py", "import funix\n")
+        archive.writestr("requirements.txt", requirements)
+    return path
+
+
+def emulator_status(backend: Backend, path) -> int:
+    user = backend.authenticate(backend.add_user("funix-dev", "Funix-Dev-1"))
+    with open(path, "rb") as f:
+        body = (
+            f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"app.zip\"\r\n\r\n".encode()
+            + f.read()
+            + f"\r\n--{BOUNDARY}--\r\n".encode()
+        )
+    file_id = backend.upload(f"multipart/form-data; boundary={BOUNDARY}", io.BytesIO(body))["file_id"]
+    created = backend.create_instance(user, {"name": "app", "file_id": file_id}, git=False)
+    return backend.query_instance(user, {"id": created["instance_id"]})["status"]
+
+
+@pytest.mark.parametrize("requirements, expected", [
+    ("funix\n", None),
+    ("Funix >= 0.5 ; python_version > '3.9'\n", None),
+    ("# tools\n-r base.txt\nfunix[all]==0.5\n", None),
+    ("funix-cloud\n", ErrorCodes.NoFunixInRequirementsTxt),
+    ("funix_cloud\nrequests\n", ErrorCodes.NoFunixInRequirementsTxt),
+    ("# funix\n-e ./funix\n", ErrorCodes.NoFunixInRequirementsTxt),
+])
+def test_emulator_and_preflight_agree_on_funix(tmp_path, requirements, expected):
+    path = make_zip(tmp_path / "app.zip", requirements)
+
+    problems = [problem.code for problem in check_zip(path).problems]
+    assert problems == ([expected] if expected else [])
+
+    backend = Backend(str(tmp_path / "emulator"), stage_seconds=0)
+    assert emulator_status(backend, path) == (expected.value if expected else 0)